@@ -0,0 +1,9 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from senditark_api.config import ProductionConfig
+from senditark_api.utils.propagation import PropagationHelper
+
+if __name__ == '__main__':
+    ProductionConfig.build_db_engine()
+    ProductionConfig.configure_result_cache()
+    PropagationHelper.run_balance_queue_worker(session_factory=ProductionConfig.SESSION)
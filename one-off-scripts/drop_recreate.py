@@ -1,39 +1,51 @@
 from pukr import get_logger
-from sqlalchemy import (
-    Engine,
-    create_engine,
-)
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
 
 from senditark_api.config import DevelopmentConfig
+from senditark_api.migrations import (
+    MIGRATIONS,
+    MigrationRunner,
+)
 from senditark_api.model import (
     Base,
     TableAccount,
     TableBalance,
+    TableBalanceCheckpoint,
+    TableBalanceQueue,
     TableBudget,
     TableInvoice,
     TableInvoiceSplit,
     TableScheduledTransaction,
     TableScheduledTransactionSplit,
+    TableSchemaMigration,
     TableTransaction,
     TableTransactionSplit,
 )
+from senditark_api.utils.partitioning import (
+    PARTITION_COLUMNS,
+    partition_table,
+)
 
 log = get_logger()
 
 TABLES = [
     TableAccount,
     TableBalance,
+    TableBalanceCheckpoint,
+    TableBalanceQueue,
     TableBudget,
     TableInvoice,
     TableInvoiceSplit,
     TableScheduledTransaction,
     TableScheduledTransactionSplit,
+    TableSchemaMigration,
     TableTransaction,
     TableTransactionSplit
 ]
 
 
-def drop_and_recreate(eng: Engine):
+def drop_and_recreate(eng: Engine, partition_by_year: bool = False):
     log.info('Dropping all tables...')
     tbl_objs = []
     for table in TABLES:
@@ -50,9 +62,14 @@ def drop_and_recreate(eng: Engine):
         log.info('Bypassed drop. No existing tables to drop')
     log.info('Recreating all tables...')
     Base.metadata.create_all(eng)
+    # Tables fresh from the models already have what every migration would add
+    MigrationRunner(eng, MIGRATIONS).stamp()
+    if partition_by_year:
+        with Session(eng) as session:
+            for table in PARTITION_COLUMNS:
+                partition_table(session=session, table=table)
 
 
 if __name__ == '__main__':
     DevelopmentConfig.build_db_engine()
-    engine = create_engine(DevelopmentConfig.SQLALCHEMY_DATABASE_URI, isolation_level='SERIALIZABLE')
-    drop_and_recreate(engine)
+    drop_and_recreate(DevelopmentConfig.ENGINE, partition_by_year=DevelopmentConfig.DB_PARTITION_BY_YEAR)
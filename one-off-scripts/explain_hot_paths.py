@@ -0,0 +1,123 @@
+"""Captures EXPLAIN ANALYZE plans of the register & propagation hot paths, to compare before and after a migration
+
+Every statement the hot paths run is also run under EXPLAIN (ANALYZE, BUFFERS) inside a savepoint that's rolled
+    back, and the whole run is rolled back at the end, so the database is left as it was. Postgres only.
+
+Usage:
+    python explain_hot_paths.py --account-id 1 --out before.json
+    python migrate.py
+    python explain_hot_paths.py --account-id 1 --out after.json --compare before.json
+"""
+import argparse
+import datetime
+import json
+import pathlib
+from typing import (
+    Dict,
+    Iterator,
+    List,
+)
+
+from pukr import get_logger
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from senditark_api.config import DevelopmentConfig
+from senditark_api.utils.propagation import PropagationHelper
+from senditark_api.utils.query import SenditarkQueries
+
+log = get_logger()
+
+
+def iter_plan_nodes(node: Dict) -> Iterator[Dict]:
+    yield node
+    for child in node.get('Plans', []):
+        yield from iter_plan_nodes(child)
+
+
+def summarize_plan(statement: str, plan: Dict) -> Dict:
+    nodes = list(iter_plan_nodes(plan['Plan']))
+    return {
+        'statement': statement,
+        'planning_ms': plan['Planning Time'],
+        'execution_ms': plan['Execution Time'],
+        'shared_blocks_read': plan['Plan'].get('Shared Read Blocks', 0),
+        'seq_scans': sorted({x['Relation Name'] for x in nodes if x['Node Type'] == 'Seq Scan'}),
+        'indexes': sorted({x['Index Name'] for x in nodes if 'Index Name' in x}),
+    }
+
+
+def explain_hot_paths(session: Session, account_id: int, start_date: datetime.date) -> Dict[str, List[Dict]]:
+    """Runs each hot path once, collecting the plan of every statement it ran"""
+    plans = []
+
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        if executemany or not statement.lstrip().upper().startswith(('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')):
+            return
+        cursor.execute('SAVEPOINT explain_hot_paths')
+        cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}', parameters)
+        plan = cursor.fetchone()[0][0]
+        cursor.execute('ROLLBACK TO SAVEPOINT explain_hot_paths')
+        plans.append(summarize_plan(statement, plan))
+
+    hot_paths = {
+        'register_first_page': lambda: SenditarkQueries.get_transaction_page_by_account(
+            session=session, account_id=account_id, limit=50),
+        'register_validator': lambda: SenditarkQueries.get_register_validator(session=session, account_id=account_id),
+        'accounts_with_balance': lambda: SenditarkQueries.get_accounts_with_balance(session=session),
+        'propagation': lambda: PropagationHelper.propagate_account_balances(
+            session=session, account_id=account_id, start_date=start_date),
+    }
+    results = {}
+    engine = session.get_bind()
+    event.listen(engine, 'before_cursor_execute', explain)
+    try:
+        for name, run in hot_paths.items():
+            plans.clear()
+            run()
+            results[name] = list(plans)
+    finally:
+        event.remove(engine, 'before_cursor_execute', explain)
+        session.rollback()
+    return results
+
+
+def totals(plans: List[Dict]) -> Dict:
+    return {
+        'execution_ms': sum(x['execution_ms'] for x in plans),
+        'seq_scans': sorted({y for x in plans for y in x['seq_scans']}),
+    }
+
+
+def compare(before: Dict[str, List[Dict]], after: Dict[str, List[Dict]]):
+    for name in after:
+        if name not in before:
+            continue
+        b, a = totals(before[name]), totals(after[name])
+        log.info(f'{name}: {b["execution_ms"]:.1f}ms -> {a["execution_ms"]:.1f}ms '
+                 f'(seq scans: {", ".join(b["seq_scans"]) or "none"} -> {", ".join(a["seq_scans"]) or "none"})')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='EXPLAIN ANALYZE the register & propagation queries')
+    parser.add_argument('--account-id', type=int, required=True)
+    parser.add_argument('--start-date', type=datetime.date.fromisoformat,
+                        default=datetime.date.today() - datetime.timedelta(days=365),
+                        help='Date to propagate balances from (default: a year ago)')
+    parser.add_argument('--out', type=pathlib.Path, required=True, help='Where to write the plans')
+    parser.add_argument('--compare', type=pathlib.Path, help='Plans from an earlier run to compare against')
+    args = parser.parse_args()
+
+    DevelopmentConfig.build_db_engine()
+    if DevelopmentConfig.ENGINE.dialect.name != 'postgresql':
+        raise ValueError('EXPLAIN ANALYZE plans are only captured on Postgres.')
+    with DevelopmentConfig.SESSION() as session:
+        results = explain_hot_paths(session=session, account_id=args.account_id, start_date=args.start_date)
+    args.out.write_text(json.dumps(results, indent=2))
+    log.info(f'Wrote plans of {sum(len(x) for x in results.values())} statements to {args.out}.')
+    for name, plans in results.items():
+        t = totals(plans)
+        log.info(f'{name}: {len(plans)} statements, {t["execution_ms"]:.1f}ms, '
+                 f'seq scans: {", ".join(t["seq_scans"]) or "none"}')
+    if args.compare is not None:
+        compare(before=json.loads(args.compare.read_text()), after=results)
@@ -0,0 +1,33 @@
+import argparse
+import pathlib
+
+from pukr import get_logger
+
+from senditark_api.config import DevelopmentConfig
+from senditark_api.utils.importer import (
+    StatementImporter,
+    StatementParser,
+)
+
+log = get_logger()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Imports a CSV, OFX or QIF bank statement')
+    parser.add_argument('path', type=pathlib.Path, help='Statement file')
+    parser.add_argument('--account-id', type=int, required=True, help='The account the statement belongs to')
+    parser.add_argument('--offset-account-id', type=int, required=True,
+                        help="The other side of every line that doesn't name its own account")
+    parser.add_argument('--format', choices=StatementParser.FORMATS, default=None,
+                        help="Statement format (default: the file's extension)")
+    parser.add_argument('--date-format', default=None, help='strptime format of CSV dates (default: YYYY-MM-DD)')
+    args = parser.parse_args()
+
+    DevelopmentConfig.build_db_engine()
+    session = DevelopmentConfig.SESSION()
+    importer = StatementImporter(session=session, account_id=args.account_id,
+                                 offset_account_id=args.offset_account_id)
+    with args.path.open('r', encoding='utf-8-sig', errors='replace', newline='') as f:
+        lines = StatementParser.parse(stream=f, fmt=args.format or args.path.suffix, date_format=args.date_format)
+        summary = importer.import_lines(lines)
+    log.info(f'Imported {summary["n_transactions"]} transactions from {args.path}.')
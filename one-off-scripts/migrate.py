@@ -0,0 +1,40 @@
+"""Brings the database's schema up to date with the models, without losing any data
+
+Usage:
+    python migrate.py                   # applies every pending migration
+    python migrate.py --target 1        # ... up to version 1
+    python migrate.py --list            # shows which migrations have been applied
+    python migrate.py --stamp           # records every migration as applied (for databases built from the models)
+"""
+import argparse
+
+from pukr import get_logger
+
+from senditark_api.config import DevelopmentConfig
+from senditark_api.migrations import (
+    MIGRATIONS,
+    MigrationRunner,
+)
+
+log = get_logger()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Applies pending schema migrations')
+    parser.add_argument('--target', type=int, help='Stop after this version')
+    parser.add_argument('--list', action='store_true', help='List migrations and whether each is applied')
+    parser.add_argument('--stamp', action='store_true', help='Mark every migration as applied without running it')
+    args = parser.parse_args()
+
+    DevelopmentConfig.build_db_engine()
+    runner = MigrationRunner(DevelopmentConfig.ENGINE, MIGRATIONS)
+    if args.list:
+        applied = runner.get_applied_versions()
+        for migration in MIGRATIONS:
+            log.info(f'{migration.version:>4} [{"x" if migration.version in applied else " "}] '
+                     f'{migration.description}')
+    elif args.stamp:
+        log.info(f'Stamped versions: {runner.stamp()}')
+    else:
+        versions = runner.upgrade(target_version=args.target)
+        log.info(f'Applied versions: {versions}' if versions else 'Already up to date.')
@@ -0,0 +1,41 @@
+"""Converts balance into a table partitioned by year (Postgres only)
+
+The table is locked while its rows get copied over, so run this in a maintenance window. Every pending migration
+    has to be applied first (see migrate.py). Afterwards, the cron keeps adding each next year's partition.
+
+Usage:
+    python partition_tables.py                      # every partitionable table
+    python partition_tables.py --table balance
+"""
+import argparse
+
+from pukr import get_logger
+
+from senditark_api.config import DevelopmentConfig
+from senditark_api.migrations import (
+    MIGRATIONS,
+    MigrationRunner,
+)
+from senditark_api.utils.partitioning import (
+    PARTITION_COLUMNS,
+    partition_table,
+)
+
+log = get_logger()
+
+TABLES = {x.__tablename__: x for x in PARTITION_COLUMNS}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Partitions the biggest tables by year')
+    parser.add_argument('--table', choices=sorted(TABLES), action='append', help='Table to partition (default: all)')
+    args = parser.parse_args()
+
+    DevelopmentConfig.build_db_engine()
+    pending = MigrationRunner(DevelopmentConfig.ENGINE, MIGRATIONS).get_pending()
+    if len(pending) > 0:
+        raise ValueError(f'Apply the pending migrations first: {[x.version for x in pending]}')
+    with DevelopmentConfig.SESSION() as session:
+        for table_name in args.table or sorted(TABLES):
+            n_rows = partition_table(session=session, table=TABLES[table_name])
+            log.info(f'{table_name}: {n_rows} rows in yearly partitions.')
@@ -0,0 +1,13 @@
+from pukr import get_logger
+
+from senditark_api.config import DevelopmentConfig
+from senditark_api.utils.rebuild import BalanceRebuilder
+
+log = get_logger()
+
+
+if __name__ == '__main__':
+    DevelopmentConfig.build_db_engine()
+    session = DevelopmentConfig.SESSION()
+    n_rows = BalanceRebuilder.rebuild_balances(session=session)
+    log.info(f'Rebuilt balance table with {n_rows} rows.')
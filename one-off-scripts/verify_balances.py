@@ -0,0 +1,29 @@
+import argparse
+
+from pukr import get_logger
+
+from senditark_api.config import DevelopmentConfig
+from senditark_api.utils.query import SenditarkQueries
+from senditark_api.utils.verify import BalanceVerifier
+
+log = get_logger()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Verifies stored balances against the transaction splits')
+    parser.add_argument('--repair', action='store_true', help='Recompute divergent accounts in place')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes')
+    args = parser.parse_args()
+
+    DevelopmentConfig.build_db_engine()
+    session = DevelopmentConfig.SESSION()
+    account_ids = [x.account_id for x in SenditarkQueries.get_accounts(session=session)]
+    results = BalanceVerifier.verify_accounts(db_uri=DevelopmentConfig.SQLALCHEMY_DATABASE_URI,
+                                              account_ids=account_ids, max_workers=args.workers)
+    for result in results:
+        if result['first_divergent_date'] is not None:
+            log.warning(f'Account {result["account_id"]} diverges from {result["first_divergent_date"]}: '
+                        f'expected {result["expected_amount"]}, stored {result["stored_amount"]}')
+    if args.repair:
+        repaired = BalanceVerifier.repair_accounts(session=session, results=results)
+        log.info(f'Repaired {len(repaired)} accounts.')
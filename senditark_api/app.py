@@ -13,7 +13,9 @@ from werkzeug.http import HTTP_STATUS_CODES
 
 from senditark_api.config import DevelopmentConfig
 from senditark_api.flask_base import db
+from senditark_api.json_provider import OrjsonProvider
 from senditark_api.routes.account import bp_acct
+from senditark_api.routes.admin import bp_admin
 from senditark_api.routes.budget import bp_budg
 from senditark_api.routes.cron import bp_cron
 from senditark_api.routes.helpers import (
@@ -30,6 +32,7 @@ from senditark_api.routes.transactions import bp_trans
 
 ROUTES = [
     bp_acct,
+    bp_admin,
     bp_budg,
     bp_cron,
     bp_invc,
@@ -67,8 +70,10 @@ def create_app(*args, **kwargs) -> Flask:
     # Config app, default to development if not provided
     config_class = kwargs.pop('config_class', DevelopmentConfig)
     config_class.build_db_engine()
+    config_class.configure_result_cache()
 
     app = Flask(__name__, static_url_path='/')
+    app.json = OrjsonProvider(app)
     CORS(app)
     app.config.from_object(config_class)
 
@@ -2,9 +2,15 @@ import os
 import pathlib
 import random
 import string
-from typing import Dict
+from typing import (
+    Any,
+    Dict,
+)
 
-from sqlalchemy import create_engine
+from sqlalchemy import (
+    create_engine,
+    make_url,
+)
 from sqlalchemy.orm import sessionmaker
 
 from senditark_api import (
@@ -12,6 +18,12 @@ from senditark_api import (
     __version__,
 )
 from senditark_api.model.base import Base
+from senditark_api.utils.db_pool import MeteredQueuePool
+from senditark_api.utils.result_cache import (
+    SqliteCacheBackend,
+    result_cache,
+)
+from senditark_api.utils.routing import REPLICA_BIND_KEY
 
 ROOT = pathlib.Path(__file__).parent.parent
 HOME = pathlib.Path().home()
@@ -45,7 +57,33 @@ class BaseConfig:
     SECRETS = None
     SQLALCHEMY_DATABASE_URI = 'postgresql+psycopg2://{db-username}:{db-password}@{db-host}:{db-port}/{db-database}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # The one engine per process, shared by SESSION and the Flask-SQLAlchemy extension
+    ENGINE = None
     SESSION = None
+    # Optional read replica for the read-only routes (see routes/helpers.read_only), formatted with SECRETS like the
+    #   primary's URI. Locally, any second database (or Postgres instance) holding a copy of the schema stands in.
+    SQLALCHEMY_REPLICA_URI = None
+    REPLICA_ENGINE = None
+    # Default for every transaction (Postgres only). Balance-mutating units of work switch themselves to SERIALIZABLE
+    #   (see utils/isolation.py) and read-only routes to SERIALIZABLE READ ONLY DEFERRABLE.
+    DB_ISOLATION_LEVEL = 'READ COMMITTED'
+    # Whether drop_recreate builds balance partitioned by year (Postgres only, see
+    #   utils/partitioning.py). Existing databases get converted with one-off-scripts/partition_tables.py instead.
+    DB_PARTITION_BY_YEAR = False
+    # Connection pool (Postgres only). Every process holds up to DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW connections,
+    #   so (gunicorn workers + balance worker) * that needs to stay under the server's max_connections.
+    DB_POOL_SIZE = 5
+    DB_POOL_MAX_OVERFLOW = 5
+    # Seconds to wait for a free connection before raising
+    DB_POOL_TIMEOUT = 10
+    DB_POOL_PRE_PING = True
+    # Seconds before a connection is replaced
+    DB_POOL_RECYCLE = 1800
+    DB_STATEMENT_TIMEOUT_MS = 30000
+    # Shared by every worker process (and the balance worker), so writes in any of them invalidate all
+    RESULT_CACHE_PATH = HOME.joinpath('data').joinpath('senditark_result_cache.sqlite3')
+    RESULT_CACHE_TTL = 300
+    RESULT_CACHE_MAX_ENTRIES = 1000
 
     @classmethod
     def load_secrets(cls):
@@ -54,15 +92,49 @@ class BaseConfig:
             secrets_path = KEY_DIR.joinpath('senditark.properties')
         return read_secrets(secrets_path)
 
+    @classmethod
+    def get_engine_options(cls, db_uri: str = None) -> Dict[str, Any]:
+        """Keyword args for create_engine (on the primary's URI by default), pool settings included"""
+        options = {}
+        if make_url(db_uri or cls.SQLALCHEMY_DATABASE_URI).get_backend_name() == 'postgresql':
+            options.update({
+                'isolation_level': cls.DB_ISOLATION_LEVEL,
+                'poolclass': MeteredQueuePool,
+                'pool_size': cls.DB_POOL_SIZE,
+                'max_overflow': cls.DB_POOL_MAX_OVERFLOW,
+                'pool_timeout': cls.DB_POOL_TIMEOUT,
+                'pool_pre_ping': cls.DB_POOL_PRE_PING,
+                'pool_recycle': cls.DB_POOL_RECYCLE,
+                'connect_args': {'options': f'-c statement_timeout={cls.DB_STATEMENT_TIMEOUT_MS}'},
+            })
+        return options
+
     @classmethod
     def build_db_engine(cls):
-        """Builds database engine, sets SESSION"""
+        """Builds the process' database engine (once), sets ENGINE & SESSION, plus REPLICA_ENGINE if configured"""
+        if cls.ENGINE is not None:
+            return
         if cls.SECRETS is None:
             cls.SECRETS = cls.load_secrets()
         cls.SQLALCHEMY_DATABASE_URI = cls.SQLALCHEMY_DATABASE_URI.format(**cls.SECRETS)
-        engine = create_engine(cls.SQLALCHEMY_DATABASE_URI, isolation_level='SERIALIZABLE')
-        Base.metadata.bind = engine
-        cls.SESSION = sessionmaker(bind=engine)
+        cls.SQLALCHEMY_ENGINE_OPTIONS = cls.get_engine_options()
+        cls.ENGINE = create_engine(cls.SQLALCHEMY_DATABASE_URI, **cls.SQLALCHEMY_ENGINE_OPTIONS)
+        Base.metadata.bind = cls.ENGINE
+        cls.SESSION = sessionmaker(bind=cls.ENGINE)
+        if cls.SQLALCHEMY_REPLICA_URI is not None:
+            cls.SQLALCHEMY_REPLICA_URI = cls.SQLALCHEMY_REPLICA_URI.format(**cls.SECRETS)
+            cls.REPLICA_ENGINE = create_engine(cls.SQLALCHEMY_REPLICA_URI,
+                                               **cls.get_engine_options(cls.SQLALCHEMY_REPLICA_URI))
+            cls.SQLALCHEMY_BINDS = {REPLICA_BIND_KEY: cls.SQLALCHEMY_REPLICA_URI}
+
+    @classmethod
+    def configure_result_cache(cls):
+        """Points the shared result cache at its on-disk store"""
+        cls.RESULT_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        result_cache.configure(
+            backend=SqliteCacheBackend(path=cls.RESULT_CACHE_PATH, max_entries=cls.RESULT_CACHE_MAX_ENTRIES),
+            ttl=cls.RESULT_CACHE_TTL
+        )
 
 
 class DevelopmentConfig(BaseConfig):
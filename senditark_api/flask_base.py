@@ -1,3 +1,48 @@
+from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import (
+    Connection,
+    Engine,
+)
+from sqlalchemy.sql.dml import UpdateBase
 
-db = SQLAlchemy()
+from senditark_api.utils.routing import REPLICA_BIND_KEY
+
+
+class RoutingSession(Session):
+    """Session that reads from the replica bind when asked to (see utils/routing.py), and otherwise from the primary
+
+    Flushes and DML statements always go to the primary, unless the session was made to refuse them
+        (see utils/routing.forbid_writes).
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs) -> Engine | Connection:
+        replica = self._db.engines.get(REPLICA_BIND_KEY)
+        if self._flushing or isinstance(clause, UpdateBase):
+            if self.info.get('read_only'):
+                raise ValueError('Cannot write through a read-only session.')
+        elif bind is None and replica is not None and self.info.get('use_replica') and \
+                self.info.get('n_primary_reads', 0) == 0:
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class SenditarkSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy extension that takes the app config's ENGINE (see BaseConfig.build_db_engine) as its
+        default bind instead of building a second one, so each process keeps a single pool. The same goes
+        for REPLICA_ENGINE, when there is one.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('session_options', {}).setdefault('class_', RoutingSession)
+        super().__init__(**kwargs)
+
+    def _make_engine(self, bind_key: str | None, options: dict, app: Flask) -> Engine:
+        config_key = {None: 'ENGINE', REPLICA_BIND_KEY: 'REPLICA_ENGINE'}.get(bind_key)
+        if config_key is not None and app.config.get(config_key) is not None:
+            return app.config[config_key]
+        return super()._make_engine(bind_key, options, app)
+
+
+db = SenditarkSQLAlchemy()
@@ -0,0 +1,10 @@
+from .base import (
+    Migration,
+    MigrationRunner,
+)
+from .v0001_hot_path_indexes import migration as v0001
+
+# Every migration, in the order they're applied
+MIGRATIONS = [
+    v0001,
+]
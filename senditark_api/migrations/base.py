@@ -0,0 +1,179 @@
+from contextlib import contextmanager
+from dataclasses import dataclass
+import time
+from typing import (
+    Callable,
+    Iterator,
+    List,
+    Set,
+    Type,
+)
+
+from pukr import get_logger
+from sqlalchemy import (
+    Connection,
+    Engine,
+    Index,
+    insert,
+    select,
+    text,
+)
+from sqlalchemy.schema import (
+    CreateIndex,
+    DropIndex,
+)
+
+from senditark_api.model import (
+    Base,
+    TableSchemaMigration,
+)
+
+log = get_logger()
+
+
+@dataclass(frozen=True)
+class Migration:
+    """A versioned change to the schema of a live database
+
+    Args:
+        version: migrations are applied once each, in ascending order of version
+        description: recorded alongside the version in the schema_migration table
+        upgrade: applies the change through the given connection
+        transactional: False when upgrade runs statements Postgres won't run inside a transaction
+            (e.g., CREATE INDEX CONCURRENTLY). Its connection then autocommits every statement, so each step
+            must be safe to run again should the migration fail partway.
+    """
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+    transactional: bool = True
+
+
+def is_postgres(conn: Connection) -> bool:
+    return conn.dialect.name == 'postgresql'
+
+
+def get_index(table: Type[Base], name: str) -> Index:
+    """Gets one of the model's indexes by name, so migrations build exactly what create_all would"""
+    return next(x for x in table.__table__.indexes if x.name == name)
+
+
+@contextmanager
+def _concurrently(index: Index) -> Iterator[Index]:
+    """Has the index built (or dropped) CONCURRENTLY on Postgres, so writes to its table carry on meanwhile"""
+    pg_options = index.dialect_options['postgresql']
+    was_concurrent = pg_options['concurrently']
+    pg_options['concurrently'] = True
+    try:
+        yield index
+    finally:
+        pg_options['concurrently'] = was_concurrent
+
+
+def _is_invalid_index(conn: Connection, index: Index) -> bool:
+    """Whether a failed CREATE INDEX CONCURRENTLY left this index behind: present, but never used by queries"""
+    return conn.execute(text("""
+        SELECT NOT i.indisvalid
+        FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relname = :index_name AND n.nspname = :schema
+    """), {'index_name': index.name, 'schema': index.table.schema or 'public'}).scalar() or False
+
+
+def create_index(conn: Connection, index: Index):
+    """Builds the index unless it's already there, without blocking writes to its table on Postgres.
+
+    The connection must autocommit (see Migration.transactional) for Postgres to build it concurrently.
+        Leftovers from an earlier failed build are dropped and rebuilt, since IF NOT EXISTS would keep them.
+    """
+    if is_postgres(conn) and _is_invalid_index(conn, index):
+        log.warning(f'Index {index.name} was left invalid by an earlier attempt. Rebuilding it.')
+        with _concurrently(index):
+            conn.execute(DropIndex(index, if_exists=True))
+    with _concurrently(index):
+        conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+class MigrationRunner:
+    """Applies pending migrations to a database and records each one in the schema_migration table"""
+
+    def __init__(self, engine: Engine, migrations: List[Migration]):
+        versions = [x.version for x in migrations]
+        if versions != sorted(set(versions)):
+            raise ValueError(f'Migration versions must be unique and ascending. Got: {versions}')
+        self.engine = engine
+        self.migrations = migrations
+
+    def get_applied_versions(self) -> Set[int]:
+        with self.engine.begin() as conn:
+            TableSchemaMigration.__table__.create(conn, checkfirst=True)
+            return set(conn.execute(select(TableSchemaMigration.version)).scalars())
+
+    def get_pending(self) -> List[Migration]:
+        applied = self.get_applied_versions()
+        return [x for x in self.migrations if x.version not in applied]
+
+    @staticmethod
+    def _record(conn: Connection, migration: Migration):
+        conn.execute(insert(TableSchemaMigration).values(version=migration.version,
+                                                         description=migration.description))
+
+    @contextmanager
+    def _connect(self, migration: Migration) -> Iterator[Connection]:
+        """Connects for the given migration, in a transaction unless it can't run in one"""
+        if migration.transactional:
+            with self.engine.begin() as conn:
+                yield conn
+            return
+        with self.engine.connect() as conn:
+            yield conn.execution_options(isolation_level='AUTOCOMMIT')
+
+    @staticmethod
+    @contextmanager
+    def _without_statement_timeout(conn: Connection, migration: Migration) -> Iterator[Connection]:
+        """Lifts the app's statement timeout on Postgres, which index builds on big tables would outlast.
+
+        A lock timeout takes its place: DDL stuck waiting behind a long transaction would otherwise hold up
+            every query that queues up behind it.
+        """
+        if not is_postgres(conn):
+            yield conn
+            return
+        if migration.transactional:
+            # Only lasts until the end of the transaction
+            conn.execute(text("SET LOCAL statement_timeout = 0; SET LOCAL lock_timeout = '10s'"))
+            yield conn
+            return
+        conn.execute(text("SET statement_timeout = 0; SET lock_timeout = '10s'"))
+        try:
+            yield conn
+        finally:
+            # Back to the connection's defaults before it's returned to the pool
+            conn.execute(text('RESET statement_timeout; RESET lock_timeout'))
+
+    def upgrade(self, target_version: int = None) -> List[int]:
+        """Applies the pending migrations up to target_version (default: all), returning their versions"""
+        applied = []
+        for migration in self.get_pending():
+            if target_version is not None and migration.version > target_version:
+                break
+            log.info(f'Applying migration {migration.version}: {migration.description}')
+            start = time.perf_counter()
+            with self._connect(migration) as conn, self._without_statement_timeout(conn, migration):
+                migration.upgrade(conn)
+                self._record(conn, migration)
+            log.info(f'Applied migration {migration.version} in {time.perf_counter() - start:.1f}s.')
+            applied.append(migration.version)
+        return applied
+
+    def stamp(self) -> List[int]:
+        """Records every pending migration as applied without running it.
+
+        For databases built straight from the models (e.g., by drop_recreate), which already have the latest schema.
+        """
+        pending = self.get_pending()
+        with self.engine.begin() as conn:
+            for migration in pending:
+                self._record(conn, migration)
+        return [x.version for x in pending]
@@ -0,0 +1,135 @@
+"""Brings databases created before the hot-path indexes up to the models: the register's keyset & per-account
+split indexes (covering, on Postgres), the tag map's, the text search ones, and one balance per account per day.
+"""
+from pukr import get_logger
+from sqlalchemy import (
+    Connection,
+    delete,
+    func,
+    insert,
+    select,
+    text,
+    tuple_,
+)
+
+from senditark_api.model import (
+    TableBalance,
+    TableBalanceQueue,
+    TablePayee,
+    TableTagToTransactionSplit,
+    TableTransaction,
+    TableTransactionSplit,
+)
+
+from .base import (
+    Migration,
+    create_index,
+    get_index,
+    is_postgres,
+)
+
+log = get_logger()
+
+INDEXES = [
+    (TableTransaction, 'ix_transaction_date_id'),
+    (TableTransactionSplit, 'ix_transaction_split_transaction_key'),
+    (TableTransactionSplit, 'ix_transaction_split_payee_key'),
+    (TableTransactionSplit, 'ix_transaction_split_debit_account_key'),
+    (TableTransactionSplit, 'ix_transaction_split_credit_account_key'),
+    (TableTagToTransactionSplit, 'ix_tag_to_transaction_split_transaction_split_key'),
+    (TableTagToTransactionSplit, 'ix_tag_to_transaction_split_tag_key'),
+]
+# Postgres-only, like the models' text_search_indexes
+SEARCH_INDEXES = [
+    (TableTransaction, 'ix_transaction_description_trgm'),
+    (TableTransaction, 'ix_transaction_description_tsv'),
+    (TableTransactionSplit, 'ix_transaction_split_memo_trgm'),
+    (TableTransactionSplit, 'ix_transaction_split_memo_tsv'),
+    (TablePayee, 'ix_payee_payee_name_trgm'),
+]
+BALANCE_CONSTRAINT = 'uq_balance_account_key_date'
+
+
+def _remove_duplicate_balances(conn: Connection):
+    """Keeps the newest balance of each account & day, requeueing the affected accounts from their first duplicate.
+
+    Balances are derived rows, so propagation restores whatever the kept row got wrong. Runs in a transaction of
+        its own, so a duplicate is never deleted without its account being queued.
+    """
+    with conn.engine.begin() as tx_conn:
+        dupes = select(TableBalance.account_key, TableBalance.date) \
+            .group_by(TableBalance.account_key, TableBalance.date) \
+            .having(func.count() > 1) \
+            .subquery()
+        account_dates = tx_conn.execute(
+            select(dupes.c.account_key, func.min(dupes.c.date)).group_by(dupes.c.account_key)
+        ).all()
+        if not account_dates:
+            return
+        log.info(f'Removing duplicate balances of {len(account_dates)} accounts.')
+        newest_ids = select(func.max(TableBalance.balance_id)) \
+            .where(tuple_(TableBalance.account_key, TableBalance.date).in_(select(dupes))) \
+            .group_by(TableBalance.account_key, TableBalance.date)
+        tx_conn.execute(
+            delete(TableBalance)
+            .where(tuple_(TableBalance.account_key, TableBalance.date).in_(select(dupes)))
+            .where(TableBalance.balance_id.not_in(newest_ids))
+        )
+        tx_conn.execute(insert(TableBalanceQueue),
+                        [{'account_key': k, 'from_date': v} for k, v in account_dates])
+
+
+def _add_balance_constraint(conn: Connection):
+    """Swaps the balance table's (account_key, date) index for a unique constraint on Postgres.
+
+    The unique index is built concurrently and then adopted by the constraint, so the table is only locked for
+        the instant of the ALTER. Other databases are only ever built straight from the models.
+    """
+    _remove_duplicate_balances(conn)
+    if not is_postgres(conn):
+        return
+    table = conn.dialect.identifier_preparer.format_table(TableBalance.__table__)
+    schema = TableBalance.__table__.schema
+    is_valid = conn.execute(text("""
+        SELECT i.indisvalid
+        FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relname = :index_name AND n.nspname = :schema
+    """), {'index_name': BALANCE_CONSTRAINT, 'schema': schema}).scalar()
+    if is_valid is False:
+        log.warning(f'Index {BALANCE_CONSTRAINT} was left invalid by an earlier attempt. Rebuilding it.')
+        conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{schema}".{BALANCE_CONSTRAINT}'))
+    conn.execute(text(f'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {BALANCE_CONSTRAINT} '
+                      f'ON {table} (account_key, date)'))
+    has_constraint = conn.execute(text("""
+        SELECT EXISTS (
+            SELECT 1
+            FROM pg_constraint c
+                JOIN pg_namespace n ON n.oid = c.connamespace
+            WHERE c.conname = :constraint_name AND n.nspname = :schema
+        )
+    """), {'constraint_name': BALANCE_CONSTRAINT, 'schema': schema}).scalar()
+    if not has_constraint:
+        conn.execute(text(f'ALTER TABLE {table} ADD CONSTRAINT {BALANCE_CONSTRAINT} '
+                          f'UNIQUE USING INDEX {BALANCE_CONSTRAINT}'))
+    # The constraint's index covers everything the old one did
+    conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{schema}".ix_balance_account_key_date'))
+
+
+def upgrade(conn: Connection):
+    for table, index_name in INDEXES:
+        create_index(conn, get_index(table, index_name))
+    if is_postgres(conn):
+        conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        for table, index_name in SEARCH_INDEXES:
+            create_index(conn, get_index(table, index_name))
+    _add_balance_constraint(conn)
+
+
+migration = Migration(
+    version=1,
+    description='Hot-path indexes and one balance per account per day',
+    upgrade=upgrade,
+    transactional=False,
+)
@@ -2,7 +2,11 @@ from .account import (
     AccountType,
     TableAccount,
 )
-from .balance import TableBalance
+from .balance import (
+    TableBalance,
+    TableBalanceCheckpoint,
+    TableBalanceQueue,
+)
 from .base import (
     Base,
     Currency,
@@ -22,6 +26,7 @@ from .scheduled_transaction import (
     TableScheduledTransaction,
     TableScheduledTransactionSplit,
 )
+from .schema_migration import TableSchemaMigration
 from .tag import (
     TableTag,
     TableTagToScheduledTransactionSplit,
@@ -8,6 +8,7 @@ from sqlalchemy import (
     Float,
     ForeignKey,
     Integer,
+    UniqueConstraint,
 )
 from sqlalchemy.orm import relationship
 
@@ -24,6 +25,11 @@ class TableBalance(Base):
     This should be used to look up the starting figure for a transaction:
         e.g., Transaction for account 'I' of 2023-11-02, looks up for balance as of the most recent date before that.
     """
+    __table_args__ = (
+        # One balance per account per day. Its index also backs the as-of lookups.
+        UniqueConstraint('account_key', 'date', name='uq_balance_account_key_date'),
+        {'schema': 'default'}
+    )
 
     balance_id: int = Column(Integer, primary_key=True, autoincrement=True)
     account_key: int = Column(Integer, ForeignKey(TableAccount.account_id), nullable=False)
@@ -45,3 +51,52 @@ class TableBalance(Base):
 
     def __repr__(self) -> str:
         return f'<TableBalance(id={self.balance_id}, date={self.date:%F}, amount={self.amount})>'
+
+
+@dataclass
+class TableBalanceQueue(Base):
+    """Balance propagation queue
+
+    Each entry marks an account's balances as stale from the given date forward.
+        Writes only record entries here; a worker later coalesces them per account down to the earliest date
+        and recomputes each account once.
+    """
+
+    balance_queue_id: int = Column(Integer, primary_key=True, autoincrement=True)
+    account_key: int = Column(Integer, ForeignKey(TableAccount.account_id), nullable=False)
+    from_date: datetime.date = Column(DATE, nullable=False)
+
+    def __init__(self, account_key: int, from_date: datetime.date):
+        self.account_key = account_key
+        self.from_date = from_date
+
+    def __repr__(self) -> str:
+        return f'<TableBalanceQueue(account_key={self.account_key}, from_date={self.from_date:%F})>'
+
+
+@dataclass
+class TableBalanceCheckpoint(Base):
+    """Month-end balance checkpoints
+
+    Holds an account's balance as of the end of each month it had activity in, maintained alongside the daily
+        balances. As-of lookups and recomputes start from the nearest checkpoint and only have to scan the splits
+        after it, rather than the account's whole history.
+    """
+    __table_args__ = (
+        UniqueConstraint('account_key', 'month_end'),
+        {'schema': 'default'}
+    )
+
+    balance_checkpoint_id: int = Column(Integer, primary_key=True, autoincrement=True)
+    account_key: int = Column(Integer, ForeignKey(TableAccount.account_id), nullable=False)
+    month_end: datetime.date = Column(DATE, nullable=False)
+    amount: float = Column(Float(2), nullable=False)
+
+    def __init__(self, account_key: int, month_end: datetime.date, amount: float):
+        self.account_key = account_key
+        self.month_end = month_end
+        self.amount = amount
+
+    def __repr__(self) -> str:
+        return f'<TableBalanceCheckpoint(account_key={self.account_key}, month_end={self.month_end:%F}, ' \
+               f'amount={self.amount})>'
@@ -1,11 +1,23 @@
+import dataclasses
 import enum
+import functools
 import re
+from typing import (
+    Any,
+    Dict,
+    List,
+    Tuple,
+)
 
 from sqlalchemy import (
+    DDL,
     TIMESTAMP,
     Boolean,
     Column,
+    Index,
+    event,
     func,
+    text,
 )
 from sqlalchemy.ext.declarative import (
     declarative_base,
@@ -18,6 +30,44 @@ class Currency(enum.IntEnum):
     USD = enum.auto()
 
 
+# Text search configuration shared by the tsvector indexes and the search queries that need to match them
+TS_CONFIG = 'english'
+
+
+def text_search_indexes(table_name: str, col_name: str, full_text: bool = True) -> List[Index]:
+    """Builds the GIN indexes behind transaction search on a text column. These only exist on Postgres.
+
+    Args:
+        table_name: used to name the indexes
+        col_name: the column to index
+        full_text: when True, also index the column's tsvector, besides its trigrams (pg_trgm)
+    """
+    indexes = [
+        Index(f'ix_{table_name}_{col_name}_trgm', col_name, postgresql_using='gin',
+              postgresql_ops={col_name: 'gin_trgm_ops'})
+    ]
+    if full_text:
+        indexes.append(
+            Index(f'ix_{table_name}_{col_name}_tsv', text(f"to_tsvector('{TS_CONFIG}', coalesce({col_name}, ''))"),
+                  postgresql_using='gin')
+        )
+    return [x.ddl_if(dialect='postgresql') for x in indexes]
+
+
+@functools.cache
+def get_model_fields(model_class: type) -> Tuple[str, ...]:
+    """Names of a dataclass model's type-hinted (i.e., serialized) fields, worked out once per class"""
+    return tuple(x.name for x in dataclasses.fields(model_class))
+
+
+def model_to_dict(obj: Any) -> Dict[str, Any]:
+    """Reads a dataclass model's serialized fields into a dict, leaving nested models as they are
+
+    Unlike dataclasses.asdict, nothing gets deep-copied, and the field list is only worked out once per class.
+    """
+    return {x: getattr(obj, x) for x in get_model_fields(type(obj))}
+
+
 class Base:
     @classmethod
     @declared_attr
@@ -44,3 +94,7 @@ class Base:
 
 
 Base = declarative_base(cls=Base)
+
+# The trigram indexes need pg_trgm in place before any table gets created
+event.listen(Base.metadata, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
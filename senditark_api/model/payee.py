@@ -7,12 +7,20 @@ from sqlalchemy import (
 )
 from sqlalchemy.orm import relationship
 
-from .base import Base
+from .base import (
+    Base,
+    text_search_indexes,
+)
 
 
 @dataclass
 class TablePayee(Base):
     """Payee table"""
+    __table_args__ = (
+        # Payee names are matched on trigrams only; they're names, not prose
+        *text_search_indexes('payee', 'payee_name', full_text=False),
+        {'schema': 'default'}
+    )
 
     payee_id: int = Column(Integer, primary_key=True, autoincrement=True)
     payee_name: str = Column(VARCHAR, nullable=False)
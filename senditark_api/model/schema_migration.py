@@ -0,0 +1,28 @@
+from dataclasses import dataclass
+
+from sqlalchemy import (
+    VARCHAR,
+    Column,
+    Integer,
+)
+
+from .base import Base
+
+
+@dataclass
+class TableSchemaMigration(Base):
+    """Schema migration table
+
+    Notes:
+        One row per migration applied (see senditark_api/migrations), created_date being when.
+    """
+
+    version: int = Column(Integer, primary_key=True, autoincrement=False)
+    description: str = Column(VARCHAR, nullable=False)
+
+    def __init__(self, version: int, description: str):
+        self.version = version
+        self.description = description
+
+    def __repr__(self) -> str:
+        return f'<TableSchemaMigration(version={self.version}, description={self.description})>'
@@ -4,6 +4,7 @@ from sqlalchemy import (
     VARCHAR,
     Column,
     ForeignKey,
+    Index,
     Integer,
 )
 from sqlalchemy.orm import (
@@ -37,6 +38,11 @@ class TableTag(Base):
 @dataclass
 class TableTagToTransactionSplit(Base):
     """Tag-to-transaction-split table"""
+    __table_args__ = (
+        Index('ix_tag_to_transaction_split_transaction_split_key', 'transaction_split_key'),
+        Index('ix_tag_to_transaction_split_tag_key', 'tag_key'),
+        {'schema': 'default'}
+    )
 
     tag_to_transaction_split_id: int = Column(Integer, primary_key=True, autoincrement=True)
     transaction_split_key: int = Column(Integer, ForeignKey(TableTransactionSplit.transaction_split_id), nullable=False)
@@ -15,6 +15,7 @@ from sqlalchemy import (
     Enum,
     Float,
     ForeignKey,
+    Index,
     Integer,
     Text,
 )
@@ -24,7 +25,10 @@ from sqlalchemy.orm import (
 )
 
 from .account import TableAccount
-from .base import Base
+from .base import (
+    Base,
+    text_search_indexes,
+)
 from .invoice import TableInvoiceSplit
 from .payee import TablePayee
 
@@ -42,6 +46,13 @@ class ReconciledState(enum.Enum):
 @dataclass
 class TableTransaction(Base):
     """Transaction table"""
+    __table_args__ = (
+        # Backs the keyset-paginated account register
+        Index('ix_transaction_date_id', 'transaction_date', 'transaction_id'),
+        *text_search_indexes('transaction', 'description'),
+        {'schema': 'default'}
+    )
+
     transaction_id: int = Column(Integer, primary_key=True, autoincrement=True)
     transaction_date: datetime.date = Column(DATE, nullable=False)
     splits = relationship('TableTransactionSplit', back_populates='transaction')
@@ -70,6 +81,20 @@ class TableTransaction(Base):
 @dataclass
 class TableTransactionSplit(Base):
     """Transaction Split table"""
+    __table_args__ = (
+        Index('ix_transaction_split_transaction_key', 'transaction_key'),
+        # Resolves payee search hits back to their splits
+        Index('ix_transaction_split_payee_key', 'payee_key'),
+        # Pick out an account's splits, e.g., for its register and its change validator. On Postgres, they also cover
+        #   the daily net flows behind propagation, which then never visit the split rows.
+        Index('ix_transaction_split_debit_account_key', 'debit_account_key',
+              postgresql_include=['transaction_key', 'amount']),
+        Index('ix_transaction_split_credit_account_key', 'credit_account_key',
+              postgresql_include=['transaction_key', 'amount']),
+        *text_search_indexes('transaction_split', 'memo'),
+        {'schema': 'default'}
+    )
+
     transaction_split_id: int = Column(Integer, primary_key=True, autoincrement=True)
     transaction_key: int = Column(Integer, ForeignKey(TableTransaction.transaction_id), nullable=False)
     transaction = relationship('TableTransaction', back_populates='splits')
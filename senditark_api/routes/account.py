@@ -3,25 +3,58 @@ from flask import (
     jsonify,
     request,
 )
-
-from senditark_api.routes.helpers import get_session
+from werkzeug.exceptions import BadRequest
+
+from senditark_api.routes.helpers import (
+    conditional_json,
+    get_date_args,
+    get_page_args,
+    get_session,
+    read_only,
+)
 from senditark_api.utils.query import SenditarkQueries as Query
 
 bp_acct = Blueprint('account', __name__, url_prefix='/account')
 
 
 @bp_acct.route('/all', methods=['GET'])
+@read_only
 def get_all_accounts_with_balances():
-    """This is used when displaying accounts"""
-    accounts_with_balances = Query.get_accounts_with_balance(get_session())
-    return jsonify(accounts_with_balances), 200
+    """This is used when displaying accounts. Takes an optional ?as_of=YYYY-MM-DD (default: today)"""
+    session = get_session()
+    as_of = next(iter(get_date_args('as_of')), None)
+    return conditional_json(
+        validator=Query.get_accounts_with_balance_validator(session, as_of=as_of),
+        build_payload=lambda: Query.get_accounts_with_balance(session, as_of=as_of)
+    )
+
+
+@bp_acct.route('/balances', methods=['GET'])
+@read_only
+def get_account_balances_as_of():
+    """Resolves balances for many accounts on many dates at once,
+        e.g., ?as_of=2023-10-31&as_of=2023-11-30&account_id=1&account_id=2
+
+    Leaving out account_id covers every account.
+    """
+    session = get_session()
+    dates = get_date_args('as_of')
+    if len(dates) == 0:
+        raise BadRequest('At least one as_of date is required.')
+    account_ids = request.args.getlist('account_id', type=int)
+    if len(account_ids) == 0:
+        account_ids = [x['account_id'] for x in Query.get_account_list(session)]
+    balances = Query.get_balances_as_of(session, account_ids=account_ids, dates=dates)
+    return jsonify(balances), 200
 
 
 @bp_acct.route('/list', methods=['GET'])
+@read_only
 def get_all_accounts():
     """This is used when you just need a list of names e.g., for a datalist"""
-    accounts = Query.get_accounts(get_session())
-    return jsonify(accounts), 200
+    session = get_session()
+    return conditional_json(validator=Query.get_account_list_validator(session),
+                            build_payload=lambda: Query.get_account_list(session))
 
 
 @bp_acct.route('/add', methods=['POST'])
@@ -38,16 +71,28 @@ def add_account():
 
 
 @bp_acct.route('/<int:account_id>', methods=['GET'])
+@read_only
 def get_account_info(account_id: int):
+    """Takes optional ?limit=N&cursor=... args to page through the register"""
     session = get_session()
-    account = Query.get_account(session, account_id=account_id)
-    transaction_splits = Query.get_transaction_data_by_account(session, account_id=account_id)
-    # scheduled_splits = Query.get_
-    return jsonify({
-        'account': account,
-        'transaction_splits': transaction_splits,
-        'scheduled_splits': [],
-    }), 200
+    limit, cursor = get_page_args()
+
+    def build_payload():
+        account = Query.get_account(session, account_id=account_id)
+        try:
+            page = Query.get_transaction_page_by_account(session, account_id=account_id, limit=limit, cursor=cursor)
+        except ValueError as err:
+            raise BadRequest(str(err))
+        # scheduled_splits = Query.get_
+        return {
+            'account': account,
+            'transaction_splits': page['transaction_splits'],
+            'next_cursor': page['next_cursor'],
+            'scheduled_splits': [],
+        }
+
+    return conditional_json(validator=Query.get_register_validator(session, account_id=account_id),
+                            build_payload=build_payload)
 
 
 @bp_acct.route('/<int:account_id>/edit', methods=['GET', 'POST'])
@@ -0,0 +1,62 @@
+from flask import (
+    Blueprint,
+    jsonify,
+    request,
+)
+
+from senditark_api.routes.helpers import (
+    get_db_conn,
+    get_session,
+    read_only,
+)
+from senditark_api.utils.db_pool import get_pool_status
+from senditark_api.utils.query import SenditarkQueries as Query
+from senditark_api.utils.rebuild import BalanceRebuilder
+from senditark_api.utils.routing import REPLICA_BIND_KEY
+
+bp_admin = Blueprint('admin', __name__, url_prefix='/admin')
+
+
+@bp_admin.route('/balance/rebuild', methods=['POST'])
+def rebuild_balances():
+    """Throws away every stored balance and rebuilds them from the transaction splits"""
+    n_rows = BalanceRebuilder.rebuild_balances(session=get_session())
+    return jsonify({
+        'success': True,
+        'message': f'Balance table rebuilt with {n_rows} rows.'
+    }), 200
+
+
+@bp_admin.route('/balance/queue', methods=['GET'])
+@read_only
+def get_balance_queue_status():
+    """Reports how far behind the balance propagation queue is"""
+    return jsonify(Query.get_balance_queue_status(session=get_session())), 200
+
+
+@bp_admin.route('/balance/recompute', methods=['POST'])
+def queue_balance_recompute():
+    """Queues every account (or just the given account_ids) for a full balance recompute by the balance worker.
+        Reports on which balances diverge come from one-off-scripts/verify_balances.py, which spreads the
+        verification across processes instead of tying up a web worker.
+    """
+    session = get_session()
+    account_ids = request.args.getlist('account_id', type=int)
+    if len(account_ids) == 0:
+        account_ids = [x['account_id'] for x in Query.get_account_list(session=session)]
+    n_queued = Query.enqueue_full_recompute(session=session, account_ids=account_ids)
+    session.commit()
+    return jsonify({
+        'success': True,
+        'message': f'Queued {n_queued} accounts for a full balance recompute.'
+    }), 200
+
+
+@bp_admin.route('/db/pool', methods=['GET'])
+def get_db_pool_status():
+    """Reports connection pool usage and checkout wait times for the worker process answering the request"""
+    engines = get_db_conn().engines
+    status = get_pool_status(engines[None])
+    if REPLICA_BIND_KEY in engines:
+        status['replica'] = get_pool_status(engines[REPLICA_BIND_KEY])
+    return jsonify(status), 200
@@ -4,13 +4,17 @@ from flask import (
     request,
 )
 
-from senditark_api.routes.helpers import get_session
+from senditark_api.routes.helpers import (
+    get_session,
+    read_only,
+)
 from senditark_api.utils.query import SenditarkQueries as Query
 
 bp_budg = Blueprint('budget', __name__, url_prefix='/budget')
 
 
 @bp_budg.route('/all', methods=['GET'])
+@read_only
 def get_all_budgets():
     session = get_session()
     budgets = Query.get_budgets(session=session, limit=250)
@@ -27,6 +31,7 @@ def add_budget():
 
 
 @bp_budg.route('/<int:budget_id>',  methods=['GET'])
+@read_only
 def get_budget(budget_id: int):
     session = get_session()
     budget = Query.get_budget(session=session, budget_id=budget_id)
@@ -3,11 +3,18 @@ from flask import (
     jsonify,
 )
 
+from senditark_api.routes.helpers import get_session
+from senditark_api.utils.partitioning import ensure_year_partitions
+from senditark_api.utils.propagation import PropagationHelper
+
 bp_cron = Blueprint('cron', __name__, url_prefix='/cron')
 
 
 @bp_cron.route('/', methods=['GET'])
 def run_cron():
+    n_accounts = PropagationHelper.process_balance_queue(session=get_session())
+    new_partitions = ensure_year_partitions(session=get_session())
     return jsonify({
-        'message': 'TODO!'
+        'message': f'Recomputed balances for {n_accounts} accounts.',
+        'new_partitions': new_partitions,
     })
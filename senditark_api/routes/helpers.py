@@ -1,11 +1,30 @@
+import datetime
+import functools
 import time
+from typing import (
+    Any,
+    Callable,
+    List,
+    Optional,
+    Tuple,
+)
 
 from flask import (
+    Response,
     current_app,
     g,
+    jsonify,
     request,
 )
 from pukr import PukrLog
+from werkzeug.exceptions import BadRequest
+
+from senditark_api.utils.isolation import begin_read_only
+from senditark_api.utils.routing import (
+    REPLICA_BIND_KEY,
+    forbid_writes,
+    route_reads_to_replica,
+)
 
 
 def get_db_conn():
@@ -16,6 +35,69 @@ def get_session():
     return get_db_conn().session
 
 
+def read_only(func: Callable) -> Callable:
+    """Runs a route that only reads on the read replica, when there is one, in a read-only snapshot
+        (see begin_read_only) that skips the locking writes need and keeps its queries consistent with one another.
+
+    The route must not write. Without a replica, its snapshot is a READ ONLY transaction on the primary, so any
+        write fails there, and the session refuses writes with or without a replica to match (see forbid_writes).
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        session = get_session()
+        has_replica = REPLICA_BIND_KEY in get_db_conn().engines
+        if has_replica:
+            route_reads_to_replica(session)
+        forbid_writes(session)
+        begin_read_only(session, on_standby=has_replica)
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def get_date_args(name: str) -> List[datetime.date]:
+    """Parses every YYYY-MM-DD value of the given query arg"""
+    try:
+        return [datetime.date.fromisoformat(x) for x in request.args.getlist(name)]
+    except ValueError:
+        raise BadRequest(f'Query arg "{name}" must be a date in the form YYYY-MM-DD.')
+
+
+def get_page_args() -> Tuple[Optional[int], Optional[str]]:
+    """Reads the ?limit=N&cursor=... pagination args"""
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit < 1:
+        raise BadRequest('Query arg "limit" must be a positive integer.')
+    return limit, request.args.get('cursor')
+
+
+def conditional_json(validator: Tuple[Optional[datetime.datetime], str], build_payload: Callable[[], Any]) -> Response:
+    """Answers a GET with 304 Not Modified when the client's copy is still current, or else with the JSON payload.
+
+    The payload is only built when it's actually sent. If-None-Match takes precedence over If-Modified-Since.
+
+    Args:
+        validator: the (last modified, etag) pair from one of the query helpers' change validators.
+            update_date is taken to be stored in UTC.
+        build_payload: builds what gets passed to jsonify
+    """
+    last_modified, etag = validator
+    # Payloads can change shape between versions even when the data doesn't
+    etag = f'{current_app.config.get("VERSION")}-{etag}'
+    if last_modified is not None:
+        last_modified = last_modified.replace(tzinfo=datetime.timezone.utc, microsecond=0)
+    if request.if_none_match:
+        is_current = request.if_none_match.contains(etag)
+    else:
+        is_current = request.if_modified_since is not None and last_modified is not None and \
+            last_modified <= request.if_modified_since
+    response = current_app.response_class(status=304) if is_current else jsonify(build_payload())
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Clients may keep the response, but have to check it's still current before each use
+    response.cache_control.no_cache = True
+    return response
+
+
 def get_app_logger() -> PukrLog:
     return current_app.extensions['logg']
 
@@ -4,13 +4,17 @@ from flask import (
     request,
 )
 
-from senditark_api.routes.helpers import get_session
+from senditark_api.routes.helpers import (
+    get_session,
+    read_only,
+)
 from senditark_api.utils.query import SenditarkQueries as Query
 
 bp_invc = Blueprint('invoice', __name__, url_prefix='/invoice')
 
 
 @bp_invc.route('/all', methods=['GET'])
+@read_only
 def get_all_invoices():
     session = get_session()
     invoices = Query.get_invoices(session=session, limit=250)
@@ -26,6 +30,7 @@ def add_invoice():
 
 
 @bp_invc.route('/<int:invoice_id>', methods=['GET'])
+@read_only
 def get_invoice(invoice_id: int):
     session = get_session()
     invoice = Query.get_invoice(session=session, invoice_id=invoice_id)
@@ -4,16 +4,32 @@ from flask import (
     request,
 )
 
-from senditark_api.routes.helpers import get_session
+from senditark_api.routes.helpers import (
+    conditional_json,
+    get_page_args,
+    get_session,
+    read_only,
+)
 from senditark_api.utils.query import SenditarkQueries as Query
 
 bp_payee = Blueprint('payee', __name__, url_prefix='/payee')
 
 
 @bp_payee.route('/all', methods=['GET'])
+@read_only
 def get_all_payees():
     session = get_session()
-    payees = Query.get_payees(session=session, limit=250)
+    return conditional_json(validator=Query.get_payee_list_validator(session=session),
+                            build_payload=lambda: Query.get_payee_list(session=session))
+
+
+@bp_payee.route('/suggest', methods=['GET'])
+@read_only
+def suggest_payees():
+    """Autocompletes payee names starting with ?q=..., most used first. Takes an optional ?limit=N (default 10)."""
+    session = get_session()
+    limit, _ = get_page_args()
+    payees = Query.suggest_payees(session=session, prefix=request.args.get('q', ''), limit=limit or 10)
     return jsonify(payees), 200
 
 
@@ -31,6 +47,7 @@ def add_payee():
 
 
 @bp_payee.route('/<int:payee_id>', methods=['GET'])
+@read_only
 def get_payee(payee_id: int):
     session = get_session()
     payee = Query.get_payee(session=session, payee_id=payee_id)
@@ -4,17 +4,22 @@ from flask import (
     request,
 )
 
-from senditark_api.routes.helpers import get_session
+from senditark_api.routes.helpers import (
+    conditional_json,
+    get_session,
+    read_only,
+)
 from senditark_api.utils.query import SenditarkQueries as Query
 
 bp_tag = Blueprint('tag', __name__, url_prefix='/tag')
 
 
 @bp_tag.route('/all', methods=['GET'])
+@read_only
 def get_all_tags():
     session = get_session()
-    tags = Query.get_tags(session=session, limit=250)
-    return jsonify(tags), 200
+    return conditional_json(validator=Query.get_tag_list_validator(session=session),
+                            build_payload=lambda: Query.get_tag_list(session=session))
 
 
 @bp_tag.route('/add', methods=['POST'])
@@ -31,6 +36,7 @@ def add_tag():
 
 
 @bp_tag.route('/<int:tag_id>', methods=['GET'])
+@read_only
 def get_tag(tag_id: int):
     session = get_session()
     tag = Query.get_tag(session=session, tag_id=tag_id)
@@ -1,16 +1,34 @@
+import io
+import pathlib
+
 from flask import (
     Blueprint,
+    Response,
+    current_app,
     jsonify,
     request,
+    stream_with_context,
+)
+from werkzeug.exceptions import BadRequest
+
+from senditark_api.routes.helpers import (
+    conditional_json,
+    get_date_args,
+    get_page_args,
+    get_session,
+    read_only,
+)
+from senditark_api.utils.importer import (
+    StatementImporter,
+    StatementParser,
 )
-
-from senditark_api.routes.helpers import get_session
 from senditark_api.utils.query import SenditarkQueries as Query
 
 bp_trans = Blueprint('transaction', __name__, url_prefix='/transaction')
 
 
 @bp_trans.route('/all', methods=['GET'])
+@read_only
 def get_all_transactions():
     session = get_session()
     transactions = Query.get_transactions(session=session)
@@ -39,15 +57,100 @@ def add_transaction():
     # }), 200
 
 
+@bp_trans.route('/import', methods=['POST'])
+def import_statement():
+    """Imports a bank statement uploaded as the multipart 'file' field.
+
+    Form fields:
+        account_id: the account the statement belongs to
+        offset_account_id: the other side of every line that doesn't name its own account
+        format: one of csv, ofx or qif (default: the file's extension)
+        date_format: strptime format for the date column of CSVs (default: YYYY-MM-DD)
+    """
+    session = get_session()
+    upload = request.files.get('file')
+    account_id = request.form.get('account_id', type=int)
+    offset_account_id = request.form.get('offset_account_id', type=int)
+    if upload is None or account_id is None or offset_account_id is None:
+        raise BadRequest('A statement file, account_id and offset_account_id are required.')
+    fmt = request.form.get('format') or pathlib.Path(upload.filename or '').suffix
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', errors='replace', newline='')
+    try:
+        lines = StatementParser.parse(stream=stream, fmt=fmt, date_format=request.form.get('date_format'))
+        summary = StatementImporter(session=session, account_id=account_id,
+                                    offset_account_id=offset_account_id).import_lines(lines)
+    except ValueError as err:
+        raise BadRequest(str(err))
+    return jsonify({
+        'success': True,
+        'message': f'Imported {summary["n_transactions"]} transactions.',
+        **summary
+    }), 200
+
+
+@bp_trans.route('/search', methods=['GET'])
+@read_only
+def search_transactions():
+    """Ranks transaction splits by how well their description, memo and payee match ?q=...
+        Takes optional ?min_amount=&max_amount=&start_date=YYYY-MM-DD&end_date=YYYY-MM-DD&limit=N args.
+    """
+    session = get_session()
+    term = request.args.get('q', '')
+    limit, _ = get_page_args()
+    try:
+        results = Query.search_transaction_splits(
+            session=session, term=term, min_amount=request.args.get('min_amount', type=float),
+            max_amount=request.args.get('max_amount', type=float),
+            start_date=next(iter(get_date_args('start_date')), None),
+            end_date=next(iter(get_date_args('end_date')), None), limit=limit or 50)
+    except ValueError as err:
+        raise BadRequest(str(err))
+    return jsonify({'results': results}), 200
+
+
 @bp_trans.route('/by-account/<int:account_id>/', methods=['GET'])
+@read_only
 def get_transactions_by_account(account_id: int):
+    """Takes optional ?limit=N&cursor=... args.
+        With a limit, responds with a single page and the cursor for the next one; otherwise the whole register.
+    """
     session = get_session()
-    transaction_data = Query.get_transaction_data_by_account(session=session, account_id=account_id)
+    limit, cursor = get_page_args()
+
+    def build_payload():
+        if limit is None and cursor is None:
+            return Query.get_transaction_data_by_account(session=session, account_id=account_id)
+        try:
+            return Query.get_transaction_page_by_account(session=session, account_id=account_id, limit=limit,
+                                                         cursor=cursor)
+        except ValueError as err:
+            raise BadRequest(str(err))
+
+    return conditional_json(validator=Query.get_register_validator(session=session, account_id=account_id),
+                            build_payload=build_payload)
+
+
+@bp_trans.route('/by-account/<int:account_id>/stream', methods=['GET'])
+@read_only
+def stream_transactions_by_account(account_id: int):
+    """Streams the register as newline-delimited JSON, one row per line, as it's read from the database.
+        Takes optional ?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD args.
+    """
+    session = get_session()
+    start_date = next(iter(get_date_args('start_date')), None)
+    end_date = next(iter(get_date_args('end_date')), None)
+
+    def generate_lines():
+        rows = Query.iter_transaction_data_by_account(session=session, account_id=account_id, start_date=start_date,
+                                                      end_date=end_date)
+        for row in rows:
+            yield current_app.json.dumps(row) + '\n'
 
-    return jsonify(transaction_data), 200
+    return Response(stream_with_context(generate_lines()), mimetype='application/x-ndjson')
 
 
 @bp_trans.route('/<int:transaction_id>', methods=['GET'])
+@read_only
 def get_transaction(transaction_id: int):
     session = get_session()
     transaction = Query.get_transaction(session=session, transaction_id=transaction_id)
@@ -74,3 +177,38 @@ def delete_transaction(transaction_id: int):
         'success': True,
         'message': f'Transaction with id {transaction_id} successfully deleted.'
     }), 200
+
+
+@bp_trans.route('/bulk/delete', methods=['POST'])
+def delete_transactions():
+    """Deletes many transactions at once. Takes {"transaction_ids": [...]}"""
+    session = get_session()
+    transaction_ids = request.get_json(force=True).get('transaction_ids', [])
+    try:
+        account_dates = Query.delete_transactions(session=session, transaction_ids=transaction_ids)
+    except ValueError as err:
+        raise BadRequest(str(err))
+    return jsonify({
+        'success': True,
+        'message': f'{len(set(transaction_ids))} transactions successfully deleted.',
+        'accounts': [{'account_id': k, 'from_date': v} for k, v in sorted(account_dates.items())],
+    }), 200
+
+
+@bp_trans.route('/bulk/edit', methods=['POST'])
+def edit_transactions():
+    """Edits many transactions and splits at once.
+        Takes {"transactions": [{"transaction_id": 1, ...}], "splits": [{"transaction_split_id": 2, ...}]}
+    """
+    session = get_session()
+    data = request.get_json(force=True)
+    try:
+        account_dates = Query.edit_transactions(session=session, transaction_edits=data.get('transactions'),
+                                                split_edits=data.get('splits'))
+    except (KeyError, ValueError) as err:
+        raise BadRequest(str(err))
+    return jsonify({
+        'success': True,
+        'message': 'Transactions successfully edited.',
+        'accounts': [{'account_id': k, 'from_date': v} for k, v in sorted(account_dates.items())],
+    }), 200
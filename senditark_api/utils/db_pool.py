@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+from typing import Dict
+
+from sqlalchemy import (
+    Engine,
+    exc,
+)
+from sqlalchemy.pool import QueuePool
+
+
+class PoolMetrics:
+    """Running checkout stats for one process's connection pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.n_checkouts = 0
+        self.n_timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.n_timeouts += 1
+            else:
+                self.n_checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            n_attempts = self.n_checkouts + self.n_timeouts
+            return {
+                'n_checkouts': self.n_checkouts,
+                'n_timeouts': self.n_timeouts,
+                'mean_wait_ms': 1000 * self.total_wait / n_attempts if n_attempts > 0 else 0.0,
+                'max_wait_ms': 1000 * self.max_wait,
+            }
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that times every checkout
+
+    Wait time covers everything between asking for a connection and getting one: queueing behind other threads
+        once the pool and its overflow are all in use, as well as opening new connections.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Recreated pools (e.g., on dispose) start their stats over
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - start)
+        return conn
+
+
+def get_pool_status(engine: Engine) -> Dict:
+    """Reports the current state of the engine's pool in this process, along with its checkout stats if metered
+
+    Each process (e.g., gunicorn worker) has its own pool, so this only speaks for the one that's asked. At most
+        max_connections connections are open per process.
+    """
+    pool = engine.pool
+    status = {
+        'pid': os.getpid(),
+        'pool_class': type(pool).__name__,
+    }
+    if isinstance(pool, QueuePool):
+        status.update({
+            'size': pool.size(),
+            'max_connections': pool.size() + max(pool._max_overflow, 0),
+            'checked_in': pool.checkedin(),
+            'in_use': pool.checkedout(),
+            'overflow': pool.overflow(),
+            'timeout': pool.timeout(),
+        })
+    if isinstance(pool, MeteredQueuePool):
+        status.update(pool.metrics.snapshot())
+    return status
@@ -0,0 +1,296 @@
+import csv
+from dataclasses import dataclass
+import datetime
+from itertools import islice
+import re
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    TextIO,
+)
+
+from pukr import get_logger
+from sqlalchemy import (
+    insert,
+    select,
+)
+from sqlalchemy.orm import Session
+
+from senditark_api.model import (
+    ReconciledState,
+    TableAccount,
+    TablePayee,
+    TableTransaction,
+    TableTransactionSplit,
+)
+from senditark_api.utils.payee_index import payee_index
+from senditark_api.utils.query import SenditarkQueries
+
+log = get_logger()
+
+
+@dataclass
+class StatementLine:
+    """A single entry parsed off a bank statement.
+
+    The amount is signed from the statement account's point of view: positive amounts increase its balance
+        (deposits, refunds), negative ones decrease it (withdrawals, charges).
+    """
+    line_no: int
+    transaction_date: datetime.date
+    amount: float
+    payee: Optional[str] = None
+    memo: Optional[str] = None
+    # Name or full name of the other side of the entry. Falls back to the importer's offset account.
+    account: Optional[str] = None
+
+
+class StatementParser:
+    """Streaming parsers for bank statement files. Each yields StatementLines as it reads, one line at a time."""
+    FORMATS = ['csv', 'ofx', 'qif']
+    OFX_TAG_REGEX = re.compile(r'<(/?)([A-Z0-9.]+)>([^<]*)', re.IGNORECASE)
+
+    @staticmethod
+    def _parse_amount(value: str) -> float:
+        return float(value.strip().replace('$', '').replace(',', ''))
+
+    @staticmethod
+    def _clean_str(value: Optional[str]) -> Optional[str]:
+        if value is None:
+            return None
+        value = value.strip()
+        return value if value != '' else None
+
+    @classmethod
+    def parse(cls, stream: TextIO, fmt: str, date_format: str = None) -> Iterator[StatementLine]:
+        fmt = fmt.lower().lstrip('.')
+        if fmt == 'csv':
+            return cls.parse_csv(stream=stream, date_format=date_format)
+        elif fmt == 'ofx':
+            return cls.parse_ofx(stream=stream)
+        elif fmt == 'qif':
+            return cls.parse_qif(stream=stream)
+        raise ValueError(f'Unsupported statement format: {fmt}. Must be one of {", ".join(cls.FORMATS)}.')
+
+    @classmethod
+    def parse_csv(cls, stream: TextIO, date_format: str = None) -> Iterator[StatementLine]:
+        """Reads a CSV with a header row of at least date & amount, and optionally payee, memo & account columns.
+
+        Args:
+            date_format: strptime format of the date column. When None, dates are expected as YYYY-MM-DD.
+        """
+        reader = csv.DictReader(stream)
+        if reader.fieldnames is None:
+            return
+        reader.fieldnames = [x.strip().lower() for x in reader.fieldnames]
+        missing_cols = {'date', 'amount'} - set(reader.fieldnames)
+        if len(missing_cols) > 0:
+            raise ValueError(f'CSV statement is missing columns: {", ".join(sorted(missing_cols))}')
+        for row in reader:
+            line_no = reader.line_num
+            try:
+                if date_format is None:
+                    trans_date = datetime.date.fromisoformat(row['date'].strip())
+                else:
+                    trans_date = datetime.datetime.strptime(row['date'].strip(), date_format).date()
+                amount = cls._parse_amount(row['amount'])
+            except (AttributeError, ValueError) as err:
+                raise ValueError(f'Failed to parse CSV line {line_no}: {err}') from err
+            yield StatementLine(line_no=line_no, transaction_date=trans_date, amount=amount,
+                                payee=cls._clean_str(row.get('payee')), memo=cls._clean_str(row.get('memo')),
+                                account=cls._clean_str(row.get('account')))
+
+    @classmethod
+    def parse_ofx(cls, stream: TextIO) -> Iterator[StatementLine]:
+        """Reads the <STMTTRN> entries of an OFX file. Handles both SGML (v1) and XML (v2) flavors."""
+        entry = None
+        entry_line_no = 0
+        for line_no, line in enumerate(stream, start=1):
+            for closing, tag, value in cls.OFX_TAG_REGEX.findall(line):
+                tag = tag.upper()
+                if tag == 'STMTTRN':
+                    if closing == '':
+                        entry, entry_line_no = {}, line_no
+                        continue
+                    try:
+                        # Dates look like YYYYMMDD[HHMMSS[.XXX][TZ]]
+                        posted = entry['DTPOSTED']
+                        trans_date = datetime.date(int(posted[:4]), int(posted[4:6]), int(posted[6:8]))
+                        amount = cls._parse_amount(entry['TRNAMT'])
+                    except (KeyError, ValueError) as err:
+                        raise ValueError(f'Failed to parse OFX entry starting on line {entry_line_no}: {err}') from err
+                    yield StatementLine(line_no=entry_line_no, transaction_date=trans_date, amount=amount,
+                                        payee=cls._clean_str(entry.get('NAME') or entry.get('PAYEE')),
+                                        memo=cls._clean_str(entry.get('MEMO')))
+                    entry = None
+                elif entry is not None and closing == '':
+                    entry[tag] = value.strip()
+
+    @staticmethod
+    def _parse_qif_date(value: str) -> datetime.date:
+        """Parses QIF dates, which show up as e.g., 1/5/2023, 01/05'23 or 1/ 5/23 (all MM/DD)"""
+        value = value.strip().replace(' ', '')
+        if '-' in value:
+            return datetime.date.fromisoformat(value)
+        month, day, year = re.split(r"[/']", value)
+        year = int(year)
+        if year < 100:
+            year += 2000 if year < 70 else 1900
+        return datetime.date(year, int(month), int(day))
+
+    @classmethod
+    def parse_qif(cls, stream: TextIO) -> Iterator[StatementLine]:
+        """Reads the records of a QIF bank/cash/credit card export (D, T/U, P, M & L fields, ^ ending each)"""
+        record = {}
+        record_line_no = 1
+        for line_no, line in enumerate(stream, start=1):
+            line = line.rstrip('\r\n')
+            if line == '' or line.startswith('!'):
+                continue
+            code, value = line[0], line[1:]
+            if code != '^':
+                if len(record) == 0:
+                    record_line_no = line_no
+                # The first of T & U wins, they're just duplicates of one another
+                record.setdefault(code, value)
+                continue
+            try:
+                trans_date = cls._parse_qif_date(record['D'])
+                amount = cls._parse_amount(record['T'] if 'T' in record else record['U'])
+            except (KeyError, ValueError) as err:
+                raise ValueError(f'Failed to parse QIF record starting on line {record_line_no}: {err}') from err
+            # Categories may carry a /class suffix; transfers are written as [Account]
+            category = cls._clean_str(record.get('L', '').split('/')[0].strip('[]'))
+            yield StatementLine(line_no=record_line_no, transaction_date=trans_date, amount=amount,
+                                payee=cls._clean_str(record.get('P')), memo=cls._clean_str(record.get('M')),
+                                account=category)
+            record = {}
+
+
+class StatementImporter:
+    """Loads statement lines into one two-legged transaction each, against a single statement account.
+
+    Lines are inserted in batches with multi-row INSERTs, all inside one database transaction that only commits
+        once every line is in. Payees and accounts are resolved against lookups loaded once up front;
+        payees not seen before are created along the way. Balance propagation is queued once per affected account
+        from its earliest imported date.
+    """
+    BATCH_SIZE = 5000
+    UNNAMED_PAYEE = 'UNNAMED'
+
+    def __init__(self, session: Session, account_id: int, offset_account_id: int):
+        """
+        Args:
+            account_id: the account the statement belongs to
+            offset_account_id: the other side of every line that doesn't name its own account
+        """
+        self.session = session
+        self.account_id = account_id
+        self.offset_account_id = offset_account_id
+        self.payee_ids = {}
+        for payee_id, payee_name in session.execute(select(TablePayee.payee_id, TablePayee.payee_name)):
+            self.payee_ids.setdefault(payee_name.lower(), payee_id)
+        # Full names are unique, plain names win on a first-come basis
+        self.account_ids = {}
+        for acct_id, name, full_name in session.execute(
+                select(TableAccount.account_id, TableAccount.name, TableAccount.full_name).
+                order_by(TableAccount.account_id)):
+            self.account_ids.setdefault(name.upper(), acct_id)
+            self.account_ids[full_name.upper()] = acct_id
+        for acct_id in [account_id, offset_account_id]:
+            if acct_id not in self.account_ids.values():
+                raise ValueError(f'Failed to find account with id: {acct_id}')
+        self.earliest_dates: Dict[int, datetime.date] = {}
+        self.new_payees: Dict[int, str] = {}
+        self.n_transactions = 0
+        self.n_new_payees = 0
+
+    def _resolve_account(self, line: StatementLine) -> int:
+        if line.account is None:
+            return self.offset_account_id
+        try:
+            return self.account_ids[line.account.upper()]
+        except KeyError:
+            raise ValueError(f'Line {line.line_no} names an unknown account: {line.account}')
+
+    def _add_missing_payees(self, payee_names: Set[str]):
+        new_names = {}
+        for name in payee_names:
+            # Case variants of a new name all map to whichever was seen first
+            new_names.setdefault(name.lower(), name)
+        new_names = [name for key, name in new_names.items() if key not in self.payee_ids]
+        if len(new_names) == 0:
+            return
+        for payee_id, payee_name in self.session.execute(
+                insert(TablePayee).returning(TablePayee.payee_id, TablePayee.payee_name),
+                [{'payee_name': name} for name in new_names]):
+            self.payee_ids[payee_name.lower()] = payee_id
+            self.new_payees[payee_id] = payee_name
+        self.n_new_payees += len(new_names)
+
+    def _insert_batch(self, lines: List[StatementLine]):
+        payee_names = [x.payee or self.UNNAMED_PAYEE for x in lines]
+        self._add_missing_payees(set(payee_names))
+        offset_account_ids = [self._resolve_account(x) for x in lines]
+
+        transaction_ids = self.session.execute(
+            insert(TableTransaction).returning(TableTransaction.transaction_id, sort_by_parameter_order=True),
+            [{'transaction_date': x.transaction_date, 'description': x.memo, 'is_scheduled': False} for x in lines]
+        ).scalars().all()
+
+        splits = []
+        for transaction_id, line, payee_name, offset_account_id in \
+                zip(transaction_ids, lines, payee_names, offset_account_ids):
+            if line.amount >= 0:
+                debit_account_id, credit_account_id = self.account_id, offset_account_id
+            else:
+                debit_account_id, credit_account_id = offset_account_id, self.account_id
+            splits.append({
+                'transaction_key': transaction_id,
+                'payee_key': self.payee_ids[payee_name.lower()],
+                'debit_account_key': debit_account_id,
+                'credit_account_key': credit_account_id,
+                'amount': abs(line.amount),
+                'reconciled_state': ReconciledState.c,
+            })
+            for acct_id in [debit_account_id, credit_account_id]:
+                if acct_id not in self.earliest_dates or line.transaction_date < self.earliest_dates[acct_id]:
+                    self.earliest_dates[acct_id] = line.transaction_date
+        self.session.execute(insert(TableTransactionSplit), splits)
+        self.n_transactions += len(lines)
+        log.debug(f'Inserted batch of {len(lines)} statement lines ({self.n_transactions} so far).')
+
+    def import_lines(self, lines: Iterable[StatementLine]) -> Dict:
+        """Inserts every line and queues balance propagation, then commits. Rolls back everything on failure.
+
+        Returns:
+            dict with the number of transactions & new payees, and the earliest date imported per account
+        """
+        lines = iter(lines)
+        try:
+            while True:
+                batch = list(islice(lines, self.BATCH_SIZE))
+                if len(batch) == 0:
+                    break
+                self._insert_batch(batch)
+            SenditarkQueries.enqueue_balance_propagation(session=self.session,
+                                                         account_dates=self.earliest_dates.items())
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+        if len(self.new_payees) > 0:
+            SenditarkQueries._bump_caches(obj_class=TablePayee)
+        for payee_id, payee_name in self.new_payees.items():
+            payee_index.add(payee_id=payee_id, payee_name=payee_name)
+        log.info(f'Imported {self.n_transactions} transactions ({self.n_new_payees} new payees) '
+                 f'across {len(self.earliest_dates)} accounts.')
+        return {
+            'n_transactions': self.n_transactions,
+            'n_new_payees': self.n_new_payees,
+            'earliest_dates': [{'account_id': k, 'date': v} for k, v in sorted(self.earliest_dates.items())],
+        }
@@ -0,0 +1,119 @@
+import functools
+import random
+import time
+from typing import (
+    Callable,
+    Optional,
+    TypeVar,
+)
+
+from pukr import get_logger
+from sqlalchemy import exc
+from sqlalchemy.orm import (
+    Session,
+    scoped_session,
+)
+
+log = get_logger()
+
+F = TypeVar('F', bound=Callable)
+
+# SQLSTATEs for which Postgres expects the whole transaction to be retried: serialization_failure & deadlock_detected
+RETRYABLE_PGCODES = {'40001', '40P01'}
+
+
+def _unwrap(session: Session | scoped_session) -> Session:
+    """Gets the actual session behind a scoped session (e.g., Flask-SQLAlchemy's db.session)"""
+    return session() if isinstance(session, scoped_session) else session
+
+
+def _is_postgres(session: Session) -> bool:
+    return session.get_bind().dialect.name == 'postgresql'
+
+
+def begin_read_only(session: Session, on_standby: bool = False):
+    """Starts the session's next transaction as SERIALIZABLE READ ONLY DEFERRABLE (on Postgres)
+
+    Such a transaction waits for a snapshot that can't conflict with any writer, then runs without predicate locks
+        and can never fail on serialization. Every query in it reads the same snapshot. Does nothing if the
+        session is already mid-transaction, since the isolation level can only be picked before it begins.
+
+    Args:
+        on_standby: when the session reads from a hot standby, which doesn't allow SERIALIZABLE. REPEATABLE READ
+            READ ONLY is used instead, which still keeps every query on the same snapshot.
+    """
+    session = _unwrap(session)
+    if session.in_transaction() or not _is_postgres(session):
+        return
+    if on_standby:
+        session.connection(execution_options={'isolation_level': 'REPEATABLE READ', 'postgresql_readonly': True})
+        return
+    session.connection(execution_options={
+        'isolation_level': 'SERIALIZABLE',
+        'postgresql_readonly': True,
+        'postgresql_deferrable': True,
+    })
+
+
+def begin_serializable(session: Session):
+    """Starts the session's next transaction as SERIALIZABLE. Does nothing if it's already mid-transaction."""
+    session = _unwrap(session)
+    if session.in_transaction():
+        return
+    session.connection(execution_options={'isolation_level': 'SERIALIZABLE'})
+
+
+def get_isolation_level(session: Session) -> str:
+    """Gets the isolation level of the session's current (or next) transaction, e.g., 'READ COMMITTED'"""
+    return _unwrap(session).connection().get_isolation_level()
+
+
+def is_retryable(err: exc.DBAPIError) -> bool:
+    return getattr(err.orig, 'pgcode', None) in RETRYABLE_PGCODES
+
+
+def _find_session(args: tuple, kwargs: dict) -> Optional[Session]:
+    session = kwargs.get('session')
+    if session is None:
+        session = next((x for x in args if isinstance(x, (Session, scoped_session))), None)
+    return None if session is None else _unwrap(session)
+
+
+def serializable_retry(max_attempts: int = 5, base_delay: float = 0.05, max_delay: float = 2.0) -> Callable[[F], F]:
+    """Runs the decorated unit of work in its own SERIALIZABLE transaction, replaying it from the start when
+    Postgres aborts it with a serialization failure or deadlock.
+
+    The unit of work must take its session as an argument, commit at its end, and be safe to run again after a
+        rollback (i.e., only take ids & plain data, not objects pending in the session). Retries back off
+        exponentially from base_delay, with full jitter, up to max_delay.
+
+    When the session is already mid-transaction, the caller owns it: the unit of work joins it as-is and isn't
+        retried, since a rollback would also discard whatever the caller did before. On Postgres, joining a
+        transaction that isn't SERIALIZABLE logs a warning, since the unit of work then runs without the
+        isolation it was written against.
+    """
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            session = _find_session(args, kwargs)
+            if session is None:
+                return func(*args, **kwargs)
+            if session.in_transaction():
+                if _is_postgres(session) and (level := get_isolation_level(session)) != 'SERIALIZABLE':
+                    log.warning(f'{func.__qualname__} joined an open {level} transaction and will run without '
+                                f'SERIALIZABLE isolation. Start it with begin_serializable() instead.')
+                return func(*args, **kwargs)
+            for attempt in range(1, max_attempts + 1):
+                begin_serializable(session)
+                try:
+                    return func(*args, **kwargs)
+                except exc.DBAPIError as err:
+                    session.rollback()
+                    if not is_retryable(err) or attempt == max_attempts:
+                        raise
+                    delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+                    log.warning(f'{func.__qualname__} hit a serialization failure (attempt {attempt} of '
+                                f'{max_attempts}). Retrying in {delay:.3f}s.')
+                    time.sleep(delay)
+        return wrapper
+    return decorator
@@ -0,0 +1,209 @@
+"""Opt-in yearly range partitioning of the tables that grow without bound (Postgres only)
+
+balance is partitioned by date: one partition per calendar year (e.g., balance_y2024), plus a default partition
+    catching anything outside of them. Queries filtering on that column then only scan the years they cover.
+
+transaction_split isn't partitioned: it has no date of its own, and tag_to_transaction_split's foreign key into it
+    would have to carry the partition column too.
+
+Tables start out unpartitioned. partition_table converts one in place (see one-off-scripts/partition_tables.py),
+    and ensure_year_partitions, run by the cron, adds next year's partition ahead of time.
+"""
+import datetime
+from typing import (
+    Iterable,
+    List,
+    Set,
+    Type,
+)
+
+from pukr import get_logger
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import (
+    AddConstraint,
+    CreateIndex,
+    ForeignKeyConstraint,
+    UniqueConstraint,
+)
+
+from senditark_api.model import (
+    Base,
+    TableBalance,
+)
+
+log = get_logger()
+
+# Each partitionable table, along with the date column it gets partitioned by
+PARTITION_COLUMNS = {
+    TableBalance: 'date',
+}
+
+
+def _is_postgres(session: Session) -> bool:
+    return session.get_bind().dialect.name == 'postgresql'
+
+
+def _quote(session: Session, table: Type[Base], name: str) -> str:
+    """Quotes a relation's name, qualified by the table's schema"""
+    preparer = session.get_bind().dialect.identifier_preparer
+    return f'{preparer.quote_schema(table.__table__.schema)}.{preparer.quote(name)}'
+
+
+def get_partition_name(table: Type[Base], year: int = None) -> str:
+    """Names the table's partition for the given year, or its default partition when there's no year"""
+    return f'{table.__tablename__}_default' if year is None else f'{table.__tablename__}_y{year}'
+
+
+def _get_year_bounds(year: int) -> str:
+    return f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+
+
+def is_partitioned(session: Session, table: Type[Base]) -> bool:
+    return session.execute(text("""
+        SELECT EXISTS (
+            SELECT 1
+            FROM pg_partitioned_table p
+                JOIN pg_class c ON c.oid = p.partrelid
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE c.relname = :table_name AND n.nspname = :schema
+        )
+    """), {'table_name': table.__tablename__, 'schema': table.__table__.schema}).scalar()
+
+
+def get_partition_years(session: Session, table: Type[Base]) -> Set[int]:
+    """Lists the years the table has a partition for"""
+    partition_names = session.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            JOIN pg_namespace n ON n.oid = p.relnamespace
+        WHERE p.relname = :table_name AND n.nspname = :schema
+    """), {'table_name': table.__tablename__, 'schema': table.__table__.schema}).scalars()
+    prefix = f'{table.__tablename__}_y'
+    return {int(x[len(prefix):]) for x in partition_names if x.startswith(prefix) and x[len(prefix):].isdigit()}
+
+
+def _create_year_partition(session: Session, table: Type[Base], year: int):
+    """Adds the table's partition for the year.
+
+    Rows of that year already in the default partition are moved over first, since Postgres won't create the
+        partition while the default one holds rows belonging to it.
+    """
+    preparer = session.get_bind().dialect.identifier_preparer
+    parent = _quote(session, table, table.__tablename__)
+    partition = _quote(session, table, get_partition_name(table, year))
+    default_partition = _quote(session, table, get_partition_name(table))
+    date_col = preparer.quote(PARTITION_COLUMNS[table])
+    in_year = f'{date_col} >= :start_date AND {date_col} < :end_date'
+    year_range = {'start_date': datetime.date(year, 1, 1), 'end_date': datetime.date(year + 1, 1, 1)}
+
+    has_strays = session.execute(
+        text(f'SELECT EXISTS (SELECT 1 FROM {default_partition} WHERE {in_year})'), year_range).scalar()
+    if not has_strays:
+        session.execute(text(f'CREATE TABLE {partition} PARTITION OF {parent} {_get_year_bounds(year)}'))
+        return
+    log.warning(f'Moving rows of {year} out of {default_partition} into {partition}.')
+    session.execute(text(f'CREATE TABLE {partition} (LIKE {parent} INCLUDING DEFAULTS)'))
+    session.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM {default_partition} WHERE {in_year} RETURNING *
+        )
+        INSERT INTO {partition} SELECT * FROM moved
+    """), year_range)
+    session.execute(text(f'ALTER TABLE {parent} ATTACH PARTITION {partition} {_get_year_bounds(year)}'))
+
+
+def ensure_year_partitions(session: Session, years: Iterable[int] = None) -> List[str]:
+    """Creates the missing yearly partitions (default: this year's and next year's) of every partitioned table.
+
+    Run by the cron, so next year's partition is in place well before its first row arrives. Tables that aren't
+        partitioned, as well as databases other than Postgres, are left alone.
+
+    Returns:
+        names of the partitions created
+    """
+    if not _is_postgres(session):
+        return []
+    if years is None:
+        this_year = datetime.date.today().year
+        years = [this_year, this_year + 1]
+    created = []
+    for table in PARTITION_COLUMNS:
+        if not is_partitioned(session, table):
+            continue
+        for year in sorted(set(years) - get_partition_years(session, table)):
+            _create_year_partition(session, table, year)
+            created.append(get_partition_name(table, year))
+    session.commit()
+    if len(created) > 0:
+        log.info(f'Created partitions: {", ".join(created)}')
+    return created
+
+
+def partition_table(session: Session, table: Type[Base]) -> int:
+    """Converts the table into one partitioned by year, in place, returning the number of rows carried over.
+
+    The table stays locked while its rows are copied, so run this in a maintenance window, after every pending
+        migration (see one-off-scripts/partition_tables.py). On the partitioned table:
+        - The primary key also includes the partition column, as Postgres requires of partitioned tables.
+        - The model's indexes & constraints are rebuilt, with partitions for every year from the oldest row's to
+            next year's.
+        Tables that other tables hold foreign keys into are refused, since those keys would have to be dropped.
+    """
+    if not _is_postgres(session):
+        raise ValueError('Only Postgres tables can be partitioned.')
+    if is_partitioned(session, table):
+        log.info(f'{table.__tablename__} is already partitioned.')
+        return 0
+    preparer = session.get_bind().dialect.identifier_preparer
+    name = table.__tablename__
+    parent = _quote(session, table, name)
+    referencing_keys = session.execute(text("""
+        SELECT conrelid::regclass::text || '.' || conname
+        FROM pg_constraint
+        WHERE contype = 'f' AND confrelid = CAST(:table_name AS regclass)
+    """), {'table_name': parent}).scalars().all()
+    if len(referencing_keys) > 0:
+        raise ValueError(f'Partitioning {name} would drop the foreign keys pointing into it: {referencing_keys}')
+    staging = _quote(session, table, f'{name}_partitioned')
+    date_col = preparer.quote(PARTITION_COLUMNS[table])
+
+    session.execute(text(f'LOCK TABLE {parent} IN ACCESS EXCLUSIVE MODE'))
+    this_year = datetime.date.today().year
+    first_year, last_year = session.execute(text(
+        f'SELECT EXTRACT(YEAR FROM MIN({date_col}))::int, EXTRACT(YEAR FROM MAX({date_col}))::int FROM {parent}'
+    )).one()
+    years = range(min(first_year or this_year, this_year), max(last_year or this_year, this_year + 1) + 1)
+
+    log.info(f'Partitioning {name} for {years.start} through {years.stop - 1}...')
+    session.execute(text(f'CREATE TABLE {staging} (LIKE {parent} INCLUDING DEFAULTS) PARTITION BY RANGE ({date_col})'))
+    for year in years:
+        session.execute(text(f'CREATE TABLE {_quote(session, table, get_partition_name(table, year))} '
+                             f'PARTITION OF {staging} {_get_year_bounds(year)}'))
+    session.execute(text(f'CREATE TABLE {_quote(session, table, get_partition_name(table))} '
+                         f'PARTITION OF {staging} DEFAULT'))
+    n_rows = session.execute(text(f'INSERT INTO {staging} SELECT * FROM {parent}')).rowcount
+
+    # The id sequence belongs to the old table, and would be dropped along with it
+    pk_cols = [x.name for x in table.__table__.primary_key.columns]
+    for col in pk_cols:
+        sequence = session.execute(text('SELECT pg_get_serial_sequence(:table_name, :col)'),
+                                   {'table_name': parent, 'col': col}).scalar()
+        if sequence is not None:
+            session.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY {staging}.{preparer.quote(col)}'))
+    session.execute(text(f'DROP TABLE {parent}'))
+    session.execute(text(f'ALTER TABLE {staging} RENAME TO {preparer.quote(name)}'))
+
+    key_cols = ', '.join(preparer.quote(x) for x in pk_cols + [PARTITION_COLUMNS[table]])
+    session.execute(text(f'ALTER TABLE {parent} ADD PRIMARY KEY ({key_cols})'))
+    conn = session.connection()
+    for constraint in table.__table__.constraints:
+        if isinstance(constraint, (UniqueConstraint, ForeignKeyConstraint)):
+            conn.execute(AddConstraint(constraint))
+    for index in table.__table__.indexes:
+        conn.execute(CreateIndex(index))
+    session.commit()
+    log.info(f'Partitioned {name}, carrying over {n_rows} rows.')
+    return n_rows
@@ -0,0 +1,147 @@
+from bisect import (
+    bisect_left,
+    insort,
+)
+import datetime
+import heapq
+import threading
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from pukr import get_logger
+from sqlalchemy import (
+    func,
+    select,
+)
+from sqlalchemy.orm import Session
+
+from senditark_api.model import (
+    TablePayee,
+    TableTransaction,
+    TableTransactionSplit,
+)
+from senditark_api.utils.result_cache import (
+    ResultCache,
+    result_cache,
+    table_scope,
+)
+from senditark_api.utils.routing import read_from_primary
+
+log = get_logger()
+
+
+class PayeeIndex:
+    """In-memory prefix index over every payee name, for autocomplete.
+
+    Names are kept lower-cased in a sorted list, once per word start (so 'Corner Grocer' is found under both
+        'corner grocer' and 'grocer'), and a prefix lookup is a bisect to the first candidate followed by a walk
+        over the contiguous run of keys sharing the prefix. Matches rank by how many splits used the payee over
+        the last USAGE_WINDOW_DAYS.
+
+    Each worker process holds its own copy, tied to the version of the payee table scope (see table_scope) it was
+        loaded at. Payee writes through the query helpers bump that version once committed, and a lookup finding it
+        moved reloads the copy, so with a shared result cache a write in one worker reaches every worker's index.
+        Writes made through PayeeQueries also patch this worker's copy as they happen, which keeps it current when the
+        versions aren't shared. Usage counts only move on a full reload.
+    """
+    USAGE_WINDOW_DAYS = 365
+
+    def __init__(self, shared_versions: ResultCache):
+        self._lock = threading.Lock()
+        self._shared_versions = shared_versions
+        # Sorted (lower-cased name suffix, payee_id) pairs
+        self._keys: List[Tuple[str, int]] = []
+        # payee_id -> (payee_name, recent usage count)
+        self._payees: Dict[int, Tuple[str, int]] = {}
+        self.is_loaded = False
+        self.loaded_version: Optional[Dict[str, int]] = None
+
+    @staticmethod
+    def _make_keys(payee_id: int, payee_name: str) -> List[Tuple[str, int]]:
+        words = payee_name.lower().split()
+        return [(' '.join(words[i:]), payee_id) for i in range(len(words))]
+
+    def _get_version(self) -> Optional[Dict[str, int]]:
+        return self._shared_versions.get_versions([table_scope(TablePayee.__tablename__)])
+
+    @property
+    def is_stale(self) -> bool:
+        return not self.is_loaded or self._get_version() != self.loaded_version
+
+    def load(self, session: Session):
+        """Rebuilds the index from every payee and its recent usage count"""
+        # Read before loading, so a write landing mid-load leaves this copy behind and the next lookup reloads
+        version = self._get_version()
+        since = datetime.date.today() - datetime.timedelta(days=self.USAGE_WINDOW_DAYS)
+        recent_usage = select(TableTransactionSplit.payee_key, func.count().label('n_uses')).\
+            join(TableTransaction, TableTransaction.transaction_id == TableTransactionSplit.transaction_key).\
+            where(TableTransaction.transaction_date >= since).\
+            group_by(TableTransactionSplit.payee_key).subquery('recent_usage')
+        # Patched by writes as they happen, so a lagging replica's copy could miss them for good
+        with read_from_primary(session):
+            rows = session.execute(
+                select(TablePayee.payee_id, TablePayee.payee_name, func.coalesce(recent_usage.c.n_uses, 0)).
+                outerjoin(recent_usage, recent_usage.c.payee_key == TablePayee.payee_id)
+            ).all()
+
+        payees = {payee_id: (name, n_uses) for payee_id, name, n_uses in rows}
+        keys = sorted(key for payee_id, (name, _) in payees.items() for key in self._make_keys(payee_id, name))
+        with self._lock:
+            self._payees, self._keys = payees, keys
+            self.is_loaded, self.loaded_version = True, version
+        log.debug(f'Loaded payee index with {len(payees)} payees ({len(keys)} keys).')
+
+    def add(self, payee_id: int, payee_name: str):
+        """Adds (or renames) a single payee, keeping its usage count if it was already known"""
+        if not self.is_loaded:
+            return
+        with self._lock:
+            keys, payees = self._copy_without(payee_id)
+            payees[payee_id] = (payee_name, self._payees.get(payee_id, (None, 0))[1])
+            for key in self._make_keys(payee_id, payee_name):
+                insort(keys, key)
+            self._keys, self._payees = keys, payees
+
+    def remove(self, payee_id: int):
+        if not self.is_loaded:
+            return
+        with self._lock:
+            self._keys, self._payees = self._copy_without(payee_id)
+
+    def _copy_without(self, payee_id: int) -> Tuple[List[Tuple[str, int]], Dict[int, Tuple[str, int]]]:
+        """Copies the index minus the given payee. Writers swap in copies so lookups never see a half-made edit."""
+        keys, payees = list(self._keys), dict(self._payees)
+        name, _ = payees.pop(payee_id, (None, 0))
+        if name is not None:
+            for key in self._make_keys(payee_id, name):
+                pos = bisect_left(keys, key)
+                if pos < len(keys) and keys[pos] == key:
+                    del keys[pos]
+        return keys, payees
+
+    def suggest(self, session: Session, prefix: str, limit: int = 10) -> List[Dict]:
+        """Finds the most used payees with a word starting with the prefix (case-insensitive)"""
+        if self.is_stale:
+            self.load(session=session)
+        prefix = ' '.join(prefix.lower().split())
+        if prefix == '':
+            return []
+        keys, payees = self._keys, self._payees
+        matched_ids = set()
+        for pos in range(bisect_left(keys, (prefix, -1)), len(keys)):
+            key, payee_id = keys[pos]
+            if not key.startswith(prefix):
+                break
+            matched_ids.add(payee_id)
+        # Ties in usage fall back on the name, alphabetically
+        best = heapq.nsmallest(limit, [(-payees[x][1], payees[x][0].lower(), x) for x in matched_ids if x in payees])
+        return [{'payee_id': payee_id, 'payee_name': payees[payee_id][0], 'n_uses': -neg_uses}
+                for neg_uses, _, payee_id in best]
+
+
+# The per-process index shared by the routes
+payee_index = PayeeIndex(shared_versions=result_cache)
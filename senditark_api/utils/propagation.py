@@ -1,14 +1,26 @@
 import datetime
+import time
+from typing import Callable
 
 from pukr import get_logger
+from sqlalchemy import (
+    Integer,
+    delete,
+    insert,
+    literal,
+    select,
+)
 from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
 
 from senditark_api.model import (
-    TableAccount,
     TableBalance,
-    TableTransaction,
+    TableBalanceCheckpoint,
+    TableBalanceQueue,
 )
+from senditark_api.utils.isolation import serializable_retry
 from senditark_api.utils.query import SenditarkQueries
+from senditark_api.utils.result_cache import result_cache
 
 log = get_logger()
 
@@ -16,99 +28,95 @@ log = get_logger()
 class PropagationHelper:
 
     @classmethod
-    def determine_account_balance_from_previous_balances(
-            cls,
-            session: Session,
-            account: TableAccount,
-            transaction_date: datetime.date,
-            split_amount: float
-    ) -> TableBalance:
-        """Determines a given account balance from the most recently occurring previous balance"""
-        # Get previous balances
-        prevs = [bal for bal in account.daily_balances if bal.date < transaction_date]
+    def propagate_account_balances(cls, session: Session, account_id: int, start_date: datetime.date):
+        """Recomputes every balance of an account from start_date forward in one set-based pass.
 
-        if len(prevs) == 0:
-            log.debug('No previous balances found for account. Creating new balance entry.')
-            bal_obj = TableBalance(date=transaction_date, amount=split_amount, account=account)
-        else:
-            log.debug('Iterating through past balances to find out most recent date before transaction.')
-            prev_bal_obj = max(prevs, key=lambda obj: obj.date)
-            log.debug(f'Adding balance entry from {prev_bal_obj} for transaction date ({transaction_date}).')
-            bal_obj = TableBalance(date=transaction_date, amount=prev_bal_obj.amount + split_amount, account=account)
-        session.add(bal_obj)
-        session.commit()
-        return bal_obj
+        Daily net flows from start_date onwards are run through a windowed cumulative sum, offset by the balance
+            as of the day before start_date, and written back with a single INSERT ... SELECT.
+            Month-end checkpoints from start_date onward are refreshed afterwards.
+            Nothing is committed here; callers commit once per unit of work.
+        """
+        opening_bal = SenditarkQueries.get_balance_as_of(
+            session=session, account_id=account_id, as_of=start_date - datetime.timedelta(days=1))
+        daily_flows = SenditarkQueries.get_daily_net_flows_query(account_ids=[account_id], start_date=start_date).\
+            subquery('daily_flows')
+        running_bals = select(
+            literal(account_id, Integer),
+            daily_flows.c.transaction_date,
+            opening_bal + func.sum(daily_flows.c.net_flow).over(
+                order_by=daily_flows.c.transaction_date)
+        )
+        log.debug(f'Recomputing balances for account {account_id} from {start_date} onward.')
+        session.execute(
+            delete(TableBalance).where(TableBalance.account_key == account_id, TableBalance.date >= start_date)
+        )
+        session.execute(
+            insert(TableBalance).from_select(
+                [TableBalance.account_key, TableBalance.date, TableBalance.amount], running_bals)
+        )
+        cls.refresh_balance_checkpoints(session=session, account_id=account_id, start_date=start_date)
+        result_cache.invalidate_accounts(session=session, account_ids=[account_id])
 
     @classmethod
-    def determine_account_balance_from_same_day_balance(
-            cls,
-            session: Session,
-            account: TableAccount,
-            same_day_bal: TableBalance,
-            transaction_date: datetime.date
-    ) -> TableBalance:
-        """Determines the updated account balance for the given transaction day"""
+    def refresh_balance_checkpoints(cls, session: Session, account_id: int, start_date: datetime.date):
+        """Rewrites an account's month-end checkpoints for every month from start_date's onward.
 
-        same_day_amount = SenditarkQueries.get_all_transaction_splits(
-            session=session,
-            acct=account,
-            trans_date=transaction_date,
-            as_sum=True
-        )
-        log.debug(f'Determined total amount for account for date {transaction_date} to be {same_day_amount}')
+        Only months with balance activity get a checkpoint. Any month without one falls back to the checkpoint
+            before it, which stays correct because lookups always add the splits after the checkpoint.
+        """
+        session.execute(delete(TableBalanceCheckpoint).where(
+            TableBalanceCheckpoint.account_key == account_id,
+            TableBalanceCheckpoint.month_end >= start_date
+        ))
+        month_end_bals = {}
+        for bal_date, amount in session.query(TableBalance.date, TableBalance.amount).\
+                filter(TableBalance.account_key == account_id, TableBalance.date >= start_date).\
+                order_by(TableBalance.date):
+            # Ordered by date, so the last balance of each month wins
+            month_end_bals[SenditarkQueries.get_month_end(bal_date)] = amount
+        if len(month_end_bals) > 0:
+            session.execute(insert(TableBalanceCheckpoint), [
+                {'account_key': account_id, 'month_end': month_end, 'amount': amount}
+                for month_end, amount in month_end_bals.items()
+            ])
+
+    @classmethod
+    @serializable_retry()
+    def process_balance_queue(cls, session: Session) -> int:
+        """Coalesces the pending queue entries per account and recomputes each dirty account once.
+
+        Only entries present when processing started are consumed, so writes that land mid-run stay queued
+            for the next pass.
 
-        # Determine current balance by retrieving previous date's balance
-        prevs = [bal for bal in account.daily_balances if bal.date < transaction_date]
-        if len(prevs) == 0:
-            log.debug('No previous balances found for account. Applying pure sum of day\'s transactions.')
-            same_day_bal.amount = same_day_amount
-        else:
-            log.debug('Iterating through past balances to find most recent date before transaction.')
-            prev_bal = max(prevs, key=lambda obj: obj.date)
-            log.debug(f'Accing balance entry from {prev_bal} for transaction date ({transaction_date}).')
-            same_day_bal.amount = prev_bal.amount + same_day_amount
+        Returns:
+            The number of accounts recomputed
+        """
+        max_queue_id = session.query(func.max(TableBalanceQueue.balance_queue_id)).scalar()
+        if max_queue_id is None:
+            return 0
+        dirty_accounts = session.query(TableBalanceQueue.account_key, func.min(TableBalanceQueue.from_date)).\
+            filter(TableBalanceQueue.balance_queue_id <= max_queue_id).\
+            group_by(TableBalanceQueue.account_key).all()
+        log.debug(f'Coalesced balance queue (up to id {max_queue_id}) into {len(dirty_accounts)} accounts.')
+        for account_id, from_date in dirty_accounts:
+            cls.propagate_account_balances(session=session, account_id=account_id, start_date=from_date)
+        session.execute(delete(TableBalanceQueue).where(TableBalanceQueue.balance_queue_id <= max_queue_id))
         session.commit()
-        return same_day_bal
+        return len(dirty_accounts)
 
     @classmethod
-    def adjust_split_balances(cls, session: Session, transaction: TableTransaction):
-        trans_date = transaction.transaction_date
-        for split in transaction.splits:
-            # Iterate on debit & credit accounts
-            for acct, split_type in zip([split.debit_account, split.credit_account], ['debit', 'credit']):
-                log.debug(f'Working on account: {acct}, as {split_type}')
-                # Check if there's an existing balance for the transaction date
-                bal = next((x for x in acct.daily_balances if x.date == trans_date), None)
-                split_amount = split.amount * 1 if split_type == 'debit' else split.amount * -1
-                log.debug(f'Determined amount for split to be: {split_amount}')
-                if bal is None:
-                    log.debug(f'No balance entry found for transaction date: {trans_date}')
-                    bal_obj = cls.determine_account_balance_from_previous_balances(
-                        session=session,
-                        account=acct,
-                        transaction_date=trans_date,
-                        split_amount=split_amount
-                    )
-                else:
-                    log.debug('Existing balance entry found for given transaction date')
-                    bal_obj = cls.determine_account_balance_from_same_day_balance(
-                        session=session,
-                        account=acct,
-                        same_day_bal=bal,
-                        transaction_date=trans_date
-                    )
-                log.debug('Beginning process to adjust balances ahead of transaction date...')
-                # Adjust balances for any dates forward ;)
-                following_bals = [bal for bal in acct.daily_balances if bal.date > trans_date]
-                log.debug(f'Found {len(following_bals)} balance dates to adjust.')
-                running_bal = bal_obj.amount
-                for forward_bal in following_bals:
-                    log.debug(f'Working on date {forward_bal.date}...')
-                    same_day_amount = SenditarkQueries.get_all_transaction_splits(
-                        session=session, acct=acct, trans_date=forward_bal.date, as_sum=True
-                    )
-                    running_bal += same_day_amount
-                    forward_bal.amount = running_bal
-                if len(following_bals) > 0:
-                    log.debug('Committing balance changes.')
-                    session.commit()
+    def run_balance_queue_worker(cls, session_factory: Callable[[], Session], poll_interval: float = 5.0):
+        """Drains the balance queue forever, sleeping between passes whenever it's empty"""
+        log.info(f'Starting balance queue worker (poll interval: {poll_interval}s)')
+        while True:
+            session = session_factory()
+            try:
+                n_accounts = cls.process_balance_queue(session=session)
+            except Exception as err:
+                log.exception(err)
+                session.rollback()
+                n_accounts = 0
+            finally:
+                session.close()
+            if n_accounts == 0:
+                time.sleep(poll_interval)
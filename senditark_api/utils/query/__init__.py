@@ -4,6 +4,7 @@ from senditark_api.utils.query.balance import BalanceQueries
 from senditark_api.utils.query.budget import BudgetQueries
 from senditark_api.utils.query.invoice import InvoiceQueries
 from senditark_api.utils.query.payee import PayeeQueries
+from senditark_api.utils.query.search import SearchQueries
 from senditark_api.utils.query.tag import TagQueries
 from senditark_api.utils.query.transaction import TransactionQueries
 
@@ -14,6 +15,7 @@ class SenditarkQueries(
         BudgetQueries,
         InvoiceQueries,
         PayeeQueries,
+        SearchQueries,
         TagQueries,
         TransactionQueries
 ):
@@ -1,26 +1,30 @@
-import dataclasses
 import datetime
 from typing import (
     Dict,
     List,
+    Optional,
+    Tuple,
 )
 
 from sqlalchemy.orm import Session
-from sqlalchemy.sql import (
-    and_,
-    asc,
-    func,
-)
+from sqlalchemy.sql import asc
 
 from senditark_api.model import (
     TableAccount,
     TableBalance,
 )
+from senditark_api.model.base import model_to_dict
+from senditark_api.utils.query.balance import BalanceQueries
 from senditark_api.utils.query.base import (
     BaseQueryHelper,
     FilterListType,
     ModelDictType,
 )
+from senditark_api.utils.result_cache import (
+    ALL_ACCOUNTS_SCOPE,
+    table_scope,
+)
+from senditark_api.utils.routing import read_from_primary
 
 
 class AccountQueries(BaseQueryHelper):
@@ -41,33 +45,62 @@ class AccountQueries(BaseQueryHelper):
                              order_by=asc(TableAccount.full_name))
 
     @classmethod
-    def get_accounts_with_balance(cls, session: Session) -> List[Dict]:
-        # Subquery to grab the latest balance dates for each account
-        latest_balance_subq = session.query(TableBalance.account_key, func.max(TableBalance.date).label('date')).\
-            filter(TableBalance.date <= datetime.date.today()).\
-            group_by(TableBalance.account_key).subquery()
-        # Combine with balance table to get actual amounts
-        latest_balances = session.query(TableBalance).join(latest_balance_subq, and_(
-            latest_balance_subq.c.account_key == TableBalance.account_key,
-            latest_balance_subq.c.date == TableBalance.date
-        )).subquery()
-        # Combine with accounts
-        accounts_with_balance = session.query(TableAccount, latest_balances).join(
-            latest_balances, TableAccount.account_id == latest_balances.c.account_key).all()
-
-        # We're dealing with an abomination; a combination of whole table along with pieces of another
-        #   trailing off at the end. Because of this, we probably shouldn't rely on flask to jsonify this well.
-        resp = []
-        for (acct_obj, bal_id, _, bal_date, bal, _, _, _) in accounts_with_balance:
-            resp_dict = dataclasses.asdict(acct_obj)
-            resp_dict.update({
-                'balance_id': bal_id,
-                'balance': bal,
-                'balance_date': bal_date
-            })
-            resp.append(resp_dict)
-
-        return resp
+    def get_account_list(cls, session: Session) -> List[Dict]:
+        """Lists every account from the reference cache, ordered like get_accounts"""
+        accounts = cls.reference_cache.get_all(session=session, obj_class=TableAccount).values()
+        return sorted(accounts, key=lambda x: x['full_name'])
+
+    @classmethod
+    def get_account_list_validator(cls, session: Session) -> Tuple[Optional[datetime.datetime], str]:
+        """Change validator (see get_change_validator) for get_account_list, taken from the same cached copy it reads"""
+        return cls.reference_cache.get_validator(session=session, obj_class=TableAccount)
+
+    @classmethod
+    def get_accounts_with_balance_validator(cls, session: Session,
+                                            as_of: datetime.date = None) -> Tuple[Optional[datetime.datetime], str]:
+        """Change validator (see get_change_validator) for get_accounts_with_balance"""
+        if as_of is None:
+            as_of = datetime.date.today()
+        return cls.get_change_validator(session=session, sources=[
+            (TableAccount, []),
+            (TableBalance, [TableBalance.date <= as_of]),
+        ])
+
+    @classmethod
+    def get_accounts_with_balance(cls, session: Session, as_of: datetime.date = None) -> List[Dict]:
+        """Lists accounts alongside their latest balance as of the given date (default: today)
+
+        Accounts without any balance by that date are left out.
+        """
+        if as_of is None:
+            as_of = datetime.date.today()
+        return cls.result_cache.get_or_compute(
+            name='accounts_with_balance', args=(as_of, ), scopes=[ALL_ACCOUNTS_SCOPE, table_scope('account')],
+            compute=lambda: cls._get_accounts_with_balance(session=session, as_of=as_of))
+
+    @classmethod
+    def _get_accounts_with_balance(cls, session: Session, as_of: datetime.date) -> List[Dict]:
+        # Cached, so read from the primary (see read_from_primary)
+        with read_from_primary(session):
+            accounts = cls.get_accounts(session=session)
+            balances = BalanceQueries.get_balances_as_of(
+                session=session, account_ids=[x.account_id for x in accounts], dates=[as_of])
+            balances_by_account = {x['account_id']: x for x in balances if x['balance_id'] is not None}
+
+            resp = []
+            for acct_obj in accounts:
+                bal = balances_by_account.get(acct_obj.account_id)
+                if bal is None:
+                    continue
+                resp_dict = model_to_dict(acct_obj)
+                resp_dict.update({
+                    'balance_id': bal['balance_id'],
+                    'balance': bal['balance'],
+                    'balance_date': bal['balance_date']
+                })
+                resp.append(resp_dict)
+
+            return resp
 
     @classmethod
     def edit_account(cls, session: Session, account_id: int, data: ModelDictType):
@@ -98,8 +131,7 @@ class AccountQueries(BaseQueryHelper):
         cls.log.info(f'Handling DELETE for ACCOUNT ({account_id})')
 
         account = cls.get_account(session=session, account_id=account_id)
-        session.delete(account)
-        session.commit()
+        cls._delete_obj(session=session, obj=account)
 
 
 if __name__ == '__main__':
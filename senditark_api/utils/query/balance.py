@@ -1,11 +1,46 @@
+import calendar
+import datetime
 from typing import (
     Dict,
+    Iterable,
     List,
+    Optional,
+    Tuple,
+    Union,
 )
 
-from sqlalchemy.orm import Session
+import numpy as np
+import pandas as pd
+from sqlalchemy import (
+    Date,
+    Integer,
+    Row,
+)
+from sqlalchemy.orm import (
+    Session,
+    aliased,
+)
+from sqlalchemy.sql import (
+    Select,
+    Subquery,
+    and_,
+    column,
+    distinct,
+    func,
+    literal,
+    select,
+    true,
+    union_all,
+    values,
+)
 
-from senditark_api.model import TableBalance
+from senditark_api.model import (
+    TableBalance,
+    TableBalanceCheckpoint,
+    TableBalanceQueue,
+    TableTransaction,
+    TableTransactionSplit,
+)
 from senditark_api.utils.query.base import (
     BaseQueryHelper,
     FilterListType,
@@ -55,5 +90,234 @@ class BalanceQueries(BaseQueryHelper):
 
         balance = cls.get_balance(session=session, balance_id=balance_id)
 
-        session.delete(balance)
-        session.commit()
+        cls._delete_obj(session=session, obj=balance)
+
+    @classmethod
+    def get_signed_split_legs(cls, account_ids: List[int], start_date: datetime.date = None,
+                              end_date: datetime.date = None) -> Subquery:
+        """Builds a subquery of (account_key, transaction_date, amount) rows, one per split leg.
+
+        Each split contributes its amount positively to the debit account and negatively to the credit account,
+            which is the same sign convention the balance table uses.
+        """
+        legs = []
+        for account_col, sign in [(TableTransactionSplit.debit_account_key, 1),
+                                  (TableTransactionSplit.credit_account_key, -1)]:
+            filters = [account_col.in_(account_ids)]
+            if start_date is not None:
+                filters.append(TableTransaction.transaction_date >= start_date)
+            if end_date is not None:
+                filters.append(TableTransaction.transaction_date <= end_date)
+            legs.append(
+                select(
+                    account_col.label('account_key'),
+                    TableTransaction.transaction_date.label('transaction_date'),
+                    (TableTransactionSplit.amount * sign).label('amount')
+                ).join(TableTransaction, TableTransaction.transaction_id == TableTransactionSplit.transaction_key).
+                where(and_(*filters))
+            )
+        return union_all(*legs).subquery('split_legs')
+
+    @classmethod
+    def get_daily_net_flows_query(cls, account_ids: List[int], start_date: datetime.date = None,
+                                  end_date: datetime.date = None) -> Select:
+        """Builds the statement behind get_daily_net_flows, for embedding in larger statements"""
+        legs = cls.get_signed_split_legs(account_ids=account_ids, start_date=start_date, end_date=end_date)
+        return select(
+            legs.c.account_key,
+            legs.c.transaction_date,
+            func.sum(legs.c.amount).label('net_flow')
+        ).group_by(legs.c.account_key, legs.c.transaction_date)
+
+    @classmethod
+    def get_daily_net_flows(cls, session: Session, account_ids: List[int], start_date: datetime.date = None,
+                            end_date: datetime.date = None,
+                            output: str = 'rows') -> Union[List[Row], Dict[str, np.ndarray], pd.Series]:
+        """Totals the signed split amounts per account per day in a single GROUP BY
+
+        Days without activity are left out.
+
+        Args:
+            account_ids: accounts to total
+            start_date: the earliest transaction date to include
+            end_date: the latest transaction date to include
+            output: one of
+                - 'rows': (account_key, transaction_date, net_flow) rows
+                - 'numpy': dict of equal-length arrays keyed by those column names,
+                    with transaction_date as datetime64[D]
+                - 'pandas': net_flow Series indexed by (account_key, transaction_date),
+                    with transaction_date as a DatetimeIndex level
+
+        Returns:
+            net flows ordered by account, then date
+        """
+        if output not in ['rows', 'numpy', 'pandas']:
+            raise ValueError(f'Variable output must be one of "rows", "numpy" or "pandas". Was {output}.')
+        stmt = cls.get_daily_net_flows_query(account_ids=account_ids, start_date=start_date, end_date=end_date)
+        rows = session.execute(stmt.order_by(stmt.selected_columns.account_key,
+                                             stmt.selected_columns.transaction_date)).all()
+        if output == 'rows':
+            return rows
+        flows = pd.DataFrame(rows, columns=['account_key', 'transaction_date', 'net_flow']).\
+            astype({'account_key': 'int64', 'transaction_date': 'datetime64[ns]', 'net_flow': 'float64'})
+        if output == 'numpy':
+            return {
+                'account_key': flows['account_key'].to_numpy(),
+                'transaction_date': flows['transaction_date'].to_numpy().astype('datetime64[D]'),
+                'net_flow': flows['net_flow'].to_numpy(),
+            }
+        return flows.set_index(['account_key', 'transaction_date'])['net_flow']
+
+    @staticmethod
+    def get_month_end(date: datetime.date) -> datetime.date:
+        return datetime.date(date.year, date.month, calendar.monthrange(date.year, date.month)[1])
+
+    @classmethod
+    def get_nearest_checkpoint(cls, session: Session, account_id: int,
+                               as_of: datetime.date) -> Optional[TableBalanceCheckpoint]:
+        """Gets the latest month-end checkpoint for the account on or before the given date"""
+        return session.query(TableBalanceCheckpoint).filter(
+            TableBalanceCheckpoint.account_key == account_id,
+            TableBalanceCheckpoint.month_end <= as_of
+        ).order_by(TableBalanceCheckpoint.month_end.desc()).limit(1).one_or_none()
+
+    @classmethod
+    def get_stored_balance(cls, session: Session, account_id: int, as_of: datetime.date) -> float:
+        """Reads the latest stored end-of-day balance on or before the given date (a single index probe)"""
+        amount = session.query(TableBalance.amount).filter(
+            TableBalance.account_key == account_id,
+            TableBalance.date <= as_of
+        ).order_by(TableBalance.date.desc()).limit(1).scalar()
+        return 0 if amount is None else amount
+
+    @classmethod
+    def get_balance_as_of(cls, session: Session, account_id: int, as_of: datetime.date) -> float:
+        """Determines an account's end-of-day balance for the given date.
+
+        Starts from the nearest month-end checkpoint and only sums the splits after it.
+        """
+        checkpoint = cls.get_nearest_checkpoint(session=session, account_id=account_id, as_of=as_of)
+        if checkpoint is None:
+            opening_bal, start_date = 0, None
+        else:
+            opening_bal, start_date = checkpoint.amount, checkpoint.month_end + datetime.timedelta(days=1)
+        legs = cls.get_signed_split_legs(account_ids=[account_id], start_date=start_date, end_date=as_of)
+        net_flow = session.query(func.coalesce(func.sum(legs.c.amount), 0)).scalar()
+        return opening_bal + net_flow
+
+    @classmethod
+    def get_balances_as_of(cls, session: Session, account_ids: List[int],
+                           dates: List[datetime.date]) -> List[Dict]:
+        """Resolves the stored balance of every account as of every date in one query
+
+        Each (account, date) pair is matched to the account's latest balance on or before that date with a single
+            probe of the (account_key, date) index. Pairs without any balance by then come back with None values.
+
+        Returns:
+            One dict per (account, date) pair, ordered by account then date
+        """
+        if len(account_ids) == 0 or len(dates) == 0:
+            return []
+        pairs = [(account_id, as_of) for account_id in account_ids for as_of in dates]
+        if session.get_bind().dialect.name == 'postgresql':
+            as_of_pairs = values(
+                column('account_key', Integer), column('as_of', Date), name='as_of_pairs'
+            ).data(pairs)
+            latest_bal = select(TableBalance.balance_id, TableBalance.date, TableBalance.amount).where(
+                TableBalance.account_key == as_of_pairs.c.account_key,
+                TableBalance.date <= as_of_pairs.c.as_of
+            ).order_by(TableBalance.date.desc()).limit(1).lateral('latest_bal')
+            stmt = select(
+                as_of_pairs.c.account_key, as_of_pairs.c.as_of, latest_bal.c.balance_id, latest_bal.c.date,
+                latest_bal.c.amount
+            ).select_from(as_of_pairs).outerjoin(latest_bal, true())
+        else:
+            # Dialects without LATERAL get the same index probe through a correlated subquery
+            as_of_pairs = union_all(*[
+                select(literal(account_id, Integer).label('account_key'), literal(as_of, Date).label('as_of'))
+                for account_id, as_of in pairs
+            ]).subquery('as_of_pairs')
+            prev_bal = aliased(TableBalance)
+            latest_bal_id = select(prev_bal.balance_id).where(
+                prev_bal.account_key == as_of_pairs.c.account_key,
+                prev_bal.date <= as_of_pairs.c.as_of
+            ).order_by(prev_bal.date.desc()).limit(1).scalar_subquery()
+            stmt = select(
+                as_of_pairs.c.account_key, as_of_pairs.c.as_of, TableBalance.balance_id, TableBalance.date,
+                TableBalance.amount
+            ).select_from(as_of_pairs).outerjoin(TableBalance, TableBalance.balance_id == latest_bal_id)
+        stmt = stmt.order_by(as_of_pairs.c.account_key, as_of_pairs.c.as_of)
+
+        return [{
+            'account_id': account_id,
+            'as_of': as_of,
+            'balance_id': bal_id,
+            'balance': bal,
+            'balance_date': bal_date,
+        } for account_id, as_of, bal_id, bal_date, bal in session.execute(stmt)]
+
+    @classmethod
+    def enqueue_balance_propagation(cls, session: Session, account_dates: Iterable[Tuple[int, datetime.date]]):
+        """Marks accounts as needing their balances recomputed from the given dates forward.
+
+        Only the earliest date per account is recorded. Nothing is committed here, so the entries land in the
+            same database transaction as the write that made them necessary.
+        """
+        earliest_dates = {}
+        for account_key, from_date in account_dates:
+            if account_key is None or from_date is None:
+                continue
+            if account_key not in earliest_dates or from_date < earliest_dates[account_key]:
+                earliest_dates[account_key] = from_date
+        cls.log.debug(f'Queueing balance propagation for {len(earliest_dates)} accounts.')
+        # Whatever changed to need propagating changes what's cached for these accounts too
+        cls.result_cache.invalidate_accounts(session=session, account_ids=earliest_dates.keys())
+        session.add_all([TableBalanceQueue(account_key=k, from_date=v) for k, v in earliest_dates.items()])
+
+    @classmethod
+    def enqueue_full_recompute(cls, session: Session, account_ids: List[int]) -> int:
+        """Queues the accounts' balances for recomputing from their earliest split or stored balance onward.
+
+        The balance worker then repairs whatever diverged, without a request having to wait on it. Like
+            enqueue_balance_propagation, nothing is committed here.
+
+        Returns:
+            The number of accounts queued (accounts with neither splits nor balances are left out)
+        """
+        legs = cls.get_signed_split_legs(account_ids=account_ids)
+        first_dates = union_all(
+            select(legs.c.account_key, legs.c.transaction_date.label('from_date')),
+            select(TableBalance.account_key, TableBalance.date).where(TableBalance.account_key.in_(account_ids))
+        ).subquery('first_dates')
+        account_dates = session.execute(
+            select(first_dates.c.account_key, func.min(first_dates.c.from_date)).
+            group_by(first_dates.c.account_key)
+        ).all()
+        cls.enqueue_balance_propagation(session=session, account_dates=account_dates)
+        return len(account_dates)
+
+    @classmethod
+    def get_balance_queue_status(cls, session: Session) -> Dict:
+        """Reports how far the balance propagation queue is behind"""
+        oldest_entry = func.min(TableBalanceQueue.created_date)
+        # Worked out by the database, against the same clock created_date was stamped with
+        if session.get_bind().dialect.name == 'postgresql':
+            # created_date is a naive TIMESTAMP, i.e., now() in the session's time zone, which localtimestamp matches
+            lag = func.extract('epoch', func.localtimestamp() - oldest_entry)
+        else:
+            # SQLite stamps CURRENT_TIMESTAMP, in UTC, as does julianday('now')
+            lag = (func.julianday('now') - func.julianday(oldest_entry)) * 86400
+        n_entries, n_accounts, oldest_entry, earliest_date, lag_seconds = session.query(
+            func.count(TableBalanceQueue.balance_queue_id),
+            func.count(distinct(TableBalanceQueue.account_key)),
+            oldest_entry,
+            func.min(TableBalanceQueue.from_date),
+            lag
+        ).one()
+        return {
+            'pending_entries': n_entries,
+            'pending_accounts': n_accounts,
+            'oldest_entry': oldest_entry,
+            'earliest_dirty_date': earliest_date,
+            'lag_seconds': 0 if lag_seconds is None else max(float(lag_seconds), 0),
+        }
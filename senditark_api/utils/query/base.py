@@ -1,13 +1,25 @@
+import dataclasses
 import datetime
+import hashlib
+import threading
+import time
 from typing import (
+    Any,
+    Callable,
     Dict,
     List,
     Optional,
+    Tuple,
     Type,
     Union,
 )
 
 from pukr import get_logger
+from sqlalchemy import (
+    func,
+    inspect,
+    select,
+)
 from sqlalchemy.orm import (
     DeclarativeMeta,
     InstrumentedAttribute,
@@ -18,6 +30,13 @@ from sqlalchemy.sql.elements import (
     UnaryExpression,
 )
 
+from senditark_api.utils.result_cache import (
+    ResultCache,
+    result_cache,
+    table_scope,
+)
+from senditark_api.utils.routing import read_from_primary
+
 log = get_logger()
 
 ModelDictType = Dict[
@@ -27,27 +46,182 @@ ModelDictType = Dict[
 FilterListType = List[Union[BinaryExpression, bool]]
 
 
+def get_change_validator(session: Session, sources: List[Tuple[Type[DeclarativeMeta], FilterListType]]) \
+        -> Tuple[Optional[datetime.datetime], str]:
+    """See BaseQueryHelper.get_change_validator"""
+    cols = []
+    for obj_class, filters in sources:
+        cols += [
+            select(func.max(obj_class.update_date)).where(*filters).scalar_subquery(),
+            select(func.count()).select_from(obj_class).where(*filters).scalar_subquery(),
+        ]
+    summary = session.execute(select(*cols)).one()
+    last_modified = max((x for x in summary[::2] if x is not None), default=None)
+    etag = hashlib.sha1(repr(tuple(summary)).encode()).hexdigest()
+    return last_modified, etag
+
+
+class ReferenceCache:
+    """Process-local read-through cache for small, rarely changing tables (accounts, payees, tags).
+
+    Each table is cached whole (per database) as plain dicts of its dataclass fields, keyed by primary key.
+        Every write made through the query helpers bumps the table's version once committed, and a read finding its
+        copy behind the current version reloads it. Versions are tracked both in the process and through the
+        result cache's table scope (see table_scope), so once that's shared, a write in one worker reloads the
+        copies of all of them. Writes made around the query helpers go unnoticed until the copy is
+        MAX_AGE_SECONDS old. Tables always load from the primary, as a lagging replica would fill a fresh version
+        with stale rows.
+
+    Each copy keeps the change validator (see get_change_validator) of the rows it was loaded from, so responses
+        built from the copy can be validated against it rather than against the database, which may be ahead.
+    """
+    MAX_AGE_SECONDS = 60
+
+    def __init__(self, shared_versions: ResultCache):
+        self._lock = threading.Lock()
+        self._versions: Dict[Type[DeclarativeMeta], int] = {}
+        self._shared_versions = shared_versions
+        # (engine, table class) -> (version it was loaded at, when, rows by primary key, change validator)
+        self._tables: Dict[Tuple[Any, Type[DeclarativeMeta]], Tuple[Any, float, Dict[Any, Dict[str, Any]], Tuple]] = {}
+
+    def bump(self, obj_class: Type[DeclarativeMeta]):
+        with self._lock:
+            self._versions[obj_class] = self._versions.get(obj_class, 0) + 1
+
+    def _get_version(self, obj_class: Type[DeclarativeMeta]) -> Tuple[int, Optional[Dict[str, int]]]:
+        """The table's version in this process, along with the one every process sees"""
+        return self._versions.get(obj_class, 0), \
+            self._shared_versions.get_versions([table_scope(obj_class.__tablename__)])
+
+    def _load(self, session: Session, obj_class: Type[DeclarativeMeta]) -> Dict[Any, Dict[str, Any]]:
+        # Read before loading, so a write landing mid-load leaves this copy behind and the next read reloads
+        version = self._get_version(obj_class)
+        pk_col = inspect(obj_class).primary_key[0]
+        field_names = [x.name for x in dataclasses.fields(obj_class)]
+        rows = {}
+        with read_from_primary(session):
+            # Read before the rows, so a write landing in between leaves the validator behind rather than the rows
+            validator = get_change_validator(session=session, sources=[(obj_class, [])])
+            for obj in session.query(obj_class).order_by(pk_col):
+                rows[getattr(obj, pk_col.key)] = {name: getattr(obj, name) for name in field_names}
+            engine = session.get_bind()
+        with self._lock:
+            self._tables[(engine, obj_class)] = (version, time.monotonic(), rows, validator)
+        log.debug(f'Loaded {len(rows)} rows of {obj_class.__name__} into the reference cache.')
+        return rows
+
+    def _get_current(self, session: Session, obj_class: Type[DeclarativeMeta]) -> Tuple:
+        """Gets the current copy of the table, reloading it when behind"""
+        with read_from_primary(session):
+            engine = session.get_bind()
+        entry = self._tables.get((engine, obj_class))
+        if entry is None or entry[0] != self._get_version(obj_class) or \
+                time.monotonic() - entry[1] > self.MAX_AGE_SECONDS:
+            self._load(session=session, obj_class=obj_class)
+            entry = self._tables[(engine, obj_class)]
+        return entry
+
+    def get_all(self, session: Session, obj_class: Type[DeclarativeMeta]) -> Dict[Any, Dict[str, Any]]:
+        """Gets every row of the table, keyed by primary key. The dicts are shared, so treat them as read-only."""
+        return self._get_current(session=session, obj_class=obj_class)[2]
+
+    def get_validator(self, session: Session, obj_class: Type[DeclarativeMeta]) \
+            -> Tuple[Optional[datetime.datetime], str]:
+        """Gets the change validator of the rows get_all returns"""
+        return self._get_current(session=session, obj_class=obj_class)[3]
+
+    def get(self, session: Session, obj_class: Type[DeclarativeMeta], pk: Any) -> Optional[Dict[str, Any]]:
+        """Gets a single row by primary key. A miss reloads the table once, in case another process added it."""
+        row = self.get_all(session=session, obj_class=obj_class).get(pk)
+        if row is None:
+            row = self._load(session=session, obj_class=obj_class).get(pk)
+        return row
+
+
+class ReferenceLookup(dict):
+    """Lazily filled mapping of primary key -> transform(row) over one cached table.
+
+    Meant for resolving many foreign keys in a loop: each key is transformed once, and only the keys actually
+        asked for are. Unknown keys go through the cache's read-through, raising KeyError if the row doesn't exist.
+    """
+
+    def __init__(self, cache: ReferenceCache, session: Session, obj_class: Type[DeclarativeMeta],
+                 transform: Callable[[Dict[str, Any]], Any]):
+        super().__init__()
+        self.cache = cache
+        self.session = session
+        self.obj_class = obj_class
+        self.transform = transform
+
+    def __missing__(self, pk: Any) -> Any:
+        row = self.cache.get(session=self.session, obj_class=self.obj_class, pk=pk)
+        if row is None:
+            raise KeyError(f'Failed to find {self.obj_class.__name__} with primary key: {pk}')
+        value = self[pk] = self.transform(row)
+        return value
+
+
 class BaseQueryHelper:
     log = log
+    # Shared across processes once configured
+    result_cache = result_cache
+    # Shared by every query helper in the process, following the result cache's versions
+    reference_cache = ReferenceCache(shared_versions=result_cache)
+
+    @classmethod
+    def get_reference_lookup(cls, session: Session, obj_class: Type[DeclarativeMeta],
+                             transform: Callable[[Dict[str, Any]], Any] = None) -> ReferenceLookup:
+        """Builds a lookup of cached rows by primary key, passing each through the transform (if any) once"""
+        return ReferenceLookup(cache=cls.reference_cache, session=session, obj_class=obj_class,
+                               transform=transform or (lambda row: row))
+
+    @classmethod
+    def _bump_caches(cls, obj_class: Type[DeclarativeMeta]):
+        """Invalidates whatever's cached from the table. Call only once the write is committed."""
+        cls.reference_cache.bump(obj_class)
+        cls.result_cache.bump([table_scope(obj_class.__tablename__)])
+
+    @classmethod
+    def get_change_validator(cls, session: Session, sources: List[Tuple[Type[DeclarativeMeta], FilterListType]]) \
+            -> Tuple[Optional[datetime.datetime], str]:
+        """Summarizes when the rows behind a response last changed, to answer conditional GETs with.
+
+        Args:
+            sources: each table involved, with the filters picking out its rows (an empty list for the whole table)
+
+        Returns:
+            the latest update_date across all the rows, and an ETag over each source's latest update_date and
+                row count (so deleting a row changes it too). Everything is read in a single statement.
+        """
+        return get_change_validator(session=session, sources=sources)
+
+    @classmethod
+    def _clean_data(cls, data: ModelDictType) -> Dict[str, Any]:
+        """Converts any table attribute keys in the data into their column names"""
+        cleaned_dict = {}
+        # Iterate through the dict and determine whether a key needs to be converted to string
+        for k, v in data.items():
+            if isinstance(k, InstrumentedAttribute):
+                cleaned_dict[k.name] = v
+            else:
+                cleaned_dict[k] = v
+        return cleaned_dict
+
+    @classmethod
+    def _build_obj(cls, obj_class: Type[DeclarativeMeta], data: ModelDictType) -> DeclarativeMeta:
+        return obj_class(**cls._clean_data(data))
 
     @classmethod
     def _add_obj(cls, session: Session, obj_class: Type[DeclarativeMeta], data: ModelDictType = None,
                  obj: DeclarativeMeta = None):
         if data is not None:
-            cleaned_dict = {}
-            # Iterate through the dict and determine whether a key needs to be converted to string
-            for k, v in data.items():
-                if isinstance(k, InstrumentedAttribute):
-                    cleaned_dict[k.name] = v
-                else:
-                    cleaned_dict[k] = v
-
-            obj = obj_class(**cleaned_dict)
+            obj = cls._build_obj(obj_class=obj_class, data=data)
         elif obj is None:
             raise ValueError(f'Cannot create and add object of class {obj_class}. '
                              f'Parameters data or obj must not be empty')
         session.add(obj)
         session.commit()
+        cls._bump_caches(obj_class=obj.__class__)
         return obj
 
     @classmethod
@@ -73,11 +247,18 @@ class BaseQueryHelper:
 
     @classmethod
     def _edit_obj(cls, session: Session, obj: DeclarativeMeta, data: ModelDictType):
-        for k, v in data.items():
-            setattr(obj, k.name, v)
+        for k, v in cls._clean_data(data).items():
+            setattr(obj, k, v)
         session.commit()
+        cls._bump_caches(obj_class=obj.__class__)
         return obj
 
+    @classmethod
+    def _delete_obj(cls, session: Session, obj: DeclarativeMeta):
+        session.delete(obj)
+        session.commit()
+        cls._bump_caches(obj_class=obj.__class__)
+
     @classmethod
     def _build_filters(cls, filter_mapping: Dict) -> List:
         """
@@ -119,6 +300,7 @@ class BaseQueryHelper:
             log.debug(f'Obj ({obj}) did not exist. Adding...')
             session.add(obj)
             session.commit()
+            cls._bump_caches(obj_class=obj.__class__)
             return obj
         else:
             log.debug(f'Obj ({retrieved_obj}) existed. Returning without adding')
@@ -58,5 +58,4 @@ class BudgetQueries(BaseQueryHelper):
 
         budget = cls.get_budget(session=session, budget_id=budget_id)
 
-        session.delete(budget)
-        session.commit()
+        cls._delete_obj(session=session, obj=budget)
@@ -49,8 +49,7 @@ class InvoiceQueries(BaseQueryHelper):
 
         invoice = cls.get_invoice(session=session, invoice_id=invoice_id)
 
-        session.delete(invoice)
-        session.commit()
+        cls._delete_obj(session=session, obj=invoice)
 
     @classmethod
     def get_invoice_data(cls, session: Session, invoice_id: int, invoice_obj: TableInvoice = None) -> Dict:
@@ -91,8 +90,7 @@ class InvoiceQueries(BaseQueryHelper):
 
         invoice_split = cls.get_invoice_split(session=session, invoice_split_id=invoice_split_id)
 
-        session.delete(invoice_split)
-        session.commit()
+        cls._delete_obj(session=session, obj=invoice_split)
 
     @classmethod
     def get_invoice_split_data(cls, session: Session, invoice_id: int = None, invoice_split_id: int = None,
@@ -1,12 +1,15 @@
+import datetime
 from typing import (
     Dict,
     List,
     Optional,
+    Tuple,
 )
 
 from sqlalchemy.orm import Session
 
 from senditark_api.model import TablePayee
+from senditark_api.utils.payee_index import payee_index
 from senditark_api.utils.query.base import (
     BaseQueryHelper,
     FilterListType,
@@ -18,7 +21,9 @@ class PayeeQueries(BaseQueryHelper):
 
     @classmethod
     def add_payee(cls, session: Session, data: ModelDictType) -> TablePayee:
-        return cls._add_obj(session=session, obj_class=TablePayee, data=data)
+        payee = cls._add_obj(session=session, obj_class=TablePayee, data=data)
+        payee_index.add(payee_id=payee.payee_id, payee_name=payee.payee_name)
+        return payee
 
     @classmethod
     def get_payee(cls, session: Session, payee_id: int = None, filters: FilterListType = None) -> Optional[TablePayee]:
@@ -30,12 +35,28 @@ class PayeeQueries(BaseQueryHelper):
     def get_payees(cls, session: Session, filters: FilterListType = None, limit: int = 100) -> List[TablePayee]:
         return cls._get_objs(session=session, obj_class=TablePayee, filters=filters, limit=limit)
 
+    @classmethod
+    def get_payee_list(cls, session: Session) -> List[Dict]:
+        """Lists every payee from the reference cache"""
+        return list(cls.reference_cache.get_all(session=session, obj_class=TablePayee).values())
+
+    @classmethod
+    def get_payee_list_validator(cls, session: Session) -> Tuple[Optional[datetime.datetime], str]:
+        """Change validator (see get_change_validator) for get_payee_list, taken from the same cached copy it reads"""
+        return cls.reference_cache.get_validator(session=session, obj_class=TablePayee)
+
     @classmethod
     def edit_payee(cls, session: Session, payee_id: int, data: ModelDictType):
         payee = cls.get_payee(session=session, payee_id=payee_id)
         if payee is None:
             raise ValueError(f'Failed to find payee with id: {payee_id}')
         cls._edit_obj(session=session, obj=payee, data=data)
+        payee_index.add(payee_id=payee.payee_id, payee_name=payee.payee_name)
+
+    @classmethod
+    def suggest_payees(cls, session: Session, prefix: str, limit: int = 10) -> List[Dict]:
+        """Autocompletes payee names from the per-process prefix index, most used first"""
+        return payee_index.suggest(session=session, prefix=prefix, limit=limit)
 
     @classmethod
     def get_payee_data(cls, session: Session, payee_id: int = None, payee_obj: TablePayee = None) -> Dict:
@@ -57,19 +78,19 @@ class PayeeQueries(BaseQueryHelper):
 
         # Check for transactions that use payee
         if payee.transaction_splits:
-            splits = payee.transaction_splits
+            # Copied, since reassigning each split's payee takes it out of this very collection
+            splits = list(payee.transaction_splits)
             cls.log.debug(f'Found {len(splits)} transactions that link to this payee. '
                           f'Changing their references before deletion.')
             unnamed_payee = cls.get_or_create(session=session, obj=TablePayee(payee_name='UNNAMED'), attrs='payee_name')
+            payee_index.add(payee_id=unnamed_payee.payee_id, payee_name=unnamed_payee.payee_name)
             for split in splits:
                 split.payee = unnamed_payee
-                # NOTE: Not sure if needed, but saw some (latency?) issues when this was outside the loop
-                #   in which the payee key was not properly updated for the last item in the loop.
-                session.commit()
+            session.commit()
             cls.log.debug('Replacement completed. Proceeding with delete.')
 
-        session.delete(payee)
-        session.commit()
+        cls._delete_obj(session=session, obj=payee)
+        payee_index.remove(payee_id=payee_id)
 
 
 if __name__ == '__main__':
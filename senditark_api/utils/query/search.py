@@ -0,0 +1,143 @@
+import datetime
+from typing import (
+    Dict,
+    List,
+    Tuple,
+)
+
+from sqlalchemy import (
+    Float,
+    cast,
+)
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import (
+    ColumnElement,
+    Select,
+    func,
+    literal,
+    literal_column,
+    or_,
+    select,
+    union_all,
+)
+
+from senditark_api.model import (
+    TablePayee,
+    TableTransaction,
+    TableTransactionSplit,
+)
+from senditark_api.model.base import TS_CONFIG
+from senditark_api.utils.query.base import BaseQueryHelper
+
+
+class SearchQueries(BaseQueryHelper):
+    # Upper bound on results per search, regardless of what's asked for
+    MAX_SEARCH_RESULTS = 500
+
+    @staticmethod
+    def _escape_like(term: str) -> str:
+        return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+    @classmethod
+    def _match_text(cls, col, term: str, dialect: str, full_text: bool = True) -> Tuple[ColumnElement, ColumnElement]:
+        """Builds the (filter, score) pair matching a text column against the search term.
+
+        On Postgres a column matches on its tsvector (when full_text), on word similarity of its trigrams
+            (which tolerates typos) or on a plain substring, each of which the GIN indexes from
+            text_search_indexes can answer. The score adds the full-text rank to the word similarity.
+            Other dialects fall back to a case-insensitive substring match scoring 1.
+        """
+        substring = col.ilike(f'%{cls._escape_like(term)}%', escape='\\')
+        if dialect != 'postgresql':
+            return substring, literal(1.0, Float)
+        filters = [literal(term).op('<%')(col), substring]
+        score = func.word_similarity(term, col)
+        if full_text:
+            # This has to match the indexed expression exactly for the planner to use the index
+            tsvector = func.to_tsvector(literal_column(f"'{TS_CONFIG}'"), func.coalesce(col, literal_column("''")))
+            tsquery = func.websearch_to_tsquery(literal_column(f"'{TS_CONFIG}'"), term)
+            filters.insert(0, tsvector.op('@@')(tsquery))
+            score = score + func.ts_rank(tsvector, tsquery)
+        return or_(*filters), cast(score, Float)
+
+    @classmethod
+    def get_search_query(cls, term: str, dialect: str, min_amount: float = None, max_amount: float = None,
+                         start_date: datetime.date = None, end_date: datetime.date = None,
+                         limit: int = 50) -> Select:
+        """Builds the statement behind search_transaction_splits.
+
+        Each searched column is matched on its own table first, so each match can come off that table's index
+            rather than a scan of every split. The hits are resolved to split ids, then a split's score is the
+            sum of the scores of everything of its that matched.
+        """
+        desc_match, desc_score = cls._match_text(TableTransaction.description, term=term, dialect=dialect)
+        desc_hits = select(TableTransaction.transaction_id, desc_score.label('score')).\
+            where(desc_match).cte('description_hits')
+        memo_match, memo_score = cls._match_text(TableTransactionSplit.memo, term=term, dialect=dialect)
+        payee_match, payee_score = cls._match_text(TablePayee.payee_name, term=term, dialect=dialect,
+                                                   full_text=False)
+        payee_hits = select(TablePayee.payee_id, payee_score.label('score')).where(payee_match).cte('payee_hits')
+
+        split_id = TableTransactionSplit.transaction_split_id
+        hits = union_all(
+            select(split_id, desc_hits.c.score).
+            join(desc_hits, TableTransactionSplit.transaction_key == desc_hits.c.transaction_id),
+            select(split_id, memo_score.label('score')).where(memo_match),
+            select(split_id, payee_hits.c.score).
+            join(payee_hits, TableTransactionSplit.payee_key == payee_hits.c.payee_id),
+        ).subquery('search_hits')
+        scores = select(hits.c.transaction_split_id, func.sum(hits.c.score).label('score')).\
+            group_by(hits.c.transaction_split_id).subquery('search_scores')
+
+        filters = []
+        if min_amount is not None:
+            filters.append(TableTransactionSplit.amount >= min_amount)
+        if max_amount is not None:
+            filters.append(TableTransactionSplit.amount <= max_amount)
+        if start_date is not None:
+            filters.append(TableTransaction.transaction_date >= start_date)
+        if end_date is not None:
+            filters.append(TableTransaction.transaction_date <= end_date)
+
+        return select(
+            split_id,
+            TableTransaction.transaction_id,
+            TableTransaction.transaction_date,
+            TableTransaction.description,
+            TableTransactionSplit.memo,
+            TablePayee.payee_name,
+            TableTransactionSplit.amount,
+            TableTransactionSplit.debit_account_key,
+            TableTransactionSplit.credit_account_key,
+            scores.c.score,
+        ).select_from(scores).\
+            join(TableTransactionSplit, split_id == scores.c.transaction_split_id).\
+            join(TableTransaction, TableTransaction.transaction_id == TableTransactionSplit.transaction_key).\
+            join(TablePayee, TablePayee.payee_id == TableTransactionSplit.payee_key).\
+            where(*filters).\
+            order_by(scores.c.score.desc(), TableTransaction.transaction_date.desc(), split_id.desc()).\
+            limit(min(limit, cls.MAX_SEARCH_RESULTS))
+
+    @classmethod
+    def search_transaction_splits(cls, session: Session, term: str, min_amount: float = None,
+                                  max_amount: float = None, start_date: datetime.date = None,
+                                  end_date: datetime.date = None, limit: int = 50) -> List[Dict]:
+        """Ranks the splits whose transaction description, memo or payee name match the search term
+
+        Args:
+            term: the search text. On Postgres this takes web search syntax ("quoted phrases", -exclusions, or)
+            min_amount: the smallest split amount to include
+            max_amount: the largest split amount to include
+            start_date: the earliest transaction date to include
+            end_date: the latest transaction date to include
+            limit: the most results to return (capped at MAX_SEARCH_RESULTS)
+
+        Returns:
+            the matching splits, best match first
+        """
+        term = term.strip()
+        if term == '':
+            raise ValueError('Search term must not be empty.')
+        stmt = cls.get_search_query(term=term, dialect=session.get_bind().dialect.name, min_amount=min_amount,
+                                    max_amount=max_amount, start_date=start_date, end_date=end_date, limit=limit)
+        return [row._asdict() for row in session.execute(stmt)]
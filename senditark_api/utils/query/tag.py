@@ -1,6 +1,9 @@
+import datetime
 from typing import (
     Dict,
     List,
+    Optional,
+    Tuple,
 )
 
 from sqlalchemy.orm import Session
@@ -29,6 +32,16 @@ class TagQueries(BaseQueryHelper):
     def get_tags(cls, session: Session, filters: FilterListType = None, limit: int = 100) -> List[TableTag]:
         return cls._get_objs(session=session, obj_class=TableTag, filters=filters, limit=limit)
 
+    @classmethod
+    def get_tag_list(cls, session: Session) -> List[Dict]:
+        """Lists every tag from the reference cache"""
+        return list(cls.reference_cache.get_all(session=session, obj_class=TableTag).values())
+
+    @classmethod
+    def get_tag_list_validator(cls, session: Session) -> Tuple[Optional[datetime.datetime], str]:
+        """Change validator (see get_change_validator) for get_tag_list, taken from the same cached copy it reads"""
+        return cls.reference_cache.get_validator(session=session, obj_class=TableTag)
+
     @classmethod
     def edit_tag(cls, session: Session, tag_id: int, data: ModelDictType):
         tag_obj = cls.get_tag(session=session, tag_id=tag_id)
@@ -54,8 +67,7 @@ class TagQueries(BaseQueryHelper):
 
         tag = cls.get_tag(session=session, tag_id=tag_id)
 
-        session.delete(tag)
-        session.commit()
+        cls._delete_obj(session=session, obj=tag)
 
 
 if __name__ == '__main__':
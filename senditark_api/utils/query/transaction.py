@@ -1,34 +1,96 @@
+import base64
 import datetime
+import json
 from typing import (
+    Any,
     Dict,
+    Iterable,
+    Iterator,
     List,
+    Optional,
+    Set,
+    Tuple,
     Union,
 )
 
-from sqlalchemy.orm import Session
+from sqlalchemy import (
+    CTE,
+    VARCHAR,
+    Row,
+    delete,
+    type_coerce,
+    update,
+)
+from sqlalchemy.orm import (
+    Session,
+    object_session,
+)
 from sqlalchemy.sql import (
+    ColumnElement,
+    Select,
+    Subquery,
     and_,
+    case,
     func,
     or_,
+    select,
+    tuple_,
+    union_all,
 )
 
 from senditark_api.model import (
+    ReconciledState,
     TableAccount,
     TableBalance,
+    TableInvoiceSplit,
+    TablePayee,
+    TableTag,
+    TableTagToTransactionSplit,
     TableTransaction,
     TableTransactionSplit,
 )
+from senditark_api.utils.isolation import serializable_retry
+from senditark_api.utils.query.balance import BalanceQueries
 from senditark_api.utils.query.base import (
     BaseQueryHelper,
     FilterListType,
     ModelDictType,
+    ReferenceLookup,
+)
+from senditark_api.utils.result_cache import (
+    account_scope,
+    table_scope,
 )
+from senditark_api.utils.routing import read_from_primary
 
 
 class TransactionQueries(BaseQueryHelper):
+    # Transaction types keyed by '<credit account type>:<debit account type>'
+    TRANSACTION_TYPES = {
+        'ASSET:ASSET': 'transfer',
+        'ASSET:EXPENSE': 'withdrawal',
+        'ASSET:EQUITY': 'invest',
+        'ASSET:LIABILITY': 'payoff',
+        'EXPENSE:ASSET': 'refund',
+        'INCOME:ASSET': 'deposit',
+    }
+    RECONCILED_STATE_VALUES = {x.name: x.value for x in ReconciledState}
+    # Tables besides the account's own splits & balances that cached registers are read from. Names come through the
+    #   reference cache, which reloads on the same shared versions, so a page is never cached with stale ones.
+    REGISTER_REFERENCE_TABLES = ['account', 'payee', 'tag', 'invoice_split']
+
+    @classmethod
+    def _get_transaction_account_dates(cls, transaction: TableTransaction) -> List[Tuple[int, datetime.date]]:
+        """Lists every (account, date) pair whose balances depend on the transaction"""
+        return [(account_key, transaction.transaction_date) for split in transaction.splits
+                for account_key in [split.debit_account_key, split.credit_account_key]]
 
     @classmethod
     def add_transaction(cls, session: Session, obj: TableTransaction) -> TableTransaction:
+        session.add(obj)
+        session.flush()
+        BalanceQueries.enqueue_balance_propagation(
+            session=session, account_dates=cls._get_transaction_account_dates(transaction=obj))
         return cls._add_obj(session=session, obj_class=TableTransaction, obj=obj)
 
     @classmethod
@@ -87,29 +149,48 @@ class TransactionQueries(BaseQueryHelper):
     @classmethod
     def get_all_transaction_splits(cls, session: Session, acct: TableAccount, trans_date: datetime.date = None,
                                    as_sum: bool = True) -> Union[List[TableTransactionSplit], float]:
+        if as_sum:
+            daily_flows = BalanceQueries.get_daily_net_flows(
+                session=session, account_ids=[acct.account_id], start_date=trans_date, end_date=trans_date)
+            return sum(x.net_flow for x in daily_flows)
         credit_splits = cls._get_transaction_splits_by_type(session=session, acct=acct, trans_type='credit',
                                                             trans_date=trans_date, as_sum=as_sum)
         debit_splits = cls._get_transaction_splits_by_type(session=session, acct=acct, trans_type='debit',
                                                            trans_date=trans_date, as_sum=as_sum)
         return credit_splits + debit_splits
 
-    @staticmethod
-    def get_transaction_type(credit_account: TableAccount, debit_account: TableAccount) -> str:
+    @classmethod
+    def get_transaction_type(cls, credit_account: TableAccount, debit_account: TableAccount) -> str:
         # Generate a string representing the account type of the credit and debit accounts to match with a mapping
         cred_deb_str = f'{credit_account.account_type.name}:{debit_account.account_type.name}'
+        return cls.TRANSACTION_TYPES.get(cred_deb_str, 'other')
 
-        cred_deb_mapping = {
-            'ASSET:ASSET': 'transfer',
-            'ASSET:EXPENSE': 'withdrawal',
-            'ASSET:EQUITY': 'invest',
-            'ASSET:LIABILITY': 'payoff',
-            'EXPENSE:ASSET': 'refund',
-            'INCOME:ASSET': 'deposit',
-        }
-        return cred_deb_mapping.get(cred_deb_str, 'other')
+    @classmethod
+    def _get_register_lookups(cls, session: Session) -> Tuple[ReferenceLookup, ReferenceLookup, ReferenceLookup]:
+        """Builds the (accounts, payees, tags) lookups the register formatters resolve foreign keys through.
+
+        Accounts resolve to (name, account type name), payees to their name and tags to {'name', 'color'}.
+        """
+        return (
+            cls.get_reference_lookup(session=session, obj_class=TableAccount,
+                                     transform=lambda x: (x['name'], x['account_type'].name)),
+            cls.get_reference_lookup(session=session, obj_class=TablePayee, transform=lambda x: x['payee_name']),
+            cls.get_reference_lookup(session=session, obj_class=TableTag,
+                                     transform=lambda x: {'name': x['tag_name'], 'color': x['tag_color']}),
+        )
 
     @classmethod
-    def _format_transaction_data(cls, transaction: TableTransaction, account_id: int = None) -> List[Dict]:
+    def _format_transaction_data(cls, transaction: TableTransaction, account_id: int = None,
+                                 lookups: Tuple[ReferenceLookup, ReferenceLookup, ReferenceLookup] = None) -> List[Dict]:
+        """Formats a transaction for tabular display. Accounts, payees and tags are read from the reference cache.
+
+        Args:
+            lookups: from _get_register_lookups, to share across many transactions. Built from the transaction's
+                session when None.
+        """
+        if lookups is None:
+            lookups = cls._get_register_lookups(session=object_session(transaction))
+        accounts, payees, tags = lookups
         if account_id is not None:
             total = sum([ts.amount * 1 if ts.debit_account_key == account_id else
                          ts.amount * -1 for ts in transaction.splits])
@@ -127,30 +208,30 @@ class TransactionQueries(BaseQueryHelper):
                 'transaction_id': transaction.transaction_id,
                 'is_split_parent': True,
                 'is_scheduled': transaction.is_scheduled,
-                'desc': transaction.desc,
+                'desc': transaction.description,
                 'total': total,
             })
-            for split in transaction.splits:
+            for split in sorted(transaction.splits, key=lambda x: x.transaction_split_id, reverse=True):
                 formatted_transaction.append({
                     'sort_key': f'{transaction.transaction_date:%F}-{transaction.transaction_id}-'
                                 f'{split.transaction_split_id}',
                     'is_split_parent': False,
                     'amount': split.amount if split.debit_account_key == account_id else split.amount * -1,
-                    'payee': split.payee.payee_name,
-                    'payee_id': split.payee.payee_id,
-                    'credit_account_name': split.credit_account.name,
+                    'payee': payees[split.payee_key],
+                    'payee_id': split.payee_key,
+                    'credit_account_name': accounts[split.credit_account_key][0],
                     'credit_account_key': split.credit_account_key,
-                    'credit_account_type': split.credit_account.account_type.name,
-                    'debit_account_name': split.debit_account.name,
+                    'credit_account_type': accounts[split.credit_account_key][1],
+                    'debit_account_name': accounts[split.debit_account_key][0],
                     'debit_account_key': split.debit_account_key,
-                    'debit_account_type': split.debit_account.account_type.name,
-                    'transaction_type': cls.get_transaction_type(
-                        credit_account=split.credit_account, debit_account=split.debit_account),
+                    'debit_account_type': accounts[split.debit_account_key][1],
+                    'transaction_type': cls.TRANSACTION_TYPES.get(
+                        f'{accounts[split.credit_account_key][1]}:{accounts[split.debit_account_key][1]}', 'other'),
                     'reconciled_state': split.reconciled_state.value,
-                    'invoice_id': '' if split.invoice_split is None else split.invoice_split[0].invoice_key,
+                    'invoice_id': '' if split.invoice_split is None else split.invoice_split.invoice_key,
                     'invoice_split_id': split.invoice_split_key,
                     'split_memo': split.memo,
-                    'tags': [{'name': x.tag.tag_name, 'color': x.tag.tag_color} for x in split.tags]
+                    'tags': [tags[x.tag_key] for x in split.tags]
                 })
         else:
             # Just one split - put it all on one line
@@ -162,24 +243,24 @@ class TransactionQueries(BaseQueryHelper):
                 'transaction_id': transaction.transaction_id,
                 'is_split_parent': True,
                 'is_scheduled': transaction.is_scheduled,
-                'desc': transaction.desc,
+                'desc': transaction.description,
                 'total': total,
                 'amount': total,
-                'payee': split.payee.payee_name,
-                'payee_id': split.payee.payee_id,
-                'credit_account_name': split.credit_account.name,
+                'payee': payees[split.payee_key],
+                'payee_id': split.payee_key,
+                'credit_account_name': accounts[split.credit_account_key][0],
                 'credit_account_key': split.credit_account_key,
-                'credit_account_type': split.credit_account.account_type.name,
-                'debit_account_name': split.debit_account.name,
+                'credit_account_type': accounts[split.credit_account_key][1],
+                'debit_account_name': accounts[split.debit_account_key][0],
                 'debit_account_key': split.debit_account_key,
-                'debit_account_type': split.debit_account.account_type.name,
-                'transaction_type': cls.get_transaction_type(
-                    credit_account=split.credit_account, debit_account=split.debit_account),
+                'debit_account_type': accounts[split.debit_account_key][1],
+                'transaction_type': cls.TRANSACTION_TYPES.get(
+                    f'{accounts[split.credit_account_key][1]}:{accounts[split.debit_account_key][1]}', 'other'),
                 'reconciled_state': split.reconciled_state.name,
-                'invoice_id': '' if split.invoice_split is None else split.invoice_split[0].invoice_key,
+                'invoice_id': '' if split.invoice_split is None else split.invoice_split.invoice_key,
                 'invoice_split_id': split.invoice_split_key,
                 'split_memo': split.memo,
-                'tags': [{'name': x.tag.tag_name, 'color': x.tag.tag_color} for x in split.tags]
+                'tags': [tags[x.tag_key] for x in split.tags]
             })
         return formatted_transaction
 
@@ -196,61 +277,515 @@ class TransactionQueries(BaseQueryHelper):
         transaction = cls.get_transaction(session=session, transaction_id=transaction_id)
         if transaction is None:
             raise ValueError(f'Failed to find transaction with id: {transaction_id}')
+        data = cls._clean_data(data)
+        if isinstance(data.get('transaction_date'), str):
+            data['transaction_date'] = datetime.date.fromisoformat(data['transaction_date'])
+        # Balances are stale from whichever is earlier of the old and new dates
+        account_dates = cls._get_transaction_account_dates(transaction=transaction)
+        new_date = data.get('transaction_date', transaction.transaction_date)
+        account_dates += [(account_key, new_date) for account_key, _ in account_dates]
+        BalanceQueries.enqueue_balance_propagation(session=session, account_dates=account_dates)
         cls._edit_obj(session=session, obj=transaction, data=data)
 
     @classmethod
     def delete_transaction(cls, session: Session, transaction_id: int):
         cls.log.info(f'Handling DELETE for TRANSACTION ({transaction_id})')
-        transaction = cls.get_transaction(session=session, transaction_id=transaction_id)
-        # Delete splits as well
-        if transaction.splits:
-            for split in transaction.splits:
-                session.delete(split)
-        session.delete(transaction)
+        cls.delete_transactions(session=session, transaction_ids=[transaction_id])
+
+    @classmethod
+    def _get_account_earliest_dates(cls, session: Session, transaction_ids: List[int]) -> Dict[int, datetime.date]:
+        """Maps every account with a split in the given transactions to the earliest of their dates"""
+        legs = union_all(*[
+            select(account_col.label('account_key'), TableTransaction.transaction_date).
+            join(TableTransaction, TableTransaction.transaction_id == TableTransactionSplit.transaction_key).
+            where(TableTransactionSplit.transaction_key.in_(transaction_ids))
+            for account_col in [TableTransactionSplit.debit_account_key, TableTransactionSplit.credit_account_key]
+        ]).subquery('legs')
+        return dict(session.execute(
+            select(legs.c.account_key, func.min(legs.c.transaction_date)).group_by(legs.c.account_key)
+        ).all())
+
+    @staticmethod
+    def _check_ids_found(obj_name: str, requested_ids: Set[int], found_ids: Iterable[int]):
+        missing_ids = requested_ids - set(found_ids)
+        if len(missing_ids) > 0:
+            raise ValueError(f'Failed to find {obj_name} with ids: {sorted(missing_ids)}')
+
+    @classmethod
+    @serializable_retry()
+    def delete_transactions(cls, session: Session, transaction_ids: List[int]) -> Dict[int, datetime.date]:
+        """Deletes the transactions, their splits and their split tags with one DELETE per table.
+
+        Each affected account gets queued once, from its earliest date among the deleted transactions.
+
+        Returns:
+            the earliest affected date per account
+        """
+        transaction_ids = set(transaction_ids)
+        cls._check_ids_found('transactions', requested_ids=transaction_ids, found_ids=session.execute(
+            select(TableTransaction.transaction_id).where(TableTransaction.transaction_id.in_(transaction_ids))
+        ).scalars())
+        account_dates = cls._get_account_earliest_dates(session=session, transaction_ids=list(transaction_ids))
+        split_ids = select(TableTransactionSplit.transaction_split_id).\
+            where(TableTransactionSplit.transaction_key.in_(transaction_ids))
+        session.execute(delete(TableTagToTransactionSplit).
+                        where(TableTagToTransactionSplit.transaction_split_key.in_(split_ids)))
+        session.execute(delete(TableTransactionSplit).where(TableTransactionSplit.transaction_key.in_(transaction_ids)))
+        session.execute(delete(TableTransaction).where(TableTransaction.transaction_id.in_(transaction_ids)))
+        BalanceQueries.enqueue_balance_propagation(session=session, account_dates=account_dates.items())
+        session.commit()
+        return account_dates
+
+    @classmethod
+    def _prepare_bulk_edits(cls, edits: List[ModelDictType], id_attr: str,
+                            editable_attrs: List[str]) -> List[Dict[str, Any]]:
+        """Checks and cleans bulk edits, each of which is a dict of the row's id and the new values"""
+        prepared = []
+        for edit in edits:
+            edit = cls._clean_data(edit)
+            if edit.get(id_attr) is None:
+                raise ValueError(f'Every edit requires a {id_attr}.')
+            unknown_attrs = set(edit.keys()) - set(editable_attrs) - {id_attr}
+            if len(unknown_attrs) > 0:
+                raise ValueError(f'Unable to edit attributes: {", ".join(sorted(unknown_attrs))}')
+            if isinstance(edit.get('transaction_date'), str):
+                edit['transaction_date'] = datetime.date.fromisoformat(edit['transaction_date'])
+            if isinstance(edit.get('reconciled_state'), str):
+                edit['reconciled_state'] = ReconciledState[edit['reconciled_state']]
+            prepared.append(edit)
+        return prepared
+
+    @classmethod
+    @serializable_retry()
+    def edit_transactions(cls, session: Session, transaction_edits: List[ModelDictType] = None,
+                          split_edits: List[ModelDictType] = None) -> Dict[int, datetime.date]:
+        """Applies many transaction and split edits with one bulk UPDATE per table.
+
+        Every account a touched transaction's splits point at, before or after the edits, gets queued once
+            from the earliest of the old and new dates involved.
+
+        Args:
+            transaction_edits: dicts of transaction_id and the new transaction_date, description or is_scheduled
+            split_edits: dicts of transaction_split_id and the new amount, memo, payee_key, debit_account_key,
+                credit_account_key, reconciled_state or invoice_split_key
+
+        Returns:
+            the earliest affected date per account
+        """
+        transaction_edits = cls._prepare_bulk_edits(
+            edits=transaction_edits or [], id_attr='transaction_id',
+            editable_attrs=['transaction_date', 'description', 'is_scheduled'])
+        split_edits = cls._prepare_bulk_edits(
+            edits=split_edits or [], id_attr='transaction_split_id',
+            editable_attrs=['amount', 'memo', 'payee_key', 'debit_account_key', 'credit_account_key',
+                            'reconciled_state', 'invoice_split_key'])
+
+        edited_transaction_ids = {x['transaction_id'] for x in transaction_edits}
+        edited_split_ids = {x['transaction_split_id'] for x in split_edits}
+        cls._check_ids_found('transactions', requested_ids=edited_transaction_ids, found_ids=session.execute(
+            select(TableTransaction.transaction_id).where(TableTransaction.transaction_id.in_(edited_transaction_ids))
+        ).scalars())
+        split_transaction_ids = dict(session.execute(
+            select(TableTransactionSplit.transaction_split_id, TableTransactionSplit.transaction_key).
+            where(TableTransactionSplit.transaction_split_id.in_(edited_split_ids))
+        ).all())
+        cls._check_ids_found('transaction splits', requested_ids=edited_split_ids,
+                             found_ids=split_transaction_ids.keys())
+
+        # Balances go stale from where the splits used to be and from where they end up
+        touched_transaction_ids = list(edited_transaction_ids | set(split_transaction_ids.values()))
+        account_dates = list(cls._get_account_earliest_dates(
+            session=session, transaction_ids=touched_transaction_ids).items())
+        if len(transaction_edits) > 0:
+            session.execute(update(TableTransaction), transaction_edits)
+        if len(split_edits) > 0:
+            session.execute(update(TableTransactionSplit), split_edits)
+        account_dates += list(cls._get_account_earliest_dates(
+            session=session, transaction_ids=touched_transaction_ids).items())
+        BalanceQueries.enqueue_balance_propagation(session=session, account_dates=account_dates)
         session.commit()
 
+        earliest_dates = {}
+        for account_key, from_date in account_dates:
+            earliest_dates[account_key] = min(from_date, earliest_dates.get(account_key, from_date))
+        return earliest_dates
+
+    @staticmethod
+    def encode_register_cursor(transaction_date: datetime.date, transaction_id: int) -> str:
+        """Packs the last transaction on a page into an opaque token for fetching the page after it"""
+        payload = json.dumps([transaction_date.isoformat(), transaction_id]).encode()
+        return base64.urlsafe_b64encode(payload).decode()
+
+    @staticmethod
+    def decode_register_cursor(cursor: str) -> Tuple[datetime.date, int]:
+        try:
+            transaction_date, transaction_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return datetime.date.fromisoformat(transaction_date), int(transaction_id)
+        except (ValueError, TypeError) as err:
+            raise ValueError(f'Invalid register cursor: {cursor}') from err
+
+    @classmethod
+    def _select_register_keys(cls, account_id: int, limit: int = None, cursor: str = None,
+                              start_date: datetime.date = None, end_date: datetime.date = None) -> Select:
+        """Selects the ids of the account's transactions in a register window, most recent first.
+
+        Walks the (transaction_date, transaction_id) index backwards from the cursor and stops after limit
+            transactions that have a split in the account, so nothing gets aggregated here.
+        """
+        in_account = select(TableTransactionSplit.transaction_split_id).\
+            where(TableTransactionSplit.transaction_key == TableTransaction.transaction_id,
+                  or_(TableTransactionSplit.debit_account_key == account_id,
+                      TableTransactionSplit.credit_account_key == account_id))
+        keys = select(TableTransaction.transaction_id).where(in_account.exists())
+        if cursor is not None:
+            keys = keys.where(tuple_(TableTransaction.transaction_date, TableTransaction.transaction_id) <
+                              tuple_(*cls.decode_register_cursor(cursor)))
+        if start_date is not None:
+            keys = keys.where(TableTransaction.transaction_date >= start_date)
+        if end_date is not None:
+            keys = keys.where(TableTransaction.transaction_date <= end_date)
+        keys = keys.order_by(TableTransaction.transaction_date.desc(), TableTransaction.transaction_id.desc())
+        if limit is not None:
+            keys = keys.limit(limit)
+        return keys
+
+    @classmethod
+    def _select_account_transaction_nets(cls, account_id: int, keys: Union[CTE, Subquery] = None) -> Select:
+        """Selects each of the account's transactions along with its net (signed) effect on the account
+
+        Args:
+            keys: when given, only the transactions it lists by transaction_id (e.g., see _select_register_keys)
+                are summed, with their splits looked up by transaction_key. Listed transactions without a split
+                in the account come out with a net of 0.
+        """
+        signed_amount = \
+            case((TableTransactionSplit.debit_account_key == account_id, TableTransactionSplit.amount), else_=0) - \
+            case((TableTransactionSplit.credit_account_key == account_id, TableTransactionSplit.amount), else_=0)
+        nets = select(
+            TableTransaction.transaction_id,
+            TableTransaction.transaction_date,
+            func.sum(signed_amount).label('net')
+        )
+        if keys is None:
+            nets = nets.where(or_(TableTransactionSplit.debit_account_key == account_id,
+                                  TableTransactionSplit.credit_account_key == account_id))
+        else:
+            # Splits outside the account add 0, so they aren't filtered out. That leaves the planner no way in
+            #   through the account's own splits, which would mean reading all of them.
+            nets = nets.select_from(keys).\
+                join(TableTransactionSplit, TableTransactionSplit.transaction_key == keys.c.transaction_id)
+        return nets.\
+            join_from(TableTransactionSplit, TableTransaction,
+                      TableTransactionSplit.transaction_key == TableTransaction.transaction_id).\
+            group_by(TableTransaction.transaction_id, TableTransaction.transaction_date)
+
+    @classmethod
+    def get_register_balances(cls, account_id: int, limit: int = None, cursor: str = None,
+                              start_date: datetime.date = None, end_date: datetime.date = None) -> Subquery:
+        """Builds a window of an account's register: one row per transaction, most recent first,
+            with the account's balance after that transaction.
+
+        The window's transactions are picked first (see _select_register_keys), and only their splits get summed
+            into nets. The most recent row is seeded from the stored end-of-day balance, less whatever the account
+            saw later that day. Every other row subtracts the nets of the rows before it with a running SUM() OVER,
+            so no balance rows beyond that one lookup are read and the cost only depends on the window size.
+
+        Args:
+            limit: max transactions in the window
+            cursor: see decode_register_cursor. Only transactions before it are included.
+            start_date: the earliest transaction date to include
+            end_date: the latest transaction date to include
+
+        Returns:
+            subquery with transaction_id, transaction_date, net & balance_after columns
+        """
+        keys = cls._select_register_keys(account_id=account_id, limit=limit, cursor=cursor, start_date=start_date,
+                                         end_date=end_date).cte('register_keys')
+        window = cls._select_account_transaction_nets(account_id=account_id, keys=keys).cte('register_window')
+
+        newest_first = (window.c.transaction_date.desc(), window.c.transaction_id.desc())
+        top_date = select(window.c.transaction_date).order_by(*newest_first).limit(1).scalar_subquery()
+        top_id = select(window.c.transaction_id).order_by(*newest_first).limit(1).scalar_subquery()
+        stored_bal = select(TableBalance.amount).\
+            where(TableBalance.account_key == account_id, TableBalance.date <= top_date).\
+            order_by(TableBalance.date.desc()).limit(1).scalar_subquery()
+        # The account's transactions later on the day the window starts on
+        later_keys = select(TableTransaction.transaction_id).\
+            where(TableTransaction.transaction_date == top_date, TableTransaction.transaction_id > top_id).\
+            subquery('later_keys')
+        later_nets = cls._select_account_transaction_nets(account_id=account_id, keys=later_keys).\
+            subquery('later_nets')
+        later_net = select(func.coalesce(func.sum(later_nets.c.net), 0)).scalar_subquery()
+        preceding_net = func.sum(window.c.net).over(order_by=newest_first, rows=(None, -1))
+        return select(
+            window.c.transaction_id,
+            window.c.transaction_date,
+            window.c.net,
+            (func.coalesce(stored_bal, 0) - later_net - func.coalesce(preceding_net, 0)).label('balance_after')
+        ).subquery('register')
+
+    @classmethod
+    def _select_register_splits(cls, register: Subquery) -> Select:
+        """Selects just the scalar columns the register shows, one row per split of each transaction in the window.
+
+        Rows are ordered like the register (most recent transaction first, then by split id descending),
+            so a transaction's splits always come out next to each other.
+        """
+        return select(
+            register.c.transaction_id,
+            register.c.transaction_date,
+            register.c.balance_after,
+            TableTransaction.description,
+            TableTransaction.is_scheduled,
+            TableTransactionSplit.transaction_split_id,
+            TableTransactionSplit.amount,
+            TableTransactionSplit.memo,
+            # Enums come back as their stored names, skipping the per-row conversion to members
+            type_coerce(TableTransactionSplit.reconciled_state, VARCHAR).label('reconciled_state'),
+            TableTransactionSplit.invoice_split_key,
+            TableInvoiceSplit.invoice_key,
+            # Payee and account details come from the reference cache
+            TableTransactionSplit.payee_key,
+            TableTransactionSplit.credit_account_key,
+            TableTransactionSplit.debit_account_key,
+        ).\
+            select_from(register).\
+            join(TableTransaction, TableTransaction.transaction_id == register.c.transaction_id).\
+            join(TableTransactionSplit, TableTransactionSplit.transaction_key == register.c.transaction_id).\
+            outerjoin(TableInvoiceSplit,
+                      TableInvoiceSplit.invoice_split_id == TableTransactionSplit.invoice_split_key).\
+            order_by(register.c.transaction_date.desc(), register.c.transaction_id.desc(),
+                     TableTransactionSplit.transaction_split_id.desc())
+
+    @classmethod
+    def _get_split_tags(cls, session: Session, split_filter: ColumnElement[bool],
+                        tags: ReferenceLookup) -> Dict[int, List[Dict]]:
+        """Maps each matching split's id to its tags, as the register shows them (resolved through the tag lookup)"""
+        tags_by_split = {}
+        for split_id, tag_key in session.execute(
+                select(TableTagToTransactionSplit.transaction_split_key, TableTagToTransactionSplit.tag_key).
+                join(TableTransactionSplit,
+                     TableTransactionSplit.transaction_split_id == TableTagToTransactionSplit.transaction_split_key).
+                where(split_filter).
+                order_by(TableTagToTransactionSplit.tag_to_transaction_split_id)):
+            tags_by_split.setdefault(split_id, []).append(tags[tag_key])
+        return tags_by_split
+
+    @classmethod
+    def _format_register_splits(cls, rows: List[Row], tags_by_split: Dict[int, List[Dict]], account_id: int,
+                                accounts: ReferenceLookup, payees: ReferenceLookup) -> List[Dict]:
+        """Formats one transaction's register rows (see _select_register_splits) for tabular display.
+
+        Produces exactly what _format_transaction_data does for the same transaction, plus its balance_after,
+            but from plain rows rather than hydrated ORM objects.
+        """
+        first = rows[0]
+        total = sum(x.amount if x.debit_account_key == account_id else -x.amount for x in rows)
+        sort_key_prefix = f'{first.transaction_date.isoformat()}-{first.transaction_id}-'
+        formatted_transaction = []
+        if len(rows) > 1:
+            # Many splits - show only total on top line
+            formatted_transaction.append({
+                'sort_key': f'{sort_key_prefix}{sum(x.transaction_split_id for x in rows)}',
+                'transaction_date': first.transaction_date,
+                'transaction_id': first.transaction_id,
+                'is_split_parent': True,
+                'is_scheduled': first.is_scheduled,
+                'desc': first.description,
+                'total': total,
+                'balance_after': first.balance_after,
+            })
+            for x in rows:
+                credit_name, credit_type = accounts[x.credit_account_key]
+                debit_name, debit_type = accounts[x.debit_account_key]
+                formatted_transaction.append({
+                    'sort_key': f'{sort_key_prefix}{x.transaction_split_id}',
+                    'is_split_parent': False,
+                    'amount': x.amount if x.debit_account_key == account_id else -x.amount,
+                    'payee': payees[x.payee_key],
+                    'payee_id': x.payee_key,
+                    'credit_account_name': credit_name,
+                    'credit_account_key': x.credit_account_key,
+                    'credit_account_type': credit_type,
+                    'debit_account_name': debit_name,
+                    'debit_account_key': x.debit_account_key,
+                    'debit_account_type': debit_type,
+                    'transaction_type': cls.TRANSACTION_TYPES.get(f'{credit_type}:{debit_type}', 'other'),
+                    'reconciled_state': cls.RECONCILED_STATE_VALUES[x.reconciled_state],
+                    'invoice_id': '' if x.invoice_key is None else x.invoice_key,
+                    'invoice_split_id': x.invoice_split_key,
+                    'split_memo': x.memo,
+                    'tags': tags_by_split.get(x.transaction_split_id, [])
+                })
+        else:
+            # Just one split - put it all on one line
+            credit_name, credit_type = accounts[first.credit_account_key]
+            debit_name, debit_type = accounts[first.debit_account_key]
+            formatted_transaction.append({
+                'sort_key': f'{sort_key_prefix}{first.transaction_split_id}',
+                'transaction_date': first.transaction_date,
+                'transaction_id': first.transaction_id,
+                'is_split_parent': True,
+                'is_scheduled': first.is_scheduled,
+                'desc': first.description,
+                'total': total,
+                'balance_after': first.balance_after,
+                'amount': total,
+                'payee': payees[first.payee_key],
+                'payee_id': first.payee_key,
+                'credit_account_name': credit_name,
+                'credit_account_key': first.credit_account_key,
+                'credit_account_type': credit_type,
+                'debit_account_name': debit_name,
+                'debit_account_key': first.debit_account_key,
+                'debit_account_type': debit_type,
+                'transaction_type': cls.TRANSACTION_TYPES.get(f'{credit_type}:{debit_type}', 'other'),
+                'reconciled_state': first.reconciled_state,
+                'invoice_id': '' if first.invoice_key is None else first.invoice_key,
+                'invoice_split_id': first.invoice_split_key,
+                'split_memo': first.memo,
+                'tags': tags_by_split.get(first.transaction_split_id, [])
+            })
+        return formatted_transaction
+
+    @classmethod
+    def _iter_register_transactions(cls, session: Session, account_id: int, register: Subquery,
+                                    batch_size: int = None) -> Iterator[List[Dict]]:
+        """Yields the formatted rows of each transaction in the register window, one transaction at a time.
+
+        Without a batch_size, the window's split rows and tags are read in one query each. With one, split rows
+            come off a server-side cursor batch_size at a time and tags are looked up per batch.
+        """
+        stmt = cls._select_register_splits(register=register)
+        accounts, payees, tags = cls._get_register_lookups(session=session)
+        if batch_size is None:
+            batches = [session.execute(stmt).all()]
+            tags_by_split = cls._get_split_tags(session=session, split_filter=TableTransactionSplit.transaction_key.in_(
+                select(register.c.transaction_id)), tags=tags)
+        else:
+            batches = session.execute(stmt, execution_options={'yield_per': batch_size}).partitions()
+            tags_by_split = {}
+        pending = []
+        for batch in batches:
+            if batch_size is not None:
+                tags_by_split.update(cls._get_split_tags(
+                    session=session,
+                    split_filter=TableTransactionSplit.transaction_split_id.in_([x.transaction_split_id for x in batch]),
+                    tags=tags
+                ))
+            for row in batch:
+                if len(pending) > 0 and pending[0].transaction_id != row.transaction_id:
+                    yield cls._format_register_splits(rows=pending, tags_by_split=tags_by_split,
+                                                      account_id=account_id, accounts=accounts, payees=payees)
+                    pending = []
+                pending.append(row)
+            if batch_size is not None:
+                # Only a transaction straddling the next batch still needs its tags
+                tags_by_split = {x.transaction_split_id: tags_by_split[x.transaction_split_id] for x in pending
+                                 if x.transaction_split_id in tags_by_split}
+        if len(pending) > 0:
+            yield cls._format_register_splits(rows=pending, tags_by_split=tags_by_split, account_id=account_id,
+                                              accounts=accounts, payees=payees)
+
+    @classmethod
+    def get_transaction_page_by_account(cls, session: Session, account_id: int, limit: int = None,
+                                        cursor: str = None, start_date: datetime.date = None,
+                                        end_date: datetime.date = None) -> Dict:
+        """Gets one page of an account's register, most recent first.
+
+        Transactions are ordered by (transaction_date, transaction_id) descending and their splits by
+            transaction_split_id descending. Pages are keyed off the last transaction of the previous page
+            (the cursor), so fetching any page costs the same regardless of how much history comes before it.
+            Pages are kept in the result cache until the account or the tables in REGISTER_REFERENCE_TABLES change.
+
+        Args:
+            limit: max transactions on the page. When None, the rest of the register is returned.
+            cursor: the next_cursor of the previous page. When None, starts from the most recent transaction.
+            start_date: the earliest transaction date to include
+            end_date: the latest transaction date to include
+
+        Returns:
+            dict with the formatted rows under 'transaction_splits' and 'next_cursor'
+                (None when there are no more pages)
+        """
+        return cls.result_cache.get_or_compute(
+            name='register_page', args=(account_id, limit, cursor, start_date, end_date),
+            scopes=[account_scope(account_id)] + [table_scope(x) for x in cls.REGISTER_REFERENCE_TABLES],
+            compute=lambda: cls._get_transaction_page_by_account(
+                session=session, account_id=account_id, limit=limit, cursor=cursor, start_date=start_date,
+                end_date=end_date))
+
+    @classmethod
+    def _get_transaction_page_by_account(cls, session: Session, account_id: int, limit: Optional[int],
+                                         cursor: Optional[str], start_date: Optional[datetime.date],
+                                         end_date: Optional[datetime.date]) -> Dict:
+        # Cached, so read from the primary (see read_from_primary)
+        with read_from_primary(session):
+            # One extra transaction tells us whether there's another page
+            register = cls.get_register_balances(account_id=account_id, limit=None if limit is None else limit + 1,
+                                                 cursor=cursor, start_date=start_date, end_date=end_date)
+            formatted_transactions = []
+            next_cursor = None
+            last_transaction = None
+            for i, formatted_transaction in enumerate(cls._iter_register_transactions(
+                    session=session, account_id=account_id, register=register)):
+                if limit is not None and i == limit:
+                    next_cursor = cls.encode_register_cursor(transaction_date=last_transaction['transaction_date'],
+                                                             transaction_id=last_transaction['transaction_id'])
+                    break
+                # The parent entry always comes first
+                last_transaction = formatted_transaction[0]
+                formatted_transactions += formatted_transaction
+
+            return {
+                'transaction_splits': formatted_transactions,
+                'next_cursor': next_cursor,
+            }
+
+    @classmethod
+    def get_register_validator(cls, session: Session, account_id: int) -> Tuple[Optional[datetime.datetime], str]:
+        """Change validator (see get_change_validator) covering every page of the account's register"""
+        account_splits = or_(TableTransactionSplit.debit_account_key == account_id,
+                             TableTransactionSplit.credit_account_key == account_id)
+        return cls.get_change_validator(session=session, sources=[
+            (TableTransactionSplit, [account_splits]),
+            (TableTransaction, [TableTransaction.transaction_id.in_(
+                select(TableTransactionSplit.transaction_key).where(account_splits))]),
+            (TableTagToTransactionSplit, [TableTagToTransactionSplit.transaction_split_key.in_(
+                select(TableTransactionSplit.transaction_split_id).where(account_splits))]),
+            (TableBalance, [TableBalance.account_key == account_id]),
+            (TableAccount, []),
+            (TablePayee, []),
+            (TableTag, []),
+        ])
+
+    @classmethod
+    def iter_transaction_data_by_account(cls, session: Session, account_id: int, start_date: datetime.date = None,
+                                         end_date: datetime.date = None, batch_size: int = 500) -> Iterator[Dict]:
+        """Yields an account's formatted register rows, most recent first, without holding the whole register.
+
+        Split rows are read off a server-side cursor batch_size at a time and formatted as they arrive.
+            Nothing outside the current batch stays referenced, so memory use doesn't grow with the register.
+        """
+        register = cls.get_register_balances(account_id=account_id, start_date=start_date, end_date=end_date)
+        for formatted_transaction in cls._iter_register_transactions(session=session, account_id=account_id,
+                                                                     register=register, batch_size=batch_size):
+            yield from formatted_transaction
+
     @classmethod
     def get_transaction_data_by_account(cls, session: Session, account_id: int) -> List[Dict]:
-        transactions = session.query(TableTransaction).\
-            join(TableTransactionSplit, TableTransactionSplit.transaction_key == TableTransaction.transaction_id).\
-            join(TableAccount, or_(
-                TableAccount.account_id == TableTransactionSplit.debit_account_key,
-                TableAccount.account_id == TableTransactionSplit.credit_account_key
-            )).\
-            filter(TableAccount.account_id == account_id).all()
-        # Format transactions for tabular display
-        formatted_transactions = []
-
-        t: TableTransaction
-        for t in transactions:
-            formatted_transactions += cls._format_transaction_data(transaction=t, account_id=account_id)
-
-        # Sort from most recent, ensuring parent entries (if separate) show up first
-        formatted_transactions = sorted(formatted_transactions, key=lambda item: item['sort_key'], reverse=True)
-
-        # Get balances for account for date range
-        balances = session.query(TableBalance).filter(TableBalance.account_key == account_id).all()
-        running_balance = 0
-        for i in range(len(formatted_transactions)):
-            # First, skip any entry that's not a parent of a split
-            if not formatted_transactions[i]['is_split_parent']:
-                continue
-            # The most recent transaction is the first entry in this list.
-            # Since the balance amounts are effectively the last entry of the day's balance_after,
-            #   we do nothing for the first entry
-            transaction_date = formatted_transactions[i]['transaction_date']
-            transaction_total = formatted_transactions[i]['total'] * -1
-            if i == 0:
-                running_balance = next(x.amount for x in balances if x.date == transaction_date)
-            # Carry forward the balance from the last transaction, then calculate the next transaction's balance.
-            formatted_transactions[i]['balance_after'] = running_balance
-            running_balance += transaction_total
-
-        return formatted_transactions
+        """Gets an account's whole register, most recent first"""
+        return cls.get_transaction_page_by_account(session=session, account_id=account_id)['transaction_splits']
 
     @classmethod
     def add_transaction_split(cls, session: Session, data: ModelDictType) -> TableTransactionSplit:
-        return cls._add_obj(session=session, obj_class=TableTransactionSplit, data=data)
+        split = cls._build_obj(obj_class=TableTransactionSplit, data=data)
+        session.add(split)
+        session.flush()
+        trans_date = split.transaction.transaction_date
+        BalanceQueries.enqueue_balance_propagation(session=session, account_dates=[
+            (split.debit_account_key, trans_date), (split.credit_account_key, trans_date)])
+        return cls._add_obj(session=session, obj_class=TableTransactionSplit, obj=split)
 
     @classmethod
     def get_transaction_split(cls, session: Session, transaction_split_id: int = None,
@@ -267,7 +802,15 @@ class TransactionQueries(BaseQueryHelper):
     @classmethod
     def edit_transaction_split(cls, session: Session, transaction_split_id: int, data: ModelDictType):
         transaction_split_obj = cls.get_transaction_split(session=session, transaction_split_id=transaction_split_id)
-
+        if transaction_split_obj is None:
+            raise ValueError(f'Failed to find transaction split with id: {transaction_split_id}')
+        data = cls._clean_data(data)
+        # Both the accounts the split is moving away from and the ones it's moving to need recomputing
+        trans_date = transaction_split_obj.transaction.transaction_date
+        account_keys = [transaction_split_obj.debit_account_key, transaction_split_obj.credit_account_key,
+                        data.get('debit_account_key'), data.get('credit_account_key')]
+        BalanceQueries.enqueue_balance_propagation(
+            session=session, account_dates=[(account_key, trans_date) for account_key in account_keys])
         cls._edit_obj(session=session, obj=transaction_split_obj, data=data)
 
 
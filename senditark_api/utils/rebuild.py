@@ -0,0 +1,119 @@
+import io
+
+import pandas as pd
+from pukr import get_logger
+from sqlalchemy import (
+    delete,
+    insert,
+    select,
+    text,
+)
+from sqlalchemy.orm import Session
+
+from senditark_api.model import (
+    TableBalance,
+    TableBalanceCheckpoint,
+    TableTransaction,
+    TableTransactionSplit,
+)
+from senditark_api.utils.isolation import serializable_retry
+from senditark_api.utils.result_cache import (
+    EPOCH_SCOPE,
+    result_cache,
+)
+
+log = get_logger()
+
+
+class BalanceRebuilder:
+    """Rebuilds the balance table from scratch out of the transaction splits
+
+    This is the way back to a known-good state whenever the incremental propagation path has drifted.
+    """
+    # Number of splits pulled from the server-side cursor at a time
+    CHUNK_SIZE = 250_000
+
+    @classmethod
+    def compute_daily_balances(cls, session: Session) -> pd.DataFrame:
+        """Streams every split joined to its transaction date and returns end-of-day balances for each account
+
+        Returns:
+            DataFrame with columns account_key, date, amount, sorted by account and date
+        """
+        stmt = select(
+            TableTransactionSplit.debit_account_key,
+            TableTransactionSplit.credit_account_key,
+            TableTransaction.transaction_date.label('date'),
+            TableTransactionSplit.amount
+        ).join(TableTransaction, TableTransaction.transaction_id == TableTransactionSplit.transaction_key).\
+            execution_options(stream_results=True)
+
+        conn = session.connection()
+        partial_flows = []
+        for chunk in pd.read_sql(stmt, conn, chunksize=cls.CHUNK_SIZE):
+            if chunk.empty:
+                continue
+            # Each split is a debit to one account and a credit to another, so it becomes two signed legs
+            legs = pd.concat([
+                pd.DataFrame({'account_key': chunk['debit_account_key'], 'date': chunk['date'],
+                              'amount': chunk['amount']}),
+                pd.DataFrame({'account_key': chunk['credit_account_key'], 'date': chunk['date'],
+                              'amount': -chunk['amount']}),
+            ], ignore_index=True)
+            partial_flows.append(legs.groupby(['account_key', 'date'])['amount'].sum())
+            log.debug(f'Aggregated chunk of {len(chunk)} splits.')
+
+        if len(partial_flows) == 0:
+            return pd.DataFrame(columns=['account_key', 'date', 'amount'])
+
+        # Chunks can overlap on (account, date), so the partial sums get summed once more before accumulating
+        daily_flows = pd.concat(partial_flows).groupby(level=['account_key', 'date']).sum().sort_index()
+        balances = daily_flows.groupby(level='account_key').cumsum()
+        return balances.reset_index()
+
+    @classmethod
+    def replace_balances(cls, session: Session, balances: pd.DataFrame):
+        """Swaps the contents of the balance table for the provided balances in a single bulk load"""
+        conn = session.connection()
+        if conn.dialect.name == 'postgresql':
+            tbl_name = conn.dialect.identifier_preparer.format_table(TableBalance.__table__)
+            session.execute(text(f'TRUNCATE TABLE {tbl_name}'))
+            buffer = io.StringIO()
+            balances.assign(is_deleted=False)[['account_key', 'date', 'amount', 'is_deleted']].\
+                to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+            with conn.connection.cursor() as cursor:
+                cursor.copy_expert(
+                    f'COPY {tbl_name} (account_key, date, amount, is_deleted) FROM STDIN WITH (FORMAT csv)', buffer)
+        else:
+            session.execute(delete(TableBalance))
+            if not balances.empty:
+                session.execute(insert(TableBalance), balances.to_dict(orient='records'))
+
+    @classmethod
+    def replace_checkpoints(cls, session: Session, balances: pd.DataFrame):
+        """Swaps out the month-end checkpoints for ones derived from the provided daily balances"""
+        session.execute(delete(TableBalanceCheckpoint))
+        if balances.empty:
+            return
+        month_ends = (pd.to_datetime(balances['date']) + pd.offsets.MonthEnd(0)).dt.date
+        # Balances are sorted by account and date, so the last row of each month is its closing balance
+        checkpoints = balances.assign(month_end=month_ends).groupby(['account_key', 'month_end'])['amount'].last()
+        session.execute(insert(TableBalanceCheckpoint), checkpoints.reset_index().to_dict(orient='records'))
+
+    @classmethod
+    @serializable_retry()
+    def rebuild_balances(cls, session: Session) -> int:
+        """Recomputes and replaces every balance in one database transaction
+
+        Returns:
+            The number of balance rows written
+        """
+        log.info('Computing daily balances from transaction splits...')
+        balances = cls.compute_daily_balances(session=session)
+        log.info(f'Replacing balance table with {len(balances)} rows...')
+        cls.replace_balances(session=session, balances=balances)
+        cls.replace_checkpoints(session=session, balances=balances)
+        result_cache.bump_on_commit(session=session, scopes=[EPOCH_SCOPE])
+        session.commit()
+        return len(balances)
@@ -0,0 +1,213 @@
+import json
+import os
+import pathlib
+import pickle
+import sqlite3
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from pukr import get_logger
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+log = get_logger()
+
+# Scope bumped whenever the balances of every account change at once (e.g., a full rebuild). Part of every key.
+EPOCH_SCOPE = 'epoch'
+# Scope bumped along with any single account's
+ALL_ACCOUNTS_SCOPE = 'accounts'
+# Sentinel for cache misses, since None is a perfectly cacheable result
+MISS = object()
+
+
+def account_scope(account_id: int) -> str:
+    return f'account:{account_id}'
+
+
+def table_scope(table_name: str) -> str:
+    return f'table:{table_name}'
+
+
+class NullCacheBackend:
+    """Caches nothing. Used until a real backend is configured, e.g., in one-off scripts and tests."""
+
+    def get(self, key: str) -> Any:
+        return MISS
+
+    def set(self, key: str, value: Any, ttl: float):
+        pass
+
+    def get_versions(self, scopes: List[str]) -> Dict[str, int]:
+        return {x: 0 for x in scopes}
+
+    def bump(self, scopes: Iterable[str]):
+        pass
+
+
+class SqliteCacheBackend(NullCacheBackend):
+    """Result cache in an on-disk SQLite file, shared by every process that opens the same path.
+
+    Entries expire after their TTL and the least recently read are evicted past max_entries.
+        Scope versions live in the same file, so a bump made by one process is seen by the next lookup in any other.
+        Each thread of each process keeps its own connection.
+    """
+    SCHEMA = [
+        'CREATE TABLE IF NOT EXISTS cache_entry '
+        '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS ix_cache_entry_accessed_at ON cache_entry (accessed_at)',
+        'CREATE TABLE IF NOT EXISTS cache_version (scope TEXT PRIMARY KEY, version INTEGER NOT NULL)',
+    ]
+
+    def __init__(self, path: Union[str, pathlib.Path], max_entries: int = 1000,
+                 max_value_bytes: int = 8 * 1024 * 1024):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.max_value_bytes = max_value_bytes
+        self._local = threading.local()
+        with self._connect() as conn:
+            for stmt in self.SCHEMA:
+                conn.execute(stmt)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections can't follow a fork, so forked workers open their own
+        conn, pid = getattr(self._local, 'conn', None), getattr(self._local, 'pid', None)
+        if conn is None or pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key: str) -> Any:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute('SELECT value FROM cache_entry WHERE key = ? AND expires_at > ?', (key, now)).fetchone()
+            if row is None:
+                return MISS
+            conn.execute('UPDATE cache_entry SET accessed_at = ? WHERE key = ?', (now, key))
+        return pickle.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_value_bytes:
+            log.debug(f'Skipped caching {key}: {len(blob)} bytes is over the limit.')
+            return
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO cache_entry (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+                         (key, blob, now + ttl, now))
+            conn.execute('DELETE FROM cache_entry WHERE expires_at <= ?', (now, ))
+            n_over = conn.execute('SELECT COUNT(*) FROM cache_entry').fetchone()[0] - self.max_entries
+            if n_over > 0:
+                conn.execute('DELETE FROM cache_entry WHERE key IN '
+                             '(SELECT key FROM cache_entry ORDER BY accessed_at LIMIT ?)', (n_over, ))
+
+    def get_versions(self, scopes: List[str]) -> Dict[str, int]:
+        versions = {x: 0 for x in scopes}
+        with self._connect() as conn:
+            versions.update(conn.execute(
+                f'SELECT scope, version FROM cache_version WHERE scope IN ({", ".join("?" * len(scopes))})', scopes
+            ).fetchall())
+        return versions
+
+    def bump(self, scopes: Iterable[str]):
+        with self._connect() as conn:
+            conn.executemany('INSERT INTO cache_version (scope, version) VALUES (?, 1) '
+                             'ON CONFLICT (scope) DO UPDATE SET version = version + 1', [(x, ) for x in scopes])
+
+
+class ResultCache:
+    """Caches computed results under keys tied to the current versions of the data they were computed from.
+
+    Every result names the scopes it depends on (see account_scope & table_scope). Writes bump the versions of the
+        scopes they touch, which moves every dependent result onto a new key, so stale entries are simply never read
+        again and age out through the backend's TTL & eviction. With a backend shared across processes, a write in
+        one worker invalidates the results cached by all of them.
+    """
+
+    def __init__(self, backend: NullCacheBackend = None, ttl: float = 300):
+        self.backend = backend or NullCacheBackend()
+        self.ttl = ttl
+
+    def configure(self, backend: NullCacheBackend, ttl: float = None):
+        self.backend = backend
+        if ttl is not None:
+            self.ttl = ttl
+
+    @staticmethod
+    def _make_key(name: str, args: Tuple, versions: Dict[str, int]) -> str:
+        return json.dumps([name, args, sorted(versions.items())], default=str, separators=(',', ':'))
+
+    def get_or_compute(self, name: str, args: Tuple, scopes: List[str], compute: Callable[[], Any],
+                       ttl: float = None) -> Any:
+        """Returns the cached result of compute() for the given name & args, computing and caching it on a miss.
+
+        Backend failures are logged and fall through to compute(), so a broken cache only costs speed.
+        """
+        try:
+            key = self._make_key(name=name, args=args,
+                                 versions=self.backend.get_versions([EPOCH_SCOPE] + scopes))
+            value = self.backend.get(key)
+        except sqlite3.Error as err:
+            log.warning(f'Result cache lookup failed for {name}: {err}')
+            return compute()
+        if value is not MISS:
+            return value
+        value = compute()
+        try:
+            self.backend.set(key, value, ttl=self.ttl if ttl is None else ttl)
+        except sqlite3.Error as err:
+            log.warning(f'Result cache write failed for {name}: {err}')
+        return value
+
+    def get_versions(self, scopes: List[str]) -> Optional[Dict[str, int]]:
+        """Reads the current versions of the scopes, or None when the backend fails"""
+        try:
+            return self.backend.get_versions(scopes)
+        except sqlite3.Error as err:
+            log.warning(f'Result cache version lookup failed: {err}')
+            return None
+
+    def bump(self, scopes: Iterable[str]):
+        try:
+            self.backend.bump(set(scopes))
+        except sqlite3.Error as err:
+            log.warning(f'Result cache invalidation failed: {err}')
+
+    def bump_on_commit(self, session: Session, scopes: Iterable[str]):
+        """Bumps the scopes once the session's current transaction commits (and forgets them if it rolls back).
+
+        Bumping before the commit would let another worker cache the pre-commit data under the new versions.
+        """
+        session.info.setdefault('result_cache_scopes', set()).update(scopes)
+
+    def invalidate_accounts(self, session: Session, account_ids: Iterable[Optional[int]]):
+        """Invalidates the results of the given accounts, and anything spanning all accounts, on commit"""
+        self.bump_on_commit(session=session, scopes=[account_scope(x) for x in account_ids if x is not None] +
+                            [ALL_ACCOUNTS_SCOPE])
+
+
+# The cache shared by the query helpers. Stays a no-op until configured (see create_app).
+result_cache = ResultCache()
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_committed_scopes(session: Session):
+    scopes = session.info.pop('result_cache_scopes', None)
+    if scopes:
+        result_cache.bump(scopes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_rolled_back_scopes(session: Session):
+    session.info.pop('result_cache_scopes', None)
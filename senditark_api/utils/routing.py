@@ -0,0 +1,35 @@
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy.orm import Session
+
+# Bind key of the optional read replica (see BaseConfig.SQLALCHEMY_REPLICA_URI)
+REPLICA_BIND_KEY = 'replica'
+
+
+def route_reads_to_replica(session: Session):
+    """Marks the session's reads for the replica, if it has one (see flask_base.RoutingSession)"""
+    session.info['use_replica'] = True
+
+
+def forbid_writes(session: Session):
+    """Makes the session refuse flushes and DML statements (see flask_base.RoutingSession).
+
+    Without a replica, a read-only route's transaction is READ ONLY on the primary, where Postgres rejects writes
+        anyway. Refusing them up front makes a route fail the same way with a replica, and on SQLite.
+    """
+    session.info['read_only'] = True
+
+
+@contextmanager
+def read_from_primary(session: Session) -> Iterator[Session]:
+    """Sends the session's reads to the primary for the duration, replica or not.
+
+    Used wherever a result gets cached under the current version of the data: a lagging replica could otherwise
+        get a stale answer cached as if it were fresh.
+    """
+    session.info['n_primary_reads'] = session.info.get('n_primary_reads', 0) + 1
+    try:
+        yield session
+    finally:
+        session.info['n_primary_reads'] -= 1
@@ -0,0 +1,118 @@
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+from typing import (
+    Dict,
+    List,
+    Optional,
+)
+
+from pukr import get_logger
+from sqlalchemy import create_engine
+from sqlalchemy.orm import (
+    Session,
+    sessionmaker,
+)
+
+from senditark_api.model import TableBalance
+from senditark_api.utils.isolation import serializable_retry
+from senditark_api.utils.propagation import PropagationHelper
+from senditark_api.utils.query import SenditarkQueries
+
+log = get_logger()
+
+# Sessions can't cross process boundaries, so every pool worker builds its own from this
+_worker_session_factory: Optional[sessionmaker] = None
+
+
+def _init_worker(db_uri: str, engine_options: Dict):
+    global _worker_session_factory
+    _worker_session_factory = sessionmaker(bind=create_engine(db_uri, **engine_options))
+
+
+def _verify_account(account_id: int) -> Dict:
+    session = _worker_session_factory()
+    try:
+        return BalanceVerifier.verify_account(session=session, account_id=account_id)
+    finally:
+        session.close()
+
+
+class BalanceVerifier:
+    """Checks stored balances against the ones implied by the transaction splits"""
+    # Largest difference still considered equal, to absorb float rounding
+    TOLERANCE = 0.005
+
+    @classmethod
+    def verify_account(cls, session: Session, account_id: int) -> Dict:
+        """Recomputes an account's expected daily balances and diffs them against the stored ones
+
+        Returns:
+            dict with the first divergent date (None when the account checks out) and the amounts on that date
+        """
+        daily_flows = SenditarkQueries.get_daily_net_flows(session=session, account_ids=[account_id])
+        stored = dict(session.query(TableBalance.date, TableBalance.amount).
+                      filter(TableBalance.account_key == account_id).all())
+
+        expected = {}
+        running_bal = 0
+        for _, flow_date, net_flow in daily_flows:
+            running_bal += net_flow
+            expected[flow_date] = running_bal
+
+        result = {
+            'account_id': account_id,
+            'n_expected': len(expected),
+            'n_stored': len(stored),
+            'first_divergent_date': None,
+            'expected_amount': None,
+            'stored_amount': None,
+        }
+        for bal_date in sorted(set(expected.keys()) | set(stored.keys())):
+            expected_amt, stored_amt = expected.get(bal_date), stored.get(bal_date)
+            if expected_amt is None or stored_amt is None or abs(expected_amt - stored_amt) > cls.TOLERANCE:
+                result.update({
+                    'first_divergent_date': bal_date,
+                    'expected_amount': expected_amt,
+                    'stored_amount': stored_amt,
+                })
+                break
+        return result
+
+    @classmethod
+    def verify_accounts(cls, db_uri: str, account_ids: List[int], max_workers: int = None,
+                        engine_options: Dict = None) -> List[Dict]:
+        """Spreads account verification across a process pool
+
+        Args:
+            db_uri: database to verify. Each worker process opens its own engine on it.
+            account_ids: accounts to verify
+            max_workers: size of the pool (default: number of CPUs)
+            engine_options: extra keyword args for each worker's create_engine call
+        """
+        log.info(f'Verifying balances for {len(account_ids)} accounts...')
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(db_uri, engine_options or {})) as pool:
+            results = list(pool.map(_verify_account, account_ids))
+        n_divergent = len([x for x in results if x['first_divergent_date'] is not None])
+        log.info(f'Verification complete. {n_divergent} of {len(results)} accounts diverge.')
+        return results
+
+    @classmethod
+    @serializable_retry()
+    def repair_accounts(cls, session: Session, results: List[Dict]) -> List[int]:
+        """Recomputes each divergent account from its first divergent date, committing once
+
+        Returns:
+            The ids of the repaired accounts
+        """
+        repaired = []
+        for result in results:
+            first_divergent_date: datetime.date = result['first_divergent_date']
+            if first_divergent_date is None:
+                continue
+            log.debug(f'Repairing account {result["account_id"]} from {first_divergent_date}')
+            PropagationHelper.propagate_account_balances(
+                session=session, account_id=result['account_id'], start_date=first_divergent_date)
+            repaired.append(result['account_id'])
+        session.commit()
+        return repaired
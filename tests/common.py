@@ -2,6 +2,18 @@ import random
 import string
 from unittest.mock import patch
 
+from sqlalchemy import create_engine
+from sqlalchemy.orm import (
+    Session,
+    sessionmaker,
+)
+
+from senditark_api.model import (
+    Base,
+    TableTransaction,
+)
+from senditark_api.utils.propagation import PropagationHelper
+
 
 def make_patcher(obj, name: str) -> patch:
     """Makes patching a bit easier
@@ -28,3 +40,31 @@ def random_string(n_chars: int = 10, addl_chars: str = None) -> str:
 def random_float(min_rng: float, max_rng: float) -> float:
     """Randomly selects a float based on a given range"""
     return random.random() * (max_rng - min_rng) + min_rng
+
+
+SQLITE_ENGINE_OPTIONS = {'execution_options': {'schema_translate_map': {'default': None}}}
+
+
+def make_sqlite_session(db_uri: str = 'sqlite://') -> Session:
+    """Builds a session bound to a fresh SQLite database (in-memory by default) holding the full schema.
+
+    The models live in the 'default' schema, which SQLite doesn't have, so it gets translated away.
+    """
+    engine = create_engine(db_uri, **SQLITE_ENGINE_OPTIONS)
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def propagate_transaction(session: Session, transaction: TableTransaction):
+    """Brings the balances of every account touched by the transaction up to date right away, committing once.
+
+    Stands in for the balance queue in tests that need balances in place after each posted transaction.
+    """
+    session.flush()
+    account_ids = set()
+    for split in transaction.splits:
+        account_ids.update([split.debit_account_key, split.credit_account_key])
+    for account_id in sorted(account_ids):
+        PropagationHelper.propagate_account_balances(session=session, account_id=account_id,
+                                                     start_date=transaction.transaction_date)
+    session.commit()
@@ -0,0 +1,110 @@
+import datetime
+from unittest import TestCase
+
+from senditark_api.model import (
+    AccountType,
+    TableAccount,
+    TableBalance,
+    TableBalanceQueue,
+    TablePayee,
+    TableTransaction,
+    TableTransactionSplit,
+)
+from senditark_api.utils.query import SenditarkQueries
+
+from ..common import make_sqlite_session
+
+
+class TestBalanceQueries(TestCase):
+
+    def setUp(self):
+        self.session = make_sqlite_session()
+        self.chk = TableAccount('CHK', AccountType.ASSET)
+        self.sav = TableAccount('SAV', AccountType.ASSET)
+        self.session.add_all([self.chk, self.sav])
+        self.session.commit()
+        self.session.add_all([
+            TableBalance(date=datetime.date(2023, 1, 5), amount=100.0, account=self.chk),
+            TableBalance(date=datetime.date(2023, 1, 31), amount=150.0, account=self.chk),
+            TableBalance(date=datetime.date(2023, 2, 14), amount=75.0, account=self.chk),
+            TableBalance(date=datetime.date(2023, 2, 1), amount=1000.0, account=self.sav),
+        ])
+        self.session.commit()
+
+    def test_get_balances_as_of(self):
+        dates = [datetime.date(2023, 1, 1), datetime.date(2023, 1, 31), datetime.date(2023, 2, 28)]
+        balances = SenditarkQueries.get_balances_as_of(
+            session=self.session, account_ids=[self.chk.account_id, self.sav.account_id], dates=dates)
+
+        self.assertEqual(6, len(balances))
+        resolved = {(x['account_id'], x['as_of']): (x['balance_date'], x['balance']) for x in balances}
+        self.assertEqual({
+            (self.chk.account_id, dates[0]): (None, None),
+            (self.chk.account_id, dates[1]): (datetime.date(2023, 1, 31), 150.0),
+            (self.chk.account_id, dates[2]): (datetime.date(2023, 2, 14), 75.0),
+            (self.sav.account_id, dates[0]): (None, None),
+            (self.sav.account_id, dates[1]): (None, None),
+            (self.sav.account_id, dates[2]): (datetime.date(2023, 2, 1), 1000.0),
+        }, resolved)
+
+    def test_get_accounts_with_balance(self):
+        accounts = SenditarkQueries.get_accounts_with_balance(session=self.session, as_of=datetime.date(2023, 1, 20))
+        self.assertEqual(1, len(accounts))
+        self.assertEqual(self.chk.account_id, accounts[0]['account_id'])
+        self.assertEqual(100.0, accounts[0]['balance'])
+        self.assertEqual(datetime.date(2023, 1, 5), accounts[0]['balance_date'])
+
+    def test_get_daily_net_flows(self):
+        groc = TableAccount('GROC', AccountType.EXPENSE)
+        payee = TablePayee('GROCER')
+        for trans_date, amount in [(datetime.date(2023, 1, 2), 10.0), (datetime.date(2023, 1, 2), 5.5),
+                                   (datetime.date(2023, 1, 9), 20.0)]:
+            self.session.add(TableTransaction(transaction_date=trans_date, splits=[
+                TableTransactionSplit(amount=amount, payee=payee, credit_account=self.chk, debit_account=groc,
+                                      tags=[])
+            ]))
+        self.session.commit()
+        account_ids = [self.chk.account_id, groc.account_id]
+
+        rows = SenditarkQueries.get_daily_net_flows(session=self.session, account_ids=account_ids)
+        self.assertEqual([
+            (self.chk.account_id, datetime.date(2023, 1, 2), -15.5),
+            (self.chk.account_id, datetime.date(2023, 1, 9), -20.0),
+            (groc.account_id, datetime.date(2023, 1, 2), 15.5),
+            (groc.account_id, datetime.date(2023, 1, 9), 20.0),
+        ], [tuple(x) for x in rows])
+
+        window = SenditarkQueries.get_daily_net_flows(session=self.session, account_ids=account_ids,
+                                                      start_date=datetime.date(2023, 1, 3), output='numpy')
+        self.assertEqual([self.chk.account_id, groc.account_id], window['account_key'].tolist())
+        self.assertEqual(['2023-01-09', '2023-01-09'], window['transaction_date'].astype(str).tolist())
+        self.assertEqual([-20.0, 20.0], window['net_flow'].tolist())
+
+        series = SenditarkQueries.get_daily_net_flows(session=self.session, account_ids=account_ids,
+                                                      output='pandas')
+        self.assertEqual({self.chk.account_id: -35.5, groc.account_id: 35.5},
+                         series.groupby(level='account_key').sum().to_dict())
+
+        self.assertEqual(-15.5, SenditarkQueries.get_all_transaction_splits(
+            session=self.session, acct=self.chk, trans_date=datetime.date(2023, 1, 2)))
+        with self.assertRaises(ValueError):
+            SenditarkQueries.get_daily_net_flows(session=self.session, account_ids=account_ids, output='polars')
+
+    def test_enqueue_full_recompute(self):
+        groc = TableAccount('GROC', AccountType.EXPENSE)
+        self.session.add(TableTransaction(transaction_date=datetime.date(2023, 1, 2), splits=[
+            TableTransactionSplit(amount=10.0, payee=TablePayee('GROCER'), credit_account=self.chk,
+                                  debit_account=groc, tags=[])
+        ]))
+        self.session.commit()
+
+        n_queued = SenditarkQueries.enqueue_full_recompute(
+            session=self.session, account_ids=[self.chk.account_id, self.sav.account_id, groc.account_id])
+        self.session.commit()
+        self.assertEqual(3, n_queued)
+        # From each account's earliest split or stored balance, whichever comes first
+        self.assertEqual({
+            self.chk.account_id: datetime.date(2023, 1, 2),
+            self.sav.account_id: datetime.date(2023, 2, 1),
+            groc.account_id: datetime.date(2023, 1, 2),
+        }, dict(self.session.query(TableBalanceQueue.account_key, TableBalanceQueue.from_date).all()))
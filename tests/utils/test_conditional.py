@@ -0,0 +1,107 @@
+import datetime
+from unittest import TestCase
+
+from flask import Flask
+
+from senditark_api.model import (
+    AccountType,
+    TableAccount,
+    TablePayee,
+    TableTransaction,
+    TableTransactionSplit,
+)
+from senditark_api.routes.helpers import conditional_json
+from senditark_api.utils.query import SenditarkQueries
+
+from ..common import make_sqlite_session
+
+
+class TestChangeValidators(TestCase):
+
+    def setUp(self):
+        self.session = session = make_sqlite_session()
+        self.chk = TableAccount('CHK', AccountType.ASSET)
+        self.sav = TableAccount('SAV', AccountType.ASSET)
+        self.groc = TableAccount('GROC', AccountType.EXPENSE)
+        self.payee = TablePayee('Grocer')
+        session.add_all([self.chk, self.sav, self.groc, self.payee])
+        self.transaction = TableTransaction(transaction_date=datetime.date(2023, 5, 1), splits=[
+            TableTransactionSplit(amount=10, payee=self.payee, credit_account=self.chk, debit_account=self.groc,
+                                  tags=[])
+        ])
+        session.add(self.transaction)
+        session.commit()
+
+    def _get_register_etags(self):
+        return [SenditarkQueries.get_register_validator(session=self.session, account_id=x.account_id)[1]
+                for x in [self.chk, self.sav]]
+
+    def test_register_validator(self):
+        last_modified, etag = SenditarkQueries.get_register_validator(session=self.session,
+                                                                      account_id=self.chk.account_id)
+        self.assertIsInstance(last_modified, datetime.datetime)
+        chk_etag, sav_etag = self._get_register_etags()
+        self.assertEqual([chk_etag, sav_etag], self._get_register_etags())
+
+        # Transactions in other accounts leave the register be
+        self.session.add(TableTransaction(transaction_date=datetime.date(2023, 5, 2), splits=[
+            TableTransactionSplit(amount=5, payee=self.payee, credit_account=self.sav, debit_account=self.groc,
+                                  tags=[])
+        ]))
+        self.session.commit()
+        new_chk_etag, new_sav_etag = self._get_register_etags()
+        self.assertEqual(chk_etag, new_chk_etag)
+        self.assertNotEqual(sav_etag, new_sav_etag)
+
+        # Deletes show up even though no remaining row was touched
+        SenditarkQueries.delete_transactions(session=self.session,
+                                             transaction_ids=[self.transaction.transaction_id])
+        self.assertNotEqual(chk_etag, self._get_register_etags()[0])
+
+    def test_list_validators(self):
+        _, etag = SenditarkQueries.get_payee_list_validator(session=self.session)
+        self.assertEqual(etag, SenditarkQueries.get_payee_list_validator(session=self.session)[1])
+        SenditarkQueries.add_payee(session=self.session, data={'payee_name': 'Garage'})
+        self.assertNotEqual(etag, SenditarkQueries.get_payee_list_validator(session=self.session)[1])
+
+        _, etag = SenditarkQueries.get_accounts_with_balance_validator(session=self.session)
+        SenditarkQueries.delete_account(session=self.session, account_id=self.sav.account_id)
+        self.assertNotEqual(etag, SenditarkQueries.get_accounts_with_balance_validator(session=self.session)[1])
+
+
+class TestConditionalJson(TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['VERSION'] = '1.0.0'
+        self.validator = (datetime.datetime(2023, 5, 1, 12, 30, 15, 250), 'abc123')
+        self.n_builds = 0
+
+    def _get(self, headers=None):
+        def build_payload():
+            self.n_builds += 1
+            return {'a': 1}
+
+        with self.app.test_request_context(headers=headers or {}):
+            return conditional_json(validator=self.validator, build_payload=build_payload)
+
+    def test_conditional_json(self):
+        resp = self._get()
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual({'a': 1}, resp.get_json())
+        self.assertEqual('Mon, 01 May 2023 12:30:15 GMT', resp.headers['Last-Modified'])
+        etag = resp.headers['ETag']
+
+        resp = self._get({'If-None-Match': etag})
+        self.assertEqual(304, resp.status_code)
+        self.assertEqual(etag, resp.headers['ETag'])
+        self.assertEqual(1, self.n_builds)
+        self.assertEqual(304, self._get({'If-Modified-Since': resp.headers['Last-Modified']}).status_code)
+
+        # The ETag wins out over the date
+        resp = self._get({'If-None-Match': '"stale"', 'If-Modified-Since': resp.headers['Last-Modified']})
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(200, self._get({'If-Modified-Since': 'Mon, 01 May 2023 12:30:14 GMT'}).status_code)
+        # Same data, new version: the payload might have changed shape
+        self.app.config['VERSION'] = '1.1.0'
+        self.assertEqual(200, self._get({'If-None-Match': etag}).status_code)
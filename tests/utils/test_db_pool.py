@@ -0,0 +1,61 @@
+import pathlib
+import tempfile
+from unittest import TestCase
+
+from flask import Flask
+from sqlalchemy import (
+    create_engine,
+    exc,
+    text,
+)
+
+from senditark_api.config import BaseConfig
+from senditark_api.flask_base import SenditarkSQLAlchemy
+from senditark_api.utils.db_pool import (
+    MeteredQueuePool,
+    get_pool_status,
+)
+
+
+class TestDbPool(TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.db_uri = f'sqlite:///{pathlib.Path(tmp_dir.name).joinpath("test.db")}'
+
+    def test_metered_pool(self):
+        engine = create_engine(self.db_uri, poolclass=MeteredQueuePool, pool_size=1, max_overflow=0,
+                               pool_timeout=0.05)
+        self.addCleanup(engine.dispose)
+        with engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+            status = get_pool_status(engine)
+            self.assertEqual((1, 1, 1, 0), (status['size'], status['max_connections'], status['in_use'],
+                                            status['checked_in']))
+            # The only connection is taken
+            with self.assertRaises(exc.TimeoutError):
+                engine.connect()
+        status = get_pool_status(engine)
+        self.assertEqual((1, 1, 0), (status['n_checkouts'], status['n_timeouts'], status['in_use']))
+        self.assertGreaterEqual(status['max_wait_ms'], 50)
+
+    def test_one_engine_per_process(self):
+        class TestConfig(BaseConfig):
+            SECRETS = {}
+            SQLALCHEMY_DATABASE_URI = self.db_uri
+
+        TestConfig.build_db_engine()
+        self.addCleanup(TestConfig.ENGINE.dispose)
+        engine = TestConfig.ENGINE
+        # Building again keeps the engine (and its pool)
+        TestConfig.build_db_engine()
+        self.assertIs(engine, TestConfig.ENGINE)
+
+        app = Flask(__name__)
+        app.config.from_object(TestConfig)
+        db = SenditarkSQLAlchemy()
+        db.init_app(app)
+        with app.app_context():
+            self.assertIs(engine, db.engine)
+            self.assertIs(engine, db.session.get_bind())
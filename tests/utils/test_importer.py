@@ -0,0 +1,156 @@
+import datetime
+import io
+import time
+from unittest import TestCase
+
+from senditark_api.model import (
+    AccountType,
+    TableAccount,
+    TableBalanceQueue,
+    TablePayee,
+    TableTransaction,
+    TableTransactionSplit,
+)
+from senditark_api.utils.importer import (
+    StatementImporter,
+    StatementLine,
+    StatementParser,
+)
+from senditark_api.utils.propagation import PropagationHelper
+from senditark_api.utils.query import SenditarkQueries
+
+from ..common import make_sqlite_session
+
+OFX_SGML = """OFXHEADER:100
+DATA:OFXSGML
+<OFX>
+<BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20230105120000.000[-5:EST]
+<TRNAMT>-42.50
+<FITID>1001
+<NAME>GROCER
+<MEMO>Weekly shop
+</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20230115<TRNAMT>1,500.00<FITID>1002<NAME>EMPLOYER</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1>
+</OFX>
+"""
+
+QIF = """!Type:Bank
+D1/ 5'23
+T-42.50
+PGROCER
+MWeekly shop
+LGROC
+^
+D01/15/2023
+U1,500.00
+T1,500.00
+PEMPLOYER
+^
+"""
+
+
+class TestStatementParser(TestCase):
+
+    def test_parse_csv(self):
+        stream = io.StringIO('Date,Amount,Payee,Memo,Account\n'
+                             '01/05/2023,-42.50,GROCER,Weekly shop,GROC\n'
+                             '01/15/2023,"$1,500.00",EMPLOYER,,\n')
+        lines = list(StatementParser.parse(stream=stream, fmt='.CSV', date_format='%m/%d/%Y'))
+        self.assertEqual([
+            StatementLine(line_no=2, transaction_date=datetime.date(2023, 1, 5), amount=-42.5, payee='GROCER',
+                          memo='Weekly shop', account='GROC'),
+            StatementLine(line_no=3, transaction_date=datetime.date(2023, 1, 15), amount=1500.0, payee='EMPLOYER'),
+        ], lines)
+
+        with self.assertRaises(ValueError):
+            list(StatementParser.parse_csv(stream=io.StringIO('date,payee\n2023-01-01,X\n')))
+        with self.assertRaises(ValueError):
+            list(StatementParser.parse_csv(stream=io.StringIO('date,amount\n2023-01-01,lots\n')))
+
+    def test_parse_ofx(self):
+        lines = list(StatementParser.parse(stream=io.StringIO(OFX_SGML), fmt='ofx'))
+        self.assertEqual([
+            StatementLine(line_no=5, transaction_date=datetime.date(2023, 1, 5), amount=-42.5, payee='GROCER',
+                          memo='Weekly shop'),
+            StatementLine(line_no=13, transaction_date=datetime.date(2023, 1, 15), amount=1500.0, payee='EMPLOYER'),
+        ], lines)
+
+    def test_parse_qif(self):
+        lines = list(StatementParser.parse(stream=io.StringIO(QIF), fmt='qif'))
+        self.assertEqual([
+            StatementLine(line_no=2, transaction_date=datetime.date(2023, 1, 5), amount=-42.5, payee='GROCER',
+                          memo='Weekly shop', account='GROC'),
+            StatementLine(line_no=8, transaction_date=datetime.date(2023, 1, 15), amount=1500.0, payee='EMPLOYER'),
+        ], lines)
+
+    def test_parse_unknown_format(self):
+        with self.assertRaises(ValueError):
+            StatementParser.parse(stream=io.StringIO(''), fmt='xlsx')
+
+
+class TestStatementImporter(TestCase):
+
+    def setUp(self):
+        self.session = make_sqlite_session()
+        self.chk = TableAccount('CHK', AccountType.ASSET)
+        self.groc = TableAccount('GROC', AccountType.EXPENSE)
+        self.unsorted = TableAccount('UNSORTED', AccountType.EXPENSE)
+        self.session.add_all([self.chk, self.groc, self.unsorted, TablePayee('Grocer')])
+        self.session.commit()
+
+    def test_import_lines(self):
+        lines = StatementParser.parse(stream=io.StringIO(QIF), fmt='qif')
+        summary = StatementImporter(session=self.session, account_id=self.chk.account_id,
+                                    offset_account_id=self.unsorted.account_id).import_lines(lines)
+        self.assertEqual(2, summary['n_transactions'])
+        # 'GROCER' matches the existing 'Grocer'
+        self.assertEqual(1, summary['n_new_payees'])
+
+        splits = {x.amount: x for x in self.session.query(TableTransactionSplit).all()}
+        self.assertEqual((self.groc.account_id, self.chk.account_id),
+                         (splits[42.5].debit_account_key, splits[42.5].credit_account_key))
+        self.assertEqual('Grocer', splits[42.5].payee.payee_name)
+        self.assertEqual('Weekly shop', splits[42.5].transaction.description)
+        self.assertEqual((self.chk.account_id, self.unsorted.account_id),
+                         (splits[1500].debit_account_key, splits[1500].credit_account_key))
+
+        # One queue entry per account, from its earliest imported date
+        queued = {x.account_key: x.from_date for x in self.session.query(TableBalanceQueue).all()}
+        self.assertEqual({
+            self.chk.account_id: datetime.date(2023, 1, 5),
+            self.groc.account_id: datetime.date(2023, 1, 5),
+            self.unsorted.account_id: datetime.date(2023, 1, 15),
+        }, queued)
+        PropagationHelper.process_balance_queue(session=self.session)
+        self.assertAlmostEqual(1457.5, SenditarkQueries.get_balance_as_of(
+            session=self.session, account_id=self.chk.account_id, as_of=datetime.date(2023, 1, 31)))
+
+    def test_import_rolls_back_on_bad_line(self):
+        stream = io.StringIO('date,amount,payee,account\n2023-01-01,-5,A,GROC\n2023-01-02,-5,B,NOPE\n')
+        importer = StatementImporter(session=self.session, account_id=self.chk.account_id,
+                                     offset_account_id=self.unsorted.account_id)
+        with self.assertRaises(ValueError):
+            importer.import_lines(StatementParser.parse_csv(stream=stream))
+        self.assertEqual(0, self.session.query(TableTransaction).count())
+        self.assertEqual(1, self.session.query(TablePayee).count())
+
+    def test_import_large_statement(self):
+        n_lines = 20000
+        rows = ['date,amount,payee,memo'] + [
+            f'{datetime.date(2020, 1, 1) + datetime.timedelta(days=i // 20)},{-(i % 97 + 1)}.25,PAYEE {i % 300},'
+            f'Line {i}' for i in range(n_lines)
+        ]
+        start = time.perf_counter()
+        summary = StatementImporter(session=self.session, account_id=self.chk.account_id,
+                                    offset_account_id=self.unsorted.account_id).\
+            import_lines(StatementParser.parse_csv(stream=io.StringIO('\n'.join(rows))))
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(n_lines, summary['n_transactions'])
+        self.assertEqual(300, summary['n_new_payees'])
+        self.assertEqual(n_lines, self.session.query(TableTransactionSplit).count())
+        self.assertLess(elapsed, 10)
@@ -0,0 +1,77 @@
+from unittest import TestCase
+
+from sqlalchemy import (
+    exc,
+    text,
+)
+
+from senditark_api.utils.isolation import serializable_retry
+
+from ..common import (
+    make_patcher,
+    make_sqlite_session,
+)
+
+
+class PgError(Exception):
+    def __init__(self, pgcode: str):
+        super().__init__(pgcode)
+        self.pgcode = pgcode
+
+
+class TestSerializableRetry(TestCase):
+
+    def setUp(self):
+        self.session = make_sqlite_session()
+        self.mock_sleep = make_patcher(self, 'senditark_api.utils.isolation.time.sleep')
+        self.n_calls = 0
+
+    def _make_unit_of_work(self, pgcodes):
+        """Makes a unit of work that fails with each of the given pgcodes in turn, then succeeds"""
+        @serializable_retry(max_attempts=3)
+        def unit_of_work(session):
+            self.n_calls += 1
+            session.execute(text('SELECT 1'))
+            if self.n_calls <= len(pgcodes):
+                raise exc.OperationalError('SELECT 1', {}, PgError(pgcodes[self.n_calls - 1]))
+            session.commit()
+            return 'done'
+        return unit_of_work
+
+    def test_replays_serialization_failures(self):
+        self.assertEqual('done', self._make_unit_of_work(['40001', '40P01'])(session=self.session))
+        self.assertEqual(3, self.n_calls)
+        self.assertEqual(2, self.mock_sleep.call_count)
+        self.assertFalse(self.session.in_transaction())
+
+    def test_gives_up(self):
+        # Out of attempts
+        with self.assertRaises(exc.OperationalError):
+            self._make_unit_of_work(['40001'] * 3)(self.session)
+        self.assertEqual(3, self.n_calls)
+        # Other errors aren't retried
+        self.n_calls = 0
+        with self.assertRaises(exc.OperationalError):
+            self._make_unit_of_work(['23505'])(self.session)
+        self.assertEqual(1, self.n_calls)
+
+    def test_joins_open_transaction(self):
+        self.session.execute(text('SELECT 1'))
+        with self.assertRaises(exc.OperationalError):
+            self._make_unit_of_work(['40001'])(self.session)
+        self.assertEqual(1, self.n_calls)
+        self.mock_sleep.assert_not_called()
+
+    def test_warns_when_joining_weaker_transaction(self):
+        mock_log = make_patcher(self, 'senditark_api.utils.isolation.log')
+        make_patcher(self, 'senditark_api.utils.isolation._is_postgres').return_value = True
+        # SQLite transactions are SERIALIZABLE
+        self.session.execute(text('SELECT 1'))
+        self.assertEqual('done', self._make_unit_of_work([])(self.session))
+        mock_log.warning.assert_not_called()
+
+        self.session.execute(text('SELECT 1'))
+        make_patcher(self, 'senditark_api.utils.isolation.get_isolation_level').return_value = 'READ COMMITTED'
+        self.assertEqual('done', self._make_unit_of_work([])(self.session))
+        mock_log.warning.assert_called_once()
+        self.assertIn('READ COMMITTED', mock_log.warning.call_args.args[0])
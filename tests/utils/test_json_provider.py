@@ -0,0 +1,58 @@
+import datetime
+from unittest import TestCase
+
+from flask import (
+    Flask,
+    jsonify,
+)
+import numpy as np
+
+from senditark_api.json_provider import OrjsonProvider
+from senditark_api.model import (
+    AccountType,
+    ReconciledState,
+    TableAccount,
+    TablePayee,
+    TableTransaction,
+    TableTransactionSplit,
+)
+
+from ..common import make_sqlite_session
+
+
+class TestOrjsonProvider(TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.json = OrjsonProvider(self.app)
+
+    def test_models(self):
+        session = make_sqlite_session()
+        chk = TableAccount('CHK', AccountType.ASSET, last_reconciled=datetime.date(2023, 5, 1))
+        groc = TableAccount('GROC', AccountType.EXPENSE)
+        split = TableTransactionSplit(amount=10, payee=TablePayee('Grocer'), credit_account=chk, debit_account=groc,
+                                      tags=[])
+        session.add(TableTransaction(transaction_date=datetime.date(2023, 5, 2), splits=[split]))
+        session.commit()
+
+        with self.app.app_context():
+            resp = jsonify({'account': chk, 'split': split, 'state': ReconciledState.c})
+        data = resp.get_json()
+        self.assertEqual({
+            'account_id': chk.account_id, 'parent_account_key': None, 'name': 'CHK', 'full_name': 'ASSET.CHK',
+            'description': None, 'level': 0, 'account_type': AccountType.ASSET.value,
+            'account_currency': chk.account_currency.value, 'last_reconciled': '2023-05-01', 'is_hidden': False,
+            'is_active': True,
+        }, data['account'])
+        # Relationship fields nest
+        self.assertEqual('GROC', data['split']['debit_account']['name'])
+        self.assertEqual('Grocer', data['split']['payee']['payee_name'])
+        self.assertEqual('Cleared', data['state'])
+
+    def test_plain_values(self):
+        with self.app.app_context():
+            self.assertEqual('{"1":[1,2],"x":"2023-05-01"}',
+                             self.app.json.dumps({1: np.array([1, 2]), 'x': datetime.date(2023, 5, 1)}))
+            self.assertEqual({'a': [1]}, self.app.json.loads(b'{"a": [1]}'))
+            with self.assertRaises(TypeError):
+                self.app.json.dumps({'a': object()})
@@ -0,0 +1,98 @@
+import datetime
+import pathlib
+import tempfile
+from unittest import TestCase
+
+from sqlalchemy import (
+    create_engine,
+    inspect,
+    select,
+    text,
+)
+from sqlalchemy.orm import Session
+
+from senditark_api.migrations import (
+    MIGRATIONS,
+    Migration,
+    MigrationRunner,
+)
+from senditark_api.migrations.v0001_hot_path_indexes import INDEXES
+from senditark_api.model import (
+    AccountType,
+    Base,
+    TableAccount,
+    TableBalance,
+    TableBalanceQueue,
+)
+
+from ..common import SQLITE_ENGINE_OPTIONS
+
+
+class TestMigrationRunner(TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.engine = create_engine(f'sqlite:///{pathlib.Path(tmp_dir.name).joinpath("test.db")}',
+                                    **SQLITE_ENGINE_OPTIONS)
+        self.addCleanup(self.engine.dispose)
+        Base.metadata.create_all(self.engine)
+        self.runner = MigrationRunner(self.engine, MIGRATIONS)
+
+    def _get_index_names(self, table_name: str):
+        return {x['name'] for x in inspect(self.engine).get_indexes(table_name)}
+
+    def _make_legacy_db(self):
+        """Takes the database back to before the hot-path indexes, with balances duplicated on some days"""
+        with self.engine.begin() as conn:
+            for table, index_name in INDEXES:
+                conn.execute(text(f'DROP INDEX {index_name}'))
+            # SQLite can't drop a constraint, so the balance table gets rebuilt without it
+            conn.execute(text('ALTER TABLE balance RENAME TO balance_old'))
+            conn.execute(text('CREATE TABLE balance AS SELECT * FROM balance_old WHERE 0'))
+            conn.execute(text('DROP TABLE balance_old'))
+        with Session(self.engine) as session:
+            account = TableAccount('CHK', AccountType.ASSET)
+            session.add(account)
+            session.flush()
+            for balance_id, (day, amount) in enumerate([(1, 10), (1, 11), (2, 12), (3, 13), (3, 14)], start=1):
+                balance = TableBalance(datetime.date(2024, 1, day), amount=amount, account=account)
+                balance.balance_id = balance_id
+                session.add(balance)
+            account_id = account.account_id
+            session.commit()
+        return account_id
+
+    def test_upgrade(self):
+        account_id = self._make_legacy_db()
+        self.assertEqual([1], self.runner.upgrade())
+        for table, index_name in INDEXES:
+            self.assertIn(index_name, self._get_index_names(table.__tablename__))
+        with Session(self.engine) as session:
+            # The newest balance of each day is kept, and the account is queued from its first duplicate on
+            self.assertEqual([(1, 11), (2, 12), (3, 14)],
+                             [(x.date.day, x.amount) for x in session.scalars(
+                                 select(TableBalance).order_by(TableBalance.date))])
+            self.assertEqual([(account_id, datetime.date(2024, 1, 1))],
+                             [(x.account_key, x.from_date) for x in session.scalars(select(TableBalanceQueue))])
+        # Nothing left to apply
+        self.assertEqual([], self.runner.upgrade())
+        self.assertEqual({1}, self.runner.get_applied_versions())
+
+    def test_stamp(self):
+        # A database built from the models is already up to date
+        self.assertEqual([1], self.runner.stamp())
+        self.assertEqual([], self.runner.get_pending())
+
+        calls = []
+        runner = MigrationRunner(self.engine, MIGRATIONS + [
+            Migration(version=2, description='second', upgrade=lambda conn: calls.append(2)),
+            Migration(version=3, description='third', upgrade=lambda conn: calls.append(3)),
+        ])
+        self.assertEqual([2], runner.upgrade(target_version=2))
+        self.assertEqual([3], runner.upgrade())
+        self.assertEqual([2, 3], calls)
+
+    def test_rejects_unordered_versions(self):
+        with self.assertRaises(ValueError):
+            MigrationRunner(self.engine, [MIGRATIONS[0], MIGRATIONS[0]])
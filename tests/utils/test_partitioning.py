@@ -0,0 +1,27 @@
+from unittest import TestCase
+
+from senditark_api.model import TableBalance
+from senditark_api.utils.partitioning import (
+    PARTITION_COLUMNS,
+    ensure_year_partitions,
+    get_partition_name,
+    partition_table,
+)
+
+from ..common import make_sqlite_session
+
+
+class TestPartitioning(TestCase):
+
+    def setUp(self):
+        self.session = make_sqlite_session()
+        self.addCleanup(self.session.close)
+
+    def test_partitioning_needs_postgres(self):
+        self.assertEqual([], ensure_year_partitions(session=self.session))
+        with self.assertRaises(ValueError):
+            partition_table(session=self.session, table=TableBalance)
+        # Only balance has a date of its own to partition by
+        self.assertEqual({TableBalance: 'date'}, PARTITION_COLUMNS)
+        self.assertEqual(['balance_y2024', 'balance_default'],
+                         [get_partition_name(TableBalance, 2024), get_partition_name(TableBalance)])
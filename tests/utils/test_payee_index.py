@@ -0,0 +1,108 @@
+import datetime
+import pathlib
+import tempfile
+from unittest import TestCase
+
+from senditark_api.model import (
+    AccountType,
+    TableAccount,
+    TablePayee,
+    TableTransaction,
+    TableTransactionSplit,
+)
+from senditark_api.utils.payee_index import (
+    PayeeIndex,
+    payee_index,
+)
+from senditark_api.utils.query import SenditarkQueries
+from senditark_api.utils.result_cache import (
+    NullCacheBackend,
+    ResultCache,
+    SqliteCacheBackend,
+    result_cache,
+    table_scope,
+)
+
+from ..common import make_sqlite_session
+
+
+class TestPayeeIndex(TestCase):
+
+    def setUp(self):
+        self.session = session = make_sqlite_session()
+        chk = TableAccount('CHK', AccountType.ASSET)
+        groc = TableAccount('GROC', AccountType.EXPENSE)
+        self.payees = {name: TablePayee(name) for name in ['Corner Grocer', 'Grocery Outlet', 'Groceteria',
+                                                           'Gas Station', 'UNNAMED']}
+        session.add_all([chk, groc] + list(self.payees.values()))
+        recent = datetime.date.today() - datetime.timedelta(days=3)
+        long_ago = datetime.date.today() - datetime.timedelta(days=payee_index.USAGE_WINDOW_DAYS + 30)
+        # Outlet is the most used lately; Groceteria only has old activity, which doesn't count
+        for name, trans_date, n_times in [('Grocery Outlet', recent, 3), ('Corner Grocer', recent, 1),
+                                          ('Groceteria', long_ago, 5)]:
+            for _ in range(n_times):
+                session.add(TableTransaction(transaction_date=trans_date, splits=[
+                    TableTransactionSplit(amount=5, payee=self.payees[name], credit_account=chk,
+                                          debit_account=groc, tags=[])
+                ]))
+        session.commit()
+        payee_index.load(session=self.session)
+
+    def _suggest(self, prefix: str, **kwargs):
+        suggestions = SenditarkQueries.suggest_payees(session=self.session, prefix=prefix, **kwargs)
+        return [x['payee_name'] for x in suggestions]
+
+    def test_suggest(self):
+        self.assertEqual(['Grocery Outlet', 'Corner Grocer', 'Groceteria'], self._suggest('GRO'))
+        # Later words are matched too, but each payee only shows once
+        self.assertEqual(['Corner Grocer'], self._suggest('corner  gro'))
+        self.assertEqual(['Grocery Outlet', 'Corner Grocer'], self._suggest('grocer'))
+        self.assertEqual(['Grocery Outlet'], self._suggest('g', limit=1))
+        self.assertEqual(3, SenditarkQueries.suggest_payees(session=self.session, prefix='grocery')[0]['n_uses'])
+        self.assertEqual([], self._suggest(' '))
+        self.assertEqual([], self._suggest('zz'))
+
+    def test_payee_writes_update_index(self):
+        new_payee = SenditarkQueries.add_payee(session=self.session, data={'payee_name': 'Groovy Records'})
+        self.assertEqual(['Groovy Records'], self._suggest('groo'))
+
+        SenditarkQueries.edit_payee(session=self.session, payee_id=new_payee.payee_id,
+                                    data={TablePayee.payee_name: 'Vinyl Barn'})
+        self.assertEqual([], self._suggest('groo'))
+        self.assertEqual(['Vinyl Barn'], self._suggest('barn'))
+
+        SenditarkQueries.delete_payee(session=self.session, payee_id=self.payees['Grocery Outlet'].payee_id)
+        self.assertEqual(['Corner Grocer', 'Groceteria'], self._suggest('gro'))
+
+    def test_stale_index_reloads(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        result_cache.configure(backend=SqliteCacheBackend(pathlib.Path(tmp_dir.name).joinpath('cache.sqlite3')))
+        self.addCleanup(result_cache.configure, backend=NullCacheBackend())
+        payee_index.load(session=self.session)
+        self.session.add(TablePayee('Grotto Pizza'))
+        self.session.commit()
+        # Written around PayeeQueries, so it only shows once the payee scope moves
+        self.assertEqual([], self._suggest('grot'))
+        result_cache.bump([table_scope(TablePayee.__tablename__)])
+        self.assertEqual(['Grotto Pizza'], self._suggest('grot'))
+
+    def test_follows_writes_of_other_workers(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        # Two indexes sharing a result cache backend stand in for two worker processes
+        shared_versions = ResultCache(SqliteCacheBackend(pathlib.Path(tmp_dir.name).joinpath('cache.sqlite3')))
+        worker_a, worker_b = PayeeIndex(shared_versions), PayeeIndex(shared_versions)
+        worker_a.load(session=self.session)
+        worker_b.load(session=self.session)
+
+        # Worker B's write, as PayeeQueries makes it
+        payee = TablePayee('Grotto Pizza')
+        self.session.add(payee)
+        self.session.commit()
+        worker_b.add(payee_id=payee.payee_id, payee_name=payee.payee_name)
+        shared_versions.bump([table_scope(TablePayee.__tablename__)])
+        self.assertTrue(worker_a.is_stale)
+        self.assertEqual(['Grotto Pizza'],
+                         [x['payee_name'] for x in worker_a.suggest(session=self.session, prefix='grot')])
+        self.assertFalse(worker_a.is_stale)
@@ -0,0 +1,174 @@
+import datetime
+from typing import (
+    Dict,
+    Tuple,
+)
+from unittest import TestCase
+from unittest.mock import patch
+
+from sqlalchemy.orm import Session
+
+from senditark_api.model import (
+    AccountType,
+    TableAccount,
+    TableBalance,
+    TableBalanceCheckpoint,
+    TableBalanceQueue,
+    TablePayee,
+    TableTransaction,
+    TableTransactionSplit,
+)
+from senditark_api.utils.propagation import PropagationHelper
+from senditark_api.utils.query import SenditarkQueries
+
+from ..common import (
+    make_sqlite_session,
+    propagate_transaction,
+    random_float,
+)
+
+
+def propagate_per_date(session: Session, transaction: TableTransaction):
+    """Reference implementation the set-based propagation is checked against.
+
+    This is the original per-date path: it sets the transaction date's balance from the day before's, then walks
+        every later balance of each affected account, summing that day's splits onto a running total.
+    """
+    trans_date = transaction.transaction_date
+    for split in transaction.splits:
+        for acct, sign in [(split.debit_account, 1), (split.credit_account, -1)]:
+            prev_bal = SenditarkQueries.get_balance_as_of(
+                session=session, account_id=acct.account_id, as_of=trans_date - datetime.timedelta(days=1))
+            bal = session.query(TableBalance).\
+                filter(TableBalance.account_key == acct.account_id, TableBalance.date == trans_date).one_or_none()
+            if bal is None:
+                bal = TableBalance(date=trans_date, amount=prev_bal + split.amount * sign, account=acct)
+                session.add(bal)
+            else:
+                bal.amount = prev_bal + SenditarkQueries.get_all_transaction_splits(
+                    session=session, acct=acct, trans_date=trans_date, as_sum=True)
+            session.commit()
+
+            running_bal = bal.amount
+            for forward_bal in session.query(TableBalance).\
+                    filter(TableBalance.account_key == acct.account_id, TableBalance.date > trans_date).\
+                    order_by(TableBalance.date).all():
+                running_bal += SenditarkQueries.get_all_transaction_splits(
+                    session=session, acct=acct, trans_date=forward_bal.date, as_sum=True)
+                forward_bal.amount = running_bal
+            session.commit()
+
+
+class TestPropagationHelper(TestCase):
+
+    def setUp(self):
+        self.start = datetime.date(2023, 1, 1)
+        # (day offset, [(amount, credit account, debit account), ...]), posted in this order.
+        #   The last few entries are back-dated to force forward propagation.
+        self.transactions = [
+            (0, [(1500.0, 'PAY', 'CHK')]),
+            (2, [(random_float(5, 100), 'CHK', 'GROC')]),
+            (2, [(random_float(5, 100), 'CC', 'GROC')]),
+            (35, [(random_float(5, 100), 'CC', 'GROC'), (random_float(5, 100), 'CHK', 'GROC')]),
+            (64, [(200.0, 'CHK', 'CC')]),
+            (100, [(random_float(5, 100), 'CHK', 'GROC')]),
+            (1, [(random_float(5, 100), 'CC', 'GROC')]),
+            (35, [(random_float(5, 100), 'CHK', 'GROC')]),
+            (0, [(25.0, 'CHK', 'CHK')]),
+        ]
+
+    def _post_transactions(self, session: Session, propagate) -> Dict[Tuple[str, datetime.date], float]:
+        accounts = {
+            'CHK': TableAccount('CHK', AccountType.ASSET),
+            'CC': TableAccount('CC', AccountType.LIABILITY),
+            'GROC': TableAccount('GROC', AccountType.EXPENSE),
+            'PAY': TableAccount('PAY', AccountType.INCOME),
+        }
+        payee = TablePayee('STORE')
+        session.add_all(list(accounts.values()) + [payee])
+        session.commit()
+
+        for day_offset, splits in self.transactions:
+            transaction = TableTransaction(
+                transaction_date=self.start + datetime.timedelta(days=day_offset),
+                splits=[TableTransactionSplit(amount=amt, payee=payee, credit_account=accounts[credit],
+                                              debit_account=accounts[debit], tags=[])
+                        for amt, credit, debit in splits]
+            )
+            session.add(transaction)
+            session.commit()
+            propagate(session=session, transaction=transaction)
+
+        return {(bal.account.name, bal.date): bal.amount for bal in session.query(TableBalance).all()}
+
+    def test_set_based_matches_per_date(self):
+        expected = self._post_transactions(make_sqlite_session(), propagate_per_date)
+        actual = self._post_transactions(make_sqlite_session(), propagate_transaction)
+
+        self.assertEqual(set(expected.keys()), set(actual.keys()))
+        for key, amount in expected.items():
+            self.assertAlmostEqual(amount, actual[key], places=6, msg=f'Balance mismatch for {key}')
+
+    def test_single_commit_per_queue_pass(self):
+        session = make_sqlite_session()
+        self._post_transactions(
+            session, lambda session, transaction: SenditarkQueries.add_transaction(session=session, obj=transaction))
+        with patch.object(session, 'commit', wraps=session.commit) as mock_commit:
+            PropagationHelper.process_balance_queue(session=session)
+        mock_commit.assert_called_once()
+
+    def test_queue_coalesces_per_account(self):
+        expected = self._post_transactions(make_sqlite_session(), propagate_transaction)
+
+        session = make_sqlite_session()
+        actual = self._post_transactions(
+            session, lambda session, transaction: SenditarkQueries.add_transaction(session=session, obj=transaction))
+        self.assertEqual({}, actual)
+        queue_status = SenditarkQueries.get_balance_queue_status(session)
+        self.assertEqual(4, queue_status['pending_accounts'])
+        self.assertEqual(self.start, queue_status['earliest_dirty_date'])
+        # Computed by the database, as seconds since the oldest entry was queued
+        self.assertIsInstance(queue_status['lag_seconds'], float)
+        self.assertTrue(0 <= queue_status['lag_seconds'] < 60)
+
+        with patch.object(PropagationHelper, 'propagate_account_balances',
+                          wraps=PropagationHelper.propagate_account_balances) as mock_propagate:
+            n_accounts = PropagationHelper.process_balance_queue(session=session)
+        self.assertEqual(4, n_accounts)
+        self.assertEqual(4, mock_propagate.call_count)
+        # Each account gets recomputed from the earliest date it was marked dirty on
+        account_names = {x.account_id: x.name for x in session.query(TableAccount).all()}
+        start_dates = {account_names[x.kwargs['account_id']]: x.kwargs['start_date']
+                       for x in mock_propagate.call_args_list}
+        self.assertEqual({
+            'CHK': self.start,
+            'PAY': self.start,
+            'CC': self.start + datetime.timedelta(days=1),
+            'GROC': self.start + datetime.timedelta(days=1),
+        }, start_dates)
+        self.assertEqual(0, session.query(TableBalanceQueue).count())
+
+        actual = {(bal.account.name, bal.date): bal.amount for bal in session.query(TableBalance).all()}
+        self.assertEqual(set(expected.keys()), set(actual.keys()))
+        for key, amount in expected.items():
+            self.assertAlmostEqual(amount, actual[key], places=6, msg=f'Balance mismatch for {key}')
+
+    def test_checkpoints_and_as_of_lookups(self):
+        session = make_sqlite_session()
+        balances = self._post_transactions(session, propagate_transaction)
+
+        # Every month with activity gets a checkpoint holding its last balance
+        account_names = {x.account_id: x.name for x in session.query(TableAccount).all()}
+        for checkpoint in session.query(TableBalanceCheckpoint).all():
+            month_bals = sorted((bal_date, amount) for (name, bal_date), amount in balances.items()
+                                if name == account_names[checkpoint.account_key] and
+                                SenditarkQueries.get_month_end(bal_date) == checkpoint.month_end)
+            self.assertAlmostEqual(month_bals[-1][1], checkpoint.amount, places=6)
+
+        chk = session.query(TableAccount).filter(TableAccount.name == 'CHK').one()
+        chk_bals = sorted((bal_date, amount) for (name, bal_date), amount in balances.items() if name == 'CHK')
+        for day_offset in range(0, 120, 3):
+            as_of = self.start + datetime.timedelta(days=day_offset)
+            expected = next((amount for bal_date, amount in reversed(chk_bals) if bal_date <= as_of), 0)
+            actual = SenditarkQueries.get_balance_as_of(session=session, account_id=chk.account_id, as_of=as_of)
+            self.assertAlmostEqual(expected, actual, places=6, msg=f'As-of mismatch for {as_of}')
@@ -0,0 +1,70 @@
+import datetime
+from unittest import TestCase
+
+from senditark_api.model import (
+    AccountType,
+    TableAccount,
+    TableBalance,
+    TableBalanceCheckpoint,
+    TablePayee,
+    TableTransaction,
+    TableTransactionSplit,
+)
+from senditark_api.utils.rebuild import BalanceRebuilder
+
+from ..common import (
+    make_sqlite_session,
+    propagate_transaction,
+    random_float,
+)
+
+
+class TestBalanceRebuilder(TestCase):
+
+    def setUp(self):
+        self.session = make_sqlite_session()
+        self.chk = TableAccount('CHK', AccountType.ASSET)
+        self.groc = TableAccount('GROC', AccountType.EXPENSE)
+        self.payee = TablePayee('STORE')
+        self.session.add_all([self.chk, self.groc, self.payee])
+        self.session.commit()
+
+        for day_offset in [3, 0, 37, 3, 72]:
+            transaction = TableTransaction(
+                transaction_date=datetime.date(2023, 1, 1) + datetime.timedelta(days=day_offset),
+                splits=[TableTransactionSplit(amount=random_float(5, 100), payee=self.payee,
+                                              credit_account=self.chk, debit_account=self.groc, tags=[])]
+            )
+            self.session.add(transaction)
+            self.session.commit()
+            propagate_transaction(session=self.session, transaction=transaction)
+
+    def _get_balances(self):
+        return {(bal.account_key, bal.date): bal.amount for bal in self.session.query(TableBalance).all()}
+
+    def _get_checkpoints(self):
+        return {(cp.account_key, cp.month_end): cp.amount for cp in self.session.query(TableBalanceCheckpoint).all()}
+
+    def test_rebuild_matches_propagation(self):
+        expected = self._get_balances()
+        expected_checkpoints = self._get_checkpoints()
+        # Introduce drift that only a rebuild will fix
+        self.session.query(TableBalance).filter(TableBalance.account_key == self.chk.account_id).delete()
+        self.session.commit()
+
+        n_rows = BalanceRebuilder.rebuild_balances(session=self.session)
+        actual = self._get_balances()
+
+        self.assertEqual(len(expected), n_rows)
+        self.assertEqual(set(expected.keys()), set(actual.keys()))
+        for key, amount in expected.items():
+            self.assertAlmostEqual(amount, actual[key], places=6)
+
+        actual_checkpoints = self._get_checkpoints()
+        self.assertEqual(set(expected_checkpoints.keys()), set(actual_checkpoints.keys()))
+        for key, amount in expected_checkpoints.items():
+            self.assertAlmostEqual(amount, actual_checkpoints[key], places=6)
+
+    def test_rebuild_empty(self):
+        session = make_sqlite_session()
+        self.assertEqual(0, BalanceRebuilder.rebuild_balances(session=session))
@@ -0,0 +1,91 @@
+import pathlib
+import tempfile
+from unittest import TestCase
+
+from sqlalchemy import event
+
+from senditark_api.model import (
+    AccountType,
+    TableAccount,
+    TablePayee,
+    TableTag,
+)
+from senditark_api.utils.query import SenditarkQueries
+from senditark_api.utils.query.base import ReferenceCache
+from senditark_api.utils.result_cache import (
+    ResultCache,
+    SqliteCacheBackend,
+    table_scope,
+)
+
+from ..common import make_sqlite_session
+
+
+class TestReferenceCache(TestCase):
+
+    def setUp(self):
+        self.session = make_sqlite_session()
+        self.session.add_all([TableAccount('CHK', AccountType.ASSET), TableAccount('AUTO', AccountType.EXPENSE),
+                              TablePayee('Grocer'), TableTag('weekly', 'yellow')])
+        self.session.commit()
+        self.statements = []
+        engine = self.session.get_bind()
+        listener = (lambda conn, cursor, statement, *args: self.statements.append(statement))
+        event.listen(engine, 'before_cursor_execute', listener)
+        self.addCleanup(event.remove, engine, 'before_cursor_execute', listener)
+
+    def test_reads_hit_cache_until_written(self):
+        self.assertEqual(['CHK', 'AUTO'], [x['name'] for x in SenditarkQueries.get_account_list(self.session)])
+        self.assertEqual([{'payee_id': 1, 'payee_name': 'Grocer'}], SenditarkQueries.get_payee_list(self.session))
+        n_loads = len(self.statements)
+        for _ in range(3):
+            SenditarkQueries.get_account_list(self.session)
+            SenditarkQueries.get_payee_list(self.session)
+        self.assertEqual(n_loads, len(self.statements))
+
+        SenditarkQueries.edit_tag(session=self.session, tag_id=1, data={'tag_color': 'red'})
+        self.assertEqual('red', SenditarkQueries.get_tag_list(self.session)[0]['tag_color'])
+        SenditarkQueries.add_payee(session=self.session, data={'payee_name': 'Garage'})
+        self.assertEqual(['Grocer', 'Garage'], [x['payee_name'] for x in SenditarkQueries.get_payee_list(self.session)])
+        SenditarkQueries.delete_account(session=self.session, account_id=2)
+        self.assertEqual(['CHK'], [x['name'] for x in SenditarkQueries.get_account_list(self.session)])
+
+    def test_lookup_reads_through(self):
+        payees = SenditarkQueries.get_reference_lookup(session=self.session, obj_class=TablePayee,
+                                                       transform=lambda x: x['payee_name'].upper())
+        self.assertEqual('GROCER', payees[1])
+        # Written around the query helpers, so only a miss finds it
+        self.session.add(TablePayee('Garage'))
+        self.session.commit()
+        self.assertEqual('GARAGE', payees[2])
+        with self.assertRaises(KeyError):
+            payees[99]
+
+    def test_follows_writes_of_other_workers(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        # Two caches sharing a result cache backend stand in for two worker processes
+        shared_versions = ResultCache(SqliteCacheBackend(pathlib.Path(tmp_dir.name).joinpath('cache.sqlite3')))
+        worker_a, worker_b = ReferenceCache(shared_versions), ReferenceCache(shared_versions)
+        self.assertEqual(['Grocer'], [x['payee_name'] for x in worker_a.get_all(self.session, TablePayee).values()])
+
+        # Worker B's write, as _bump_caches makes it
+        self.session.add(TablePayee('Garage'))
+        self.session.commit()
+        worker_b.bump(TablePayee)
+        shared_versions.bump([table_scope(TablePayee.__tablename__)])
+        self.assertEqual(['Grocer', 'Garage'],
+                         [x['payee_name'] for x in worker_a.get_all(self.session, TablePayee).values()])
+
+    def test_validator_matches_cached_rows(self):
+        validator = SenditarkQueries.get_payee_list_validator(self.session)
+        # Written around the query helpers: the cached list stays as it was, and so does its validator
+        self.session.add(TablePayee('Garage'))
+        self.session.commit()
+        self.assertEqual(['Grocer'], [x['payee_name'] for x in SenditarkQueries.get_payee_list(self.session)])
+        self.assertEqual(validator, SenditarkQueries.get_payee_list_validator(self.session))
+        # Both move on together once the cache reloads
+        SenditarkQueries.reference_cache.bump(TablePayee)
+        self.assertNotEqual(validator, SenditarkQueries.get_payee_list_validator(self.session))
+        self.assertEqual(['Grocer', 'Garage'],
+                         [x['payee_name'] for x in SenditarkQueries.get_payee_list(self.session)])
@@ -0,0 +1,98 @@
+import pathlib
+import tempfile
+from unittest import TestCase
+
+from flask import (
+    Flask,
+    jsonify,
+)
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from senditark_api.flask_base import SenditarkSQLAlchemy
+from senditark_api.model import (
+    Base,
+    TablePayee,
+)
+from senditark_api.routes.helpers import (
+    get_session,
+    read_only,
+)
+from senditark_api.utils.query import SenditarkQueries
+from senditark_api.utils.routing import REPLICA_BIND_KEY
+
+from ..common import (
+    SQLITE_ENGINE_OPTIONS,
+    random_string,
+)
+
+
+class TestReplicaRouting(TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        # A second database stands in for the replica, told apart from the primary by its payee's name
+        engines = {}
+        for name in ['primary', 'replica']:
+            db_uri = f'sqlite:///{pathlib.Path(tmp_dir.name).joinpath(name)}.db'
+            engines[name] = engine = create_engine(db_uri, **SQLITE_ENGINE_OPTIONS)
+            self.addCleanup(engine.dispose)
+            Base.metadata.create_all(engine)
+            with Session(engine) as session:
+                session.add(TablePayee(f'{name} payee'))
+                session.commit()
+
+        self.engines = engines
+        self.app = self._make_app(with_replica=True)
+
+    def _make_app(self, with_replica: bool) -> Flask:
+        app = Flask(__name__)
+        app.testing = True
+        app.config.update({
+            'ENGINE': self.engines['primary'],
+            'SQLALCHEMY_DATABASE_URI': str(self.engines['primary'].url),
+        })
+        if with_replica:
+            app.config.update({
+                'REPLICA_ENGINE': self.engines['replica'],
+                'SQLALCHEMY_BINDS': {REPLICA_BIND_KEY: str(self.engines['replica'].url)},
+            })
+        app.config['db'] = db = SenditarkSQLAlchemy()
+        db.init_app(app)
+
+        def get_payee_name():
+            return SenditarkQueries.get_payee(session=get_session(), payee_id=1).payee_name
+
+        def read():
+            return jsonify({
+                'payee_name': get_payee_name(),
+                'payee_list': [x['payee_name'] for x in SenditarkQueries.get_payee_list(session=get_session())],
+            })
+
+        def read_write_read():
+            before = get_payee_name()
+            SenditarkQueries.add_tag(session=get_session(), data={'name': random_string(), 'color': 'red'})
+            return jsonify({'before': before, 'after': get_payee_name()})
+
+        app.add_url_rule('/read', 'read', read_only(read))
+        app.add_url_rule('/read-write', 'read_write', read_only(read_write_read))
+        app.add_url_rule('/write', 'write', read_write_read, methods=['POST'])
+        return app
+
+    def test_read_only_routes_use_replica(self):
+        resp = self.app.test_client().get('/read').get_json()
+        self.assertEqual('replica payee', resp['payee_name'])
+        # Cached reads always come from the primary
+        self.assertEqual(['primary payee'], resp['payee_list'])
+
+        resp = self.app.test_client().post('/write').get_json()
+        self.assertEqual(('primary payee', 'primary payee'), (resp['before'], resp['after']))
+
+    def test_read_only_routes_refuse_writes(self):
+        # Whether or not there's a replica, as Postgres would in the READ ONLY transaction used without one
+        for with_replica in [True, False]:
+            app = self._make_app(with_replica=with_replica)
+            with self.assertRaisesRegex(ValueError, 'read-only session'):
+                app.test_client().get('/read-write')
+            self.assertEqual('primary payee', app.test_client().post('/write').get_json()['after'])
@@ -0,0 +1,151 @@
+import datetime
+import pathlib
+import tempfile
+from unittest import TestCase
+
+from sqlalchemy import (
+    event,
+    update,
+)
+
+from senditark_api.model import (
+    AccountType,
+    TableAccount,
+    TablePayee,
+    TableTransaction,
+    TableTransactionSplit,
+)
+from senditark_api.utils.propagation import PropagationHelper
+from senditark_api.utils.query import SenditarkQueries
+from senditark_api.utils.rebuild import BalanceRebuilder
+from senditark_api.utils.result_cache import (
+    MISS,
+    NullCacheBackend,
+    ResultCache,
+    SqliteCacheBackend,
+    account_scope,
+    result_cache,
+    table_scope,
+)
+
+from ..common import make_sqlite_session
+
+
+class TestSqliteCacheBackend(TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = pathlib.Path(tmp_dir.name).joinpath('cache.sqlite3')
+
+    def test_results_shared_across_workers(self):
+        # Two backends on the same file stand in for two worker processes
+        worker_a, worker_b = ResultCache(SqliteCacheBackend(self.path)), ResultCache(SqliteCacheBackend(self.path))
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return {'n_calls': len(calls)}
+
+        def get(worker: ResultCache):
+            return worker.get_or_compute(name='view', args=(1, ), scopes=[account_scope(1)], compute=compute)
+
+        self.assertEqual({'n_calls': 1}, get(worker_a))
+        self.assertEqual({'n_calls': 1}, get(worker_b))
+        # A write in one worker invalidates the result for both
+        worker_b.bump([account_scope(1)])
+        self.assertEqual({'n_calls': 2}, get(worker_a))
+        self.assertEqual({'n_calls': 2}, get(worker_b))
+        # Writes to other accounts leave it be
+        worker_a.bump([account_scope(2)])
+        self.assertEqual({'n_calls': 2}, get(worker_b))
+
+    def test_ttl_and_lru_eviction(self):
+        backend = SqliteCacheBackend(self.path, max_entries=2)
+        backend.set('expired', 1, ttl=0)
+        self.assertIs(MISS, backend.get('expired'))
+
+        backend.set('a', 'A', ttl=60)
+        backend.set('b', 'B', ttl=60)
+        self.assertEqual('A', backend.get('a'))
+        backend.set('c', 'C', ttl=60)
+        # b was the least recently read
+        self.assertEqual(['A', MISS, 'C'], [backend.get(x) for x in ['a', 'b', 'c']])
+
+
+class TestResultCacheInvalidation(TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        result_cache.configure(backend=SqliteCacheBackend(pathlib.Path(tmp_dir.name).joinpath('cache.sqlite3')))
+        self.addCleanup(result_cache.configure, backend=NullCacheBackend())
+
+        self.session = session = make_sqlite_session()
+        self.chk = TableAccount('CHK', AccountType.ASSET)
+        self.groc = TableAccount('GROC', AccountType.EXPENSE)
+        payee = TablePayee('Grocer')
+        session.add_all([self.chk, self.groc, payee])
+        self.transactions = [
+            TableTransaction(transaction_date=datetime.date(2023, 5, day), splits=[
+                TableTransactionSplit(amount=10 * day, payee=payee, credit_account=self.chk, debit_account=self.groc,
+                                      tags=[])
+            ]) for day in [1, 2, 3]
+        ]
+        session.add_all(self.transactions)
+        session.commit()
+        BalanceRebuilder.rebuild_balances(session=session)
+
+        self.statements = []
+        engine = session.get_bind()
+        listener = (lambda conn, cursor, statement, *args: self.statements.append(statement))
+        event.listen(engine, 'before_cursor_execute', listener)
+        self.addCleanup(event.remove, engine, 'before_cursor_execute', listener)
+
+    def _get_balances(self):
+        accounts = SenditarkQueries.get_accounts_with_balance(session=self.session, as_of=datetime.date(2023, 5, 31))
+        return {x['name']: x['balance'] for x in accounts}
+
+    def test_writes_invalidate_on_commit(self):
+        self.assertEqual({'CHK': -60, 'GROC': 60}, self._get_balances())
+        register = SenditarkQueries.get_transaction_data_by_account(session=self.session,
+                                                                    account_id=self.chk.account_id)
+        n_statements = len(self.statements)
+        self.assertEqual({'CHK': -60, 'GROC': 60}, self._get_balances())
+        self.assertEqual(register, SenditarkQueries.get_transaction_data_by_account(
+            session=self.session, account_id=self.chk.account_id))
+        self.assertEqual(n_statements, len(self.statements))
+
+        # Rolled back writes don't invalidate anything
+        result_cache.invalidate_accounts(session=self.session, account_ids=[self.chk.account_id])
+        self.session.rollback()
+        self._get_balances()
+        self.assertEqual(n_statements, len(self.statements))
+
+        SenditarkQueries.delete_transactions(session=self.session,
+                                             transaction_ids=[self.transactions[0].transaction_id])
+        register = SenditarkQueries.get_transaction_data_by_account(session=self.session,
+                                                                    account_id=self.chk.account_id)
+        self.assertEqual(2, len(register))
+        # Balances only move once propagation runs, which invalidates them again
+        self.assertEqual({'CHK': -60, 'GROC': 60}, self._get_balances())
+        PropagationHelper.process_balance_queue(session=self.session)
+        self.assertEqual({'CHK': -50, 'GROC': 50}, self._get_balances())
+
+        SenditarkQueries.edit_account(session=self.session, account_id=self.groc.account_id,
+                                      data={'name': 'FOOD'})
+        self.assertEqual({'CHK': -50, 'FOOD': 50}, self._get_balances())
+
+    def test_other_workers_renames_reach_cached_register(self):
+        def get_debit_names():
+            return {x['debit_account_name'] for x in SenditarkQueries.get_transaction_data_by_account(
+                session=self.session, account_id=self.chk.account_id)}
+
+        self.assertEqual({'GROC'}, get_debit_names())
+        # Another worker's rename: committed, then bumped in the shared versions only
+        self.session.execute(update(TableAccount).where(TableAccount.account_id == self.groc.account_id).
+                             values(name='FOOD'))
+        self.session.commit()
+        result_cache.bump([table_scope('account')])
+        # The register recomputes under the new version, with names reloaded rather than read from a stale copy
+        self.assertEqual({'FOOD'}, get_debit_names())
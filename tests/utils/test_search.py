@@ -0,0 +1,83 @@
+import datetime
+from unittest import TestCase
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+from senditark_api.model import (
+    AccountType,
+    TableAccount,
+    TablePayee,
+    TableTransaction,
+    TableTransactionSplit,
+)
+from senditark_api.utils.query import SenditarkQueries
+
+from ..common import make_sqlite_session
+
+
+class TestTransactionSearch(TestCase):
+
+    def setUp(self):
+        self.session = session = make_sqlite_session()
+        chk = TableAccount('CHK', AccountType.ASSET)
+        groc = TableAccount('GROC', AccountType.EXPENSE)
+        grocer = TablePayee('Corner Grocer')
+        landlord = TablePayee('Landlord')
+        session.add_all([chk, groc, grocer, landlord])
+        session.commit()
+        self.splits = {}
+        for day, desc, memo, payee, amount in [
+            (1, 'Rent', None, landlord, 1200.0),
+            (3, 'Weekly groceries', None, grocer, 82.5),
+            (10, 'Weekly groceries', 'groceries + 100% juice', grocer, 64.25),
+            (12, 'Gift for Sam', 'groceries gift card', landlord, 50.0),
+            (20, 'Snacks', None, grocer, 8.0),
+        ]:
+            split = TableTransactionSplit(amount=amount, payee=payee, credit_account=chk, debit_account=groc,
+                                          memo=memo, tags=[])
+            session.add(TableTransaction(transaction_date=datetime.date(2023, 4, day), description=desc,
+                                         splits=[split]))
+            self.splits[day] = split
+        session.commit()
+
+    def _search(self, term: str, **kwargs):
+        return [x['transaction_date'].day for x in
+                SenditarkQueries.search_transaction_splits(session=self.session, term=term, **kwargs)]
+
+    def test_search_ranks_across_fields(self):
+        # The 10th matches on description and memo, so it outranks the rest. Ties go to the latest.
+        self.assertEqual([10, 12, 3], self._search('GROCERIES'))
+        # Payee matches reach every split of the payee
+        self.assertEqual([10, 3, 20, 12], self._search('grocer'))
+        # LIKE wildcards are searched for literally
+        self.assertEqual([10], self._search('100%'))
+        self.assertEqual([], self._search('_'))
+
+    def test_search_filters(self):
+        self.assertEqual([10, 3, 12], self._search('grocer', min_amount=10, max_amount=100))
+        self.assertEqual([10, 3], self._search('grocer', start_date=datetime.date(2023, 4, 2),
+                                               end_date=datetime.date(2023, 4, 11)))
+        self.assertEqual([10], self._search('grocer', limit=1))
+        result = SenditarkQueries.search_transaction_splits(session=self.session, term='rent')[0]
+        self.assertEqual(('Rent', 'Landlord', 1200.0, self.splits[1].transaction_split_id),
+                         (result['description'], result['payee_name'], result['amount'],
+                          result['transaction_split_id']))
+        with self.assertRaises(ValueError):
+            SenditarkQueries.search_transaction_splits(session=self.session, term='  ')
+
+    def test_postgres_search_uses_indexed_expressions(self):
+        indexes = {
+            str(CreateIndex(ix).compile(dialect=postgresql.dialect()))
+            for table in [TableTransaction, TableTransactionSplit, TablePayee] for ix in table.__table__.indexes
+        }
+        self.assertIn('CREATE INDEX ix_transaction_description_tsv ON "default".transaction USING gin '
+                      "(to_tsvector('english', coalesce(description, '')))", indexes)
+        self.assertIn('CREATE INDEX ix_payee_payee_name_trgm ON "default".payee USING gin '
+                      '(payee_name gin_trgm_ops)', indexes)
+
+        stmt = str(SenditarkQueries.get_search_query(term='rent', dialect='postgresql').
+                   compile(dialect=postgresql.dialect()))
+        self.assertIn("to_tsvector('english', coalesce(\"default\".transaction.description, '')) @@ "
+                      "websearch_to_tsquery('english', ", stmt)
+        self.assertIn('<%% "default".payee.payee_name', stmt)
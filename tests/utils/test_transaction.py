@@ -0,0 +1,296 @@
+import datetime
+from unittest import TestCase
+
+from sqlalchemy import (
+    event,
+    insert,
+    select,
+)
+
+from senditark_api.model import (
+    AccountType,
+    Currency,
+    ReconciledState,
+    TableAccount,
+    TableBalanceQueue,
+    TablePayee,
+    TableTag,
+    TableTagToTransactionSplit,
+    TableTransaction,
+    TableTransactionSplit,
+)
+from senditark_api.utils.propagation import PropagationHelper
+from senditark_api.utils.query import SenditarkQueries
+from senditark_api.utils.rebuild import BalanceRebuilder
+from senditark_api.utils.verify import BalanceVerifier
+
+from ..common import (
+    make_sqlite_session,
+    random_float,
+)
+
+
+class TestTransactionRegister(TestCase):
+    N_TRANSACTIONS = 5000
+
+    @classmethod
+    def setUpClass(cls):
+        cls.session = session = make_sqlite_session()
+        session.execute(insert(TableAccount), [
+            {'account_id': i, 'name': name, 'full_name': name, 'level': 0, 'account_type': acct_type,
+             'account_currency': Currency.USD, 'is_hidden': False, 'is_active': True}
+            for i, (name, acct_type) in enumerate([('CHK', AccountType.ASSET), ('GROC', AccountType.EXPENSE),
+                                                   ('PAY', AccountType.INCOME)], start=1)
+        ])
+        session.execute(insert(TablePayee), [{'payee_id': i, 'payee_name': f'PAYEE_{i}'} for i in range(1, 21)])
+        session.execute(insert(TableTag), [{'tag_id': i, 'tag_name': f'TAG_{i}', 'tag_color': 'yellow'}
+                                           for i in range(1, 6)])
+        start = datetime.date(2015, 1, 1)
+        session.execute(insert(TableTransaction), [
+            {'transaction_id': i, 'transaction_date': start + datetime.timedelta(days=i // 3),
+             'description': f'Transaction {i}', 'is_scheduled': False}
+            for i in range(1, cls.N_TRANSACTIONS + 1)
+        ])
+        splits, split_id = [], 0
+        for i in range(1, cls.N_TRANSACTIONS + 1):
+            # Every tenth transaction has a second split
+            for _ in range(2 if i % 10 == 0 else 1):
+                split_id += 1
+                credit, debit = (3, 1) if i % 4 == 0 else (1, 2)
+                splits.append({'transaction_split_id': split_id, 'transaction_key': i, 'payee_key': i % 20 + 1,
+                               'credit_account_key': credit, 'debit_account_key': debit,
+                               'amount': random_float(1, 100), 'reconciled_state': ReconciledState.n})
+        session.execute(insert(TableTransactionSplit), splits)
+        session.execute(insert(TableTagToTransactionSplit), [
+            {'transaction_split_key': x, 'tag_key': x % 5 + 1} for x in range(1, split_id + 1, 3)
+        ])
+        session.commit()
+        BalanceRebuilder.rebuild_balances(session=session)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.session.close()
+
+    def test_register_query_count(self):
+        self.session.expire_all()
+        statements = []
+
+        def count_statement(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = self.session.get_bind()
+        event.listen(engine, 'before_cursor_execute', count_statement)
+        try:
+            register = SenditarkQueries.get_transaction_data_by_account(session=self.session, account_id=1)
+        finally:
+            event.remove(engine, 'before_cursor_execute', count_statement)
+
+        self.assertEqual(self.N_TRANSACTIONS, len([x for x in register if x['is_split_parent']]))
+        self.assertLessEqual(len(statements), 5, msg='\n\n'.join(statements))
+
+    def test_register_pages_match_full_register(self):
+        register = SenditarkQueries.get_transaction_data_by_account(session=self.session, account_id=1)
+        paged, cursor, n_pages = [], None, 0
+        while True:
+            page = SenditarkQueries.get_transaction_page_by_account(
+                session=self.session, account_id=1, limit=700, cursor=cursor)
+            paged += page['transaction_splits']
+            n_pages += 1
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(8, n_pages)
+        self.assertEqual(len(register), len(paged))
+        for full_row, page_row in zip(register, paged):
+            self.assertEqual(full_row['sort_key'], page_row['sort_key'])
+            if full_row['is_split_parent']:
+                self.assertAlmostEqual(full_row['balance_after'], page_row['balance_after'], places=4)
+
+        # Most recent first, and the first row carries the latest stored balance
+        parents = [x for x in register if x['is_split_parent']]
+        keys = [(x['transaction_date'], x['transaction_id']) for x in parents]
+        self.assertEqual(sorted(keys, reverse=True), keys)
+        self.assertAlmostEqual(SenditarkQueries.get_stored_balance(
+            session=self.session, account_id=1, as_of=keys[0][0]), parents[0]['balance_after'], places=4)
+        # Each balance_after is the one before it, less that transaction's total
+        for newer, older in zip(parents, parents[1:]):
+            self.assertAlmostEqual(newer['balance_after'] - newer['total'], older['balance_after'], places=4)
+
+    def test_register_page_splits_a_day(self):
+        # Transactions 2998-3000 share a date; a page boundary inside it must still seed the right balance
+        register = SenditarkQueries.get_transaction_data_by_account(session=self.session, account_id=1)
+        parents = {x['transaction_id']: x for x in register if x['is_split_parent']}
+        cursor = SenditarkQueries.encode_register_cursor(
+            transaction_date=parents[3000]['transaction_date'], transaction_id=3000)
+        page = SenditarkQueries.get_transaction_page_by_account(
+            session=self.session, account_id=1, limit=2, cursor=cursor)
+        page_parents = [x for x in page['transaction_splits'] if x['is_split_parent']]
+        self.assertEqual([2999, 2998], [x['transaction_id'] for x in page_parents])
+        for row in page_parents:
+            self.assertAlmostEqual(parents[row['transaction_id']]['balance_after'], row['balance_after'], places=4)
+
+    def _count_vm_steps(self, stmt) -> int:
+        """Runs the statement, counting the blocks of 100 SQLite VM instructions it took"""
+        dbapi_conn = self.session.connection().connection.dbapi_connection
+        n_steps = [0]
+
+        def count_step():
+            n_steps[0] += 1
+            return 0
+
+        dbapi_conn.set_progress_handler(count_step, 100)
+        try:
+            self.session.execute(stmt).all()
+        finally:
+            dbapi_conn.set_progress_handler(None, 100)
+        return n_steps[0]
+
+    def test_register_page_cost_bounded_by_page(self):
+        # Account 3 only has a split in every fourth transaction
+        for account_id in [1, 3]:
+            full_steps = self._count_vm_steps(select(SenditarkQueries.get_register_balances(account_id=account_id)))
+            page_steps = self._count_vm_steps(
+                select(SenditarkQueries.get_register_balances(account_id=account_id, limit=10)))
+            # Only the page's transactions get aggregated, rather than the account's whole history
+            self.assertLess(page_steps * 20, full_steps)
+
+            full = self.session.execute(select(SenditarkQueries.get_register_balances(account_id=account_id))).all()
+            cursor = SenditarkQueries.encode_register_cursor(
+                transaction_date=full[99].transaction_date, transaction_id=full[99].transaction_id)
+            page = self.session.execute(select(SenditarkQueries.get_register_balances(
+                account_id=account_id, limit=10, cursor=cursor))).all()
+            self.assertEqual([x.transaction_id for x in full[100:110]], [x.transaction_id for x in page])
+            for expected, row in zip(full[100:110], page):
+                self.assertAlmostEqual(expected.balance_after, row.balance_after, places=4)
+
+    def test_register_date_window(self):
+        register = SenditarkQueries.get_transaction_data_by_account(session=self.session, account_id=1)
+        parents = {x['transaction_id']: x for x in register if x['is_split_parent']}
+        start, end = datetime.date(2016, 2, 1), datetime.date(2016, 2, 29)
+        window = SenditarkQueries.get_transaction_page_by_account(
+            session=self.session, account_id=1, start_date=start, end_date=end)
+        window_parents = [x for x in window['transaction_splits'] if x['is_split_parent']]
+        self.assertEqual(len([x for x in parents.values() if start <= x['transaction_date'] <= end]),
+                         len(window_parents))
+        for row in window_parents:
+            self.assertAlmostEqual(parents[row['transaction_id']]['balance_after'], row['balance_after'], places=4)
+
+    def test_register_stream_matches_full_register(self):
+        register = SenditarkQueries.get_transaction_data_by_account(session=self.session, account_id=1)
+        self.session.expire_all()
+        statements = []
+
+        def count_statement(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = self.session.get_bind()
+        event.listen(engine, 'before_cursor_execute', count_statement)
+        try:
+            streamed = list(SenditarkQueries.iter_transaction_data_by_account(
+                session=self.session, account_id=1, batch_size=1000))
+        finally:
+            event.remove(engine, 'before_cursor_execute', count_statement)
+
+        self.assertEqual(register, streamed)
+        # The split rows off one cursor, then a tag lookup per batch of them
+        n_splits = self.session.query(TableTransactionSplit).count()
+        self.assertEqual(1 + -(-n_splits // 1000), len(statements))
+
+    def test_register_matches_orm_formatter(self):
+        page = SenditarkQueries.get_transaction_page_by_account(session=self.session, account_id=1, limit=300)
+        expected = []
+        for transaction in self.session.query(TableTransaction).\
+                order_by(TableTransaction.transaction_date.desc(), TableTransaction.transaction_id.desc()).\
+                limit(300):
+            expected += SenditarkQueries._format_transaction_data(transaction=transaction, account_id=1)
+        for row in page['transaction_splits']:
+            row.pop('balance_after', None)
+        self.assertEqual(expected, page['transaction_splits'])
+
+    def test_register_cursor_rejects_garbage(self):
+        with self.assertRaises(ValueError):
+            SenditarkQueries.get_transaction_page_by_account(
+                session=self.session, account_id=1, limit=10, cursor='not-a-cursor')
+
+
+class TestBulkTransactionEdits(TestCase):
+
+    def setUp(self):
+        self.session = session = make_sqlite_session()
+        self.accounts = {name: TableAccount(name, acct_type) for name, acct_type in [
+            ('CHK', AccountType.ASSET), ('CC', AccountType.LIABILITY), ('GROC', AccountType.EXPENSE),
+            ('FUEL', AccountType.EXPENSE)]}
+        payee = TablePayee('STORE')
+        tag = TableTag('weekly', 'yellow')
+        session.add_all(list(self.accounts.values()) + [payee, tag])
+        session.commit()
+        self.transactions = []
+        for day, credit, debit in [(1, 'CHK', 'GROC'), (5, 'CC', 'GROC'), (9, 'CHK', 'FUEL'), (20, 'CC', 'FUEL'),
+                                   (25, 'CHK', 'CC')]:
+            split = TableTransactionSplit(amount=10.0 * day, payee=payee, credit_account=self.accounts[credit],
+                                          debit_account=self.accounts[debit], tags=[])
+            split.tags.append(TableTagToTransactionSplit(tag=tag))
+            self.transactions.append(TableTransaction(transaction_date=datetime.date(2023, 3, day), splits=[split]))
+        session.add_all(self.transactions)
+        session.commit()
+        BalanceRebuilder.rebuild_balances(session=session)
+
+    def _assert_balances_correct(self):
+        PropagationHelper.process_balance_queue(session=self.session)
+        for account in self.accounts.values():
+            result = BalanceVerifier.verify_account(session=self.session, account_id=account.account_id)
+            self.assertIsNone(result['first_divergent_date'], msg=str(result))
+
+    def _get_queued(self):
+        return {x.account_key: x.from_date for x in self.session.query(TableBalanceQueue).all()}
+
+    def test_delete_transactions(self):
+        ids = [self.transactions[1].transaction_id, self.transactions[3].transaction_id]
+        account_dates = SenditarkQueries.delete_transactions(session=self.session, transaction_ids=ids)
+
+        expected = {
+            self.accounts['CC'].account_id: datetime.date(2023, 3, 5),
+            self.accounts['GROC'].account_id: datetime.date(2023, 3, 5),
+            self.accounts['FUEL'].account_id: datetime.date(2023, 3, 20),
+        }
+        self.assertEqual(expected, account_dates)
+        self.assertEqual(expected, self._get_queued())
+        self.assertEqual(3, self.session.query(TableTransaction).count())
+        self.assertEqual(3, self.session.query(TableTagToTransactionSplit).count())
+        self._assert_balances_correct()
+
+        with self.assertRaises(ValueError):
+            SenditarkQueries.delete_transactions(session=self.session, transaction_ids=ids)
+
+    def test_edit_transactions(self):
+        account_dates = SenditarkQueries.edit_transactions(
+            session=self.session,
+            # Moving the CC fuel purchase back before everything else
+            transaction_edits=[{'transaction_id': self.transactions[3].transaction_id,
+                                'transaction_date': '2023-02-28'}],
+            # Moving the first grocery run onto the card and changing the fuel amount
+            split_edits=[
+                {'transaction_split_id': self.transactions[0].splits[0].transaction_split_id,
+                 'credit_account_key': self.accounts['CC'].account_id},
+                {'transaction_split_id': self.transactions[2].splits[0].transaction_split_id,
+                 'amount': 42.0, 'reconciled_state': 'c'},
+            ]
+        )
+        expected = {
+            self.accounts['CHK'].account_id: datetime.date(2023, 3, 1),
+            self.accounts['CC'].account_id: datetime.date(2023, 2, 28),
+            self.accounts['GROC'].account_id: datetime.date(2023, 3, 1),
+            self.accounts['FUEL'].account_id: datetime.date(2023, 2, 28),
+        }
+        self.assertEqual(expected, account_dates)
+        # Each account queued exactly once
+        self.assertEqual(4, self.session.query(TableBalanceQueue).count())
+        self.assertEqual(expected, self._get_queued())
+        self._assert_balances_correct()
+
+        with self.assertRaises(ValueError):
+            SenditarkQueries.edit_transactions(session=self.session, split_edits=[
+                {'transaction_split_id': self.transactions[0].splits[0].transaction_split_id, 'transaction_key': 3}])
+        with self.assertRaises(ValueError):
+            SenditarkQueries.edit_transactions(session=self.session, transaction_edits=[
+                {'transaction_id': 9999, 'description': 'nope'}])
@@ -0,0 +1,73 @@
+import datetime
+import pathlib
+import tempfile
+from unittest import TestCase
+
+from senditark_api.model import (
+    AccountType,
+    TableAccount,
+    TableBalance,
+    TablePayee,
+    TableTransaction,
+    TableTransactionSplit,
+)
+from senditark_api.utils.verify import BalanceVerifier
+
+from ..common import (
+    SQLITE_ENGINE_OPTIONS,
+    make_sqlite_session,
+    propagate_transaction,
+)
+
+
+class TestBalanceVerifier(TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.db_uri = f'sqlite:///{pathlib.Path(tmp_dir.name).joinpath("verify.db")}'
+        self.session = make_sqlite_session(self.db_uri)
+        self.addCleanup(self.session.close)
+
+        self.chk = TableAccount('CHK', AccountType.ASSET)
+        self.groc = TableAccount('GROC', AccountType.EXPENSE)
+        payee = TablePayee('STORE')
+        self.session.add_all([self.chk, self.groc, payee])
+        self.session.commit()
+        for day in [1, 4, 9, 15]:
+            transaction = TableTransaction(
+                transaction_date=datetime.date(2023, 3, day),
+                splits=[TableTransactionSplit(amount=10.0 * day, payee=payee, credit_account=self.chk,
+                                              debit_account=self.groc, tags=[])]
+            )
+            self.session.add(transaction)
+            self.session.commit()
+            propagate_transaction(session=self.session, transaction=transaction)
+        self.account_ids = [self.chk.account_id, self.groc.account_id]
+
+    def _verify(self):
+        return BalanceVerifier.verify_accounts(db_uri=self.db_uri, account_ids=self.account_ids, max_workers=2,
+                                               engine_options=SQLITE_ENGINE_OPTIONS)
+
+    def test_consistent_balances(self):
+        self.assertTrue(all(x['first_divergent_date'] is None for x in self._verify()))
+
+    def test_detect_and_repair_drift(self):
+        # Corrupt one balance and drop a later one
+        self.session.query(TableBalance).filter(
+            TableBalance.account_key == self.chk.account_id, TableBalance.date == datetime.date(2023, 3, 4)
+        ).update({TableBalance.amount: 0})
+        self.session.query(TableBalance).filter(
+            TableBalance.account_key == self.chk.account_id, TableBalance.date == datetime.date(2023, 3, 15)
+        ).delete()
+        self.session.commit()
+
+        results = {x['account_id']: x for x in self._verify()}
+        self.assertIsNone(results[self.groc.account_id]['first_divergent_date'])
+        self.assertEqual(datetime.date(2023, 3, 4), results[self.chk.account_id]['first_divergent_date'])
+        self.assertAlmostEqual(-50.0, results[self.chk.account_id]['expected_amount'])
+        self.assertEqual(0, results[self.chk.account_id]['stored_amount'])
+
+        repaired = BalanceVerifier.repair_accounts(session=self.session, results=list(results.values()))
+        self.assertEqual([self.chk.account_id], repaired)
+        self.assertTrue(all(x['first_divergent_date'] is None for x in self._verify()))